@@ -0,0 +1,75 @@
+"""
+Async counterpart of database_config: an AsyncEngine on the same database through
+an asyncio driver (aiosqlite, aiomysql or asyncpg) and an async get_db dependency.
+Off unless ASYNC_DATABASE_ENABLED=true; needs `sqlalchemy[asyncio]` and the driver.
+"""
+import os
+import re
+import threading
+
+from app.config.database_config import SQLALCHEMY_DATABASE_URL, mask_db_password
+from app.config.pool_config import engine_options, install_engine_listeners
+
+
+ASYNC_DATABASE_ENABLED = os.getenv("ASYNC_DATABASE_ENABLED", "false").lower() == "true"
+
+# Sync driver -> asyncio driver for the same database
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+    "mariadb": "mariadb+aiomysql",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def get_async_database_url(database_url: str) -> str:
+    # ASYNC_DATABASE_URL wins; otherwise swap the driver of the sync URL
+    explicit = os.getenv("ASYNC_DATABASE_URL")
+    if explicit:
+        return explicit
+
+    match = re.match(r"^([a-z]+)(\+[a-z0-9_]+)?://", database_url)
+    if not match or match.group(1) not in _ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver known for {mask_db_password(database_url)}")
+    return _ASYNC_DRIVERS[match.group(1)] + database_url[match.end(0) - 3:]
+
+
+_async_engine = None
+_async_sessionmaker = None
+_engine_lock = threading.Lock()
+
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                # Imported here: sqlalchemy.ext.asyncio needs greenlet, which the sync app doesn't
+                from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+                database_url = get_async_database_url(SQLALCHEMY_DATABASE_URL)
+                print(f"Connecting to database (async) with: {mask_db_password(database_url)}")
+                engine = create_async_engine(database_url, **engine_options(database_url, use_async=True))
+                install_engine_listeners(engine.sync_engine)
+
+                _async_sessionmaker = async_sessionmaker(engine, autoflush=False, expire_on_commit=True)
+                _async_engine = engine
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    get_async_engine()
+    return _async_sessionmaker()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_sessionmaker = None
@@ -3,10 +3,13 @@ Database configuration module for handling connection settings and setup.
 """
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from dotenv import load_dotenv
 import os
 import re
+import threading
+
+from app.config.pool_config import engine_options, install_engine_listeners
 
 load_dotenv()
 
@@ -58,15 +61,14 @@ def create_db_engine(database_url):
                     database_url = f"postgresql+psycopg2://{parts[1]}"
                     print(f"Standardized PostgreSQL connection URL")
         
-        engine_kwargs = {
-            "pool_pre_ping": True,  
-            "pool_recycle": 3600,   
-        }
+        # Pool size, overflow, timeout and pre-ping come from DB_POOL_* (see pool_config)
+        engine_kwargs = engine_options(database_url)
         
         if 'mysql' in database_url:
             engine_kwargs["connect_args"] = {"connect_timeout": 15}
             
         engine = create_engine(database_url, **engine_kwargs)
+        install_engine_listeners(engine)
         return engine
         
     except Exception as e:
@@ -79,8 +81,9 @@ def create_db_engine(database_url):
         except Exception as e2:
             print(f"Second attempt failed: {str(e2)}")
             
-            if 'sqlite' not in database_url:
-                print("Falling back to SQLite database")
+            # Opt-in only: silently writing to a local file would hide a misconfigured database
+            if 'sqlite' not in database_url and os.getenv("DB_FALLBACK_SQLITE", "false").lower() == "true":
+                print("Falling back to SQLite database (DB_FALLBACK_SQLITE=true)")
                 return create_db_engine('sqlite:///./fallback.db')
             else:
                 raise
@@ -103,10 +106,51 @@ def mask_db_password(database_url):
     return f"{database_url} (password masking failed)"
 
 
+# Full-text index behind /api/formula/search, per dialect (see CompoundSearch).
+# SEARCH_BACKEND=like forces the unindexed fallback, e.g. for SQLite builds without FTS5
+SEARCH_BACKENDS = {
+    "sqlite": "fts5",
+    "mysql": "fulltext",
+    "mariadb": "fulltext",
+    "postgresql": "tsvector",
+}
+
+
+def get_search_backend(engine) -> str:
+    backend = os.getenv("SEARCH_BACKEND", "").lower()
+    return backend or SEARCH_BACKENDS.get(engine.dialect.name, "like")
+
+
 SQLALCHEMY_DATABASE_URL = get_database_url()
-engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    # Created on first use rather than at import, so importing the app (workers,
+    # CLIs, tests) neither loads a DB driver nor touches the database
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+    return _engine
+
+
+def __getattr__(name):
+    # `from app.config.database_config import engine` keeps working, lazily
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class LazySession(Session):
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else get_engine(), **kwargs)
+
+
+SessionLocal = sessionmaker(class_=LazySession, autocommit=False, autoflush=False)
 
 
 def get_db():
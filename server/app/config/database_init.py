@@ -1,13 +1,33 @@
-from app.config.database_config import Base, engine, SQLALCHEMY_DATABASE_URL
+from app.config.database_config import Base, get_engine, SessionLocal, SQLALCHEMY_DATABASE_URL
+from app.models import UsageStatsModel  # registers the rollup tables for create_all
+from app.models.CompoundModel import Compound
+from app.services.compound_service import PRIVATE_KEY_PREFIX, CompoundService
+from app.services.search_service import CompoundSearch
 from sqlalchemy.exc import SQLAlchemyError, OperationalError
-from sqlalchemy import text, create_engine
+from sqlalchemy import text, create_engine, inspect
 import os
 import re
+import threading
 import time
 
 
+# "sync" checks and migrates the schema before the app serves requests, "background"
+# does it in a thread while the app starts serving, "skip" leaves it to a deploy step
+SCHEMA_CHECK = os.getenv("DB_SCHEMA_CHECK", "sync").lower()
+CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", 5))
+
+
+def run_schema_check():
+    if SCHEMA_CHECK == "skip":
+        print("Skipping schema check (DB_SCHEMA_CHECK=skip)")
+    elif SCHEMA_CHECK == "background":
+        threading.Thread(target=create_tables, name="schema-check", daemon=True).start()
+    else:
+        create_tables()
+
+
 def create_tables():
-    max_retries = 5
+    max_retries = CONNECT_RETRIES
     retry_count = 0
     
     while retry_count < max_retries:
@@ -28,7 +48,11 @@ def create_tables():
                 except SQLAlchemyError as db_err:
                     print(f"Could not create database (this is often normal): {str(db_err)}")
             
-            Base.metadata.create_all(bind=engine)
+            Base.metadata.create_all(bind=get_engine())
+            add_missing_columns()
+            add_missing_indexes()
+            migrate_legacy_properties()
+            CompoundSearch.create_index(get_engine())
             print(f"Database tables created successfully using connection: {SQLALCHEMY_DATABASE_URL}")
             return
             
@@ -51,4 +75,237 @@ def create_tables():
             
             if os.getenv("ENVIRONMENT") != "production":
                 raise
-            return
\ No newline at end of file
+            return
+
+
+def add_missing_columns():
+    # create_all never alters existing tables, so add nullable columns introduced after the table was created
+    engine = get_engine()
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+            
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns or not column.nullable:
+                continue
+                
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            print(f"Added column {table.name}.{column.name}")
+
+
+def add_missing_indexes():
+    # Likewise for indexes declared on tables that already exist
+    engine = get_engine()
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+            
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+                
+            index.create(bind=engine)
+            print(f"Created index {index.name} on {table.name}")
+
+
+def legacy_property_columns() -> list:
+    # The PubChem columns `formulas` had before compounds got their own table
+    inspector = inspect(get_engine())
+    if "formulas" not in inspector.get_table_names():
+        return []
+    existing_columns = {column["name"] for column in inspector.get_columns("formulas")}
+    return [field for field in CompoundService.PROPERTY_FIELDS if field in existing_columns]
+
+
+def migrate_legacy_properties(chunk_size: int = 5000) -> int:
+    # History rows used to carry their own copy of the PubChem payload. Move the payloads
+    # into `compounds` and point the rows at them: a row whose payload matches its
+    # formula's compound shares it, a row whose payload differs gets a private copy, so
+    # every payload survives. Each chunk is one transaction and linked rows are skipped,
+    # so an interrupted run just resumes. The old columns stay until they are dropped
+    # explicitly (migrate_database.py --drop-legacy-columns).
+    legacy_columns = legacy_property_columns()
+    if not legacy_columns:
+        return 0
+    
+    # Through the compound_id index: only the rows not linked yet are read
+    select_rows = text(
+        f"SELECT id, formula, {', '.join(legacy_columns)} FROM formulas "
+        f"WHERE compound_id IS NULL AND id > :last_id ORDER BY id LIMIT :chunk_size"
+    )
+    link_rows = text("UPDATE formulas SET compound_id = :compound_id WHERE id = :row_id")
+    
+    migrated = 0
+    last_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            rows = db.execute(select_rows, {"last_id": last_id, "chunk_size": chunk_size}).mappings().all()
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            
+            # Only rows that had PubChem data get a compound
+            payloads, enriched = {}, []
+            for row in rows:
+                properties = {field: row[field] for field in legacy_columns if row[field] is not None}
+                if properties:
+                    # Stored payloads were complete lookups; they just didn't keep the formula
+                    payloads.setdefault(row["formula"], {"formula": row["formula"], **properties})
+                    enriched.append((row, properties))
+            
+            compound_ids = CompoundService.get_compound_ids(db, payloads)
+            stored = _compound_values(db, set(compound_ids.values()) - {None}, legacy_columns)
+            links = []
+            for row, properties in enriched:
+                compound_id = compound_ids.get(row["formula"])
+                if compound_id is None or not _same_payload(properties, stored[compound_id]):
+                    compound_id = CompoundService.edit_compound(db, row["id"], None, properties)
+                links.append({"row_id": row["id"], "compound_id": compound_id})
+            if links:
+                db.execute(link_rows, links)
+            db.commit()
+            migrated += len(links)
+    finally:
+        db.close()
+    
+    if migrated:
+        print(f"Moved PubChem data of {migrated} history rows into compounds")
+    return migrated
+
+
+def verify_legacy_properties(chunk_size: int = 5000) -> int:
+    # Rows whose legacy payload is not what their compound holds; 0 means the old
+    # columns carry nothing that `compounds` doesn't, and can be dropped
+    legacy_columns = legacy_property_columns()
+    if not legacy_columns:
+        return 0
+    
+    select_rows = text(
+        f"SELECT id, compound_id, {', '.join(legacy_columns)} FROM formulas "
+        f"WHERE id > :last_id ORDER BY id LIMIT :chunk_size"
+    )
+    mismatches = 0
+    last_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            rows = db.execute(select_rows, {"last_id": last_id, "chunk_size": chunk_size}).mappings().all()
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            stored = _compound_values(db, {row["compound_id"] for row in rows} - {None}, legacy_columns)
+            for row in rows:
+                properties = {field: row[field] for field in legacy_columns if row[field] is not None}
+                if properties and not _same_payload(properties, stored.get(row["compound_id"])):
+                    mismatches += 1
+    finally:
+        db.close()
+    return mismatches
+
+
+def drop_legacy_columns(chunk_size: int = 5000) -> list:
+    # Irreversible, so only on request, and only once every payload is verified in `compounds`
+    legacy_columns = legacy_property_columns()
+    if not legacy_columns:
+        return []
+    mismatches = verify_legacy_properties(chunk_size)
+    if mismatches:
+        raise RuntimeError(f"{mismatches} history rows have PubChem data that is not in compounds; not dropping {', '.join(legacy_columns)}")
+    
+    # SQLite can only drop one column per statement; other databases take them all at once
+    engine = get_engine()
+    if engine.dialect.name == "sqlite":
+        statements = [f"ALTER TABLE formulas DROP COLUMN {column}" for column in legacy_columns]
+    else:
+        statements = ["ALTER TABLE formulas " + ", ".join(f"DROP COLUMN {column}" for column in legacy_columns)]
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+    print(f"Dropped legacy columns from formulas: {', '.join(legacy_columns)}")
+    return legacy_columns
+
+
+def _compound_values(db, compound_ids: set, columns: list) -> dict:
+    # compound id -> {column: value} for the given columns
+    if not compound_ids:
+        return {}
+    rows = db.query(Compound.id, *(getattr(Compound, column) for column in columns)).filter(Compound.id.in_(compound_ids)).all()
+    return {row[0]: dict(zip(columns, row[1:])) for row in rows}
+
+
+def _same_payload(properties: dict, stored) -> bool:
+    # A row's payload is kept when every value it had is on its compound
+    return stored is not None and all(stored.get(field) == value for field, value in properties.items())
+
+
+def canonicalize_compound_keys(chunk_size: int = 5000, dry_run: bool = False) -> dict:
+    # One-off, not part of the startup check (migrate_database.py --canonicalize-compounds).
+    # Fills in the Hill formula of compounds stored before it had a column, and merges
+    # shared compounds with the same PubChem CID ("NaCl" and "ClNa") into the oldest one.
+    # Keys are left alone, compounds with different CIDs are never merged (isomers share
+    # a Hill formula, not a CID), and private copies stay with their history row.
+    if "compounds" not in inspect(get_engine()).get_table_names():
+        return {"hill_formulas": 0, "compounds_merged": 0}
+    
+    select_rows = text(
+        "SELECT id, formula_key FROM compounds WHERE hill_formula IS NULL AND id > :last_id "
+        "ORDER BY id LIMIT :chunk_size"
+    )
+    set_hill = text("UPDATE compounds SET hill_formula = :hill_formula WHERE id = :compound_id")
+    select_duplicates = text(
+        "SELECT cid, MIN(id) AS keep_id FROM compounds "
+        "WHERE cid IS NOT NULL AND formula_key NOT LIKE :private GROUP BY cid HAVING COUNT(*) > 1"
+    )
+    select_merged = text(
+        "SELECT id FROM compounds WHERE cid = :cid AND id <> :keep_id AND formula_key NOT LIKE :private"
+    )
+    private = PRIVATE_KEY_PREFIX + "%"
+    
+    filled = merged = 0
+    last_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            rows = db.execute(select_rows, {"last_id": last_id, "chunk_size": chunk_size}).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            updates = [
+                {"compound_id": compound_id, "hill_formula": CompoundService.hill_key(formula_key)}
+                for compound_id, formula_key in rows if not formula_key.startswith(PRIVATE_KEY_PREFIX)
+            ]
+            updates = [update for update in updates if update["hill_formula"] is not None]
+            if updates and not dry_run:
+                db.execute(set_hill, updates)
+                db.commit()
+            filled += len(updates)
+        
+        for cid, keep_id in db.execute(select_duplicates, {"private": private}).all():
+            merges = [
+                {"old_id": compound_id, "new_id": keep_id}
+                for (compound_id,) in db.execute(select_merged, {"cid": cid, "keep_id": keep_id, "private": private}).all()
+            ]
+            if merges and not dry_run:
+                db.execute(text("UPDATE formulas SET compound_id = :new_id WHERE compound_id = :old_id"), merges)
+                db.execute(text("DELETE FROM compounds WHERE id = :old_id"), merges)
+                db.commit()
+            merged += len(merges)
+    finally:
+        db.close()
+    
+    if not dry_run:
+        CompoundService.clear()
+        if filled or merged:
+            print(f"Canonicalized compounds: {filled} Hill formulas filled in, {merged} merged by CID")
+    return {"hill_formulas": filled, "compounds_merged": merged}
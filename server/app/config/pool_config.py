@@ -0,0 +1,181 @@
+"""
+Connection-pool settings and pool metrics for the SQLAlchemy engine.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import DisconnectionError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.utils.metrics import METRICS_ENABLED, instrument_engine
+
+
+# Pool sizing; set per deployment to match workers x threads
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 3600))
+
+# "always" pings on every checkout (one extra round-trip per request), "idle" only
+# pings connections that sat unused for PRE_PING_IDLE_SECONDS, "never" trusts the pool
+PRE_PING = os.getenv("DB_POOL_PRE_PING", "idle").lower()
+PRE_PING_IDLE_SECONDS = float(os.getenv("DB_POOL_PRE_PING_IDLE", 30))
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+
+class PoolMetrics:
+    """
+    Process-wide counters for engine checkouts: how long callers waited for a
+    connection, how often the pool had to overflow or timed out, and how many
+    stale connections the idle pre-ping replaced.
+    """
+
+    _lock = threading.Lock()
+    _stats = {
+        "checkouts": 0,
+        "checkout_wait_ms_total": 0.0,
+        "checkout_wait_ms_max": 0.0,
+        "overflow_events": 0,
+        "timeouts": 0,
+        "stale_connections": 0,
+    }
+
+    @classmethod
+    def record_checkout(cls, wait_seconds: float, overflowed: bool) -> None:
+        wait_ms = wait_seconds * 1000
+        with cls._lock:
+            cls._stats["checkouts"] += 1
+            cls._stats["checkout_wait_ms_total"] += wait_ms
+            cls._stats["checkout_wait_ms_max"] = max(cls._stats["checkout_wait_ms_max"], wait_ms)
+            if overflowed:
+                cls._stats["overflow_events"] += 1
+
+    @classmethod
+    def record(cls, name: str) -> None:
+        with cls._lock:
+            cls._stats[name] += 1
+
+    @classmethod
+    def stats(cls, engine=None) -> dict:
+        with cls._lock:
+            stats = dict(cls._stats)
+        stats["checkout_wait_ms_avg"] = stats["checkout_wait_ms_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+
+        pool = engine.pool if engine is not None else None
+        if isinstance(pool, QueuePool):
+            stats.update({
+                "pool_size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+            })
+        if pool is not None:
+            stats["pool_class"] = type(pool).__name__
+        stats["pre_ping"] = PRE_PING
+        return stats
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            for name in cls._stats:
+                cls._stats[name] = 0.0 if isinstance(cls._stats[name], float) else 0
+
+
+class _InstrumentedCheckout:
+    # Times every checkout, including waits for a free connection
+    def _do_get(self):
+        start = time.perf_counter()
+        overflow_before = self._overflow
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            PoolMetrics.record("timeouts")
+            raise
+        PoolMetrics.record_checkout(time.perf_counter() - start, self._overflow > max(overflow_before, 0))
+        return connection
+
+
+class InstrumentedQueuePool(_InstrumentedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(database_url: str, use_async: bool = False) -> dict:
+    """
+    create_engine() keyword arguments for the given URL: an instrumented, sized
+    QueuePool for server databases and SQLite files, SQLite's defaults otherwise.
+    With use_async the options are for create_async_engine().
+    """
+    options = {"pool_pre_ping": PRE_PING == "always"}
+
+    if database_url.startswith("sqlite"):
+        # Sessions are handed between threads (threadpool, write buffer, enrichment
+        # workers), never used by two at once, so SQLite's same-thread check is off
+        options["connect_args"] = {"check_same_thread": False}
+        if is_sqlite_memory(database_url):
+            return options  # one shared in-memory connection; a pool would lose the data
+    else:
+        options["pool_recycle"] = POOL_RECYCLE
+
+    options.update({
+        "poolclass": InstrumentedAsyncQueuePool if use_async else InstrumentedQueuePool,
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+    })
+    return options
+
+
+def is_sqlite_memory(database_url: str) -> bool:
+    return database_url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in database_url
+
+
+def install_engine_listeners(engine) -> None:
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _configure_sqlite)
+
+    if PRE_PING == "idle":
+        event.listen(engine, "checkin", _mark_idle)
+        event.listen(engine, "checkout", _ping_if_idle)
+
+    if METRICS_ENABLED:
+        instrument_engine(engine)
+
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL lets readers run while a write is in progress; NORMAL only syncs at checkpoints
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    finally:
+        cursor.close()
+
+
+def _mark_idle(dbapi_connection, connection_record):
+    connection_record.info["checked_in_at"] = time.monotonic()
+
+
+def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+    checked_in_at = connection_record.info.get("checked_in_at")
+    if checked_in_at is None or time.monotonic() - checked_in_at < PRE_PING_IDLE_SECONDS:
+        return
+
+    try:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+    except Exception:
+        # The pool discards this connection and retries the checkout with a fresh one
+        PoolMetrics.record("stale_connections")
+        raise DisconnectionError("Idle connection failed the pre-ping")
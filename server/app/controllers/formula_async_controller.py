@@ -0,0 +1,105 @@
+import asyncio
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+from app.controllers.formula_controller import FormulaController
+from app.schemas.schemas import FormulaResponse
+from app.services.enrichment_service import EnrichmentQueue
+from app.services.formula_history_async_service import AsyncFormulaHistoryService
+from app.services.history_write_buffer import HistoryWriteBuffer
+from app.services.pubchem_async_service import AsyncPubChemService
+from app.services.pubchem_cache_service import PubChemCache
+from app.utils.metrics import span
+
+
+class AsyncFormulaController:
+    """
+    The formula endpoints on an AsyncSession, for the async routes. Calculation
+    awaits PubChem and the history insert on the event loop. The history reads and
+    edits run the sync controller's methods inside AsyncSession.run_sync, so
+    ETags, 304s and the /recent cache behave exactly as on the sync routes.
+    """
+
+    def __init__(self, controller: FormulaController):
+        self.controller = controller
+
+#=====================================================================================
+
+    async def calculate_formula(self, formula: str, request: Request, db, background: bool = False) -> FormulaResponse:
+        try:
+            with span("molar_mass"):
+                molar_mass = self.controller.formula_service.calculate_molar_mass(formula)
+            user_ip = self.controller._get_client_ip(request)
+            
+            if background and await asyncio.to_thread(PubChemCache.get, formula) is None:
+                return await self._calculate_with_background_enrichment(formula, molar_mass, user_ip, db)
+            
+            with span("pubchem"):
+                properties = await AsyncPubChemService.get_chemical_properties(formula)
+            
+            formula_id = None
+            with span("history_write"):
+                if HistoryWriteBuffer.ENABLED:
+                    HistoryWriteBuffer.add({
+                        "formula": formula,
+                        "molar_mass": molar_mass,
+                        "user_ip": user_ip,
+                        "properties": properties
+                    })
+                else:
+                    formula_id = await AsyncFormulaHistoryService.insert_formula_entry(
+                        db,
+                        formula=formula,
+                        molar_mass=molar_mass,
+                        user_ip=user_ip,
+                        properties=properties
+                    )
+            
+            with span("response"):
+                return self.controller._build_formula_response(formula, molar_mass, properties, formula_id)
+            
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Calculation failed: {str(e)}")
+
+
+    async def _calculate_with_background_enrichment(self, formula: str, molar_mass: float, user_ip: str, db) -> FormulaResponse:
+        formula_id = await AsyncFormulaHistoryService.insert_formula_entry(
+            db,
+            formula=formula,
+            molar_mass=molar_mass,
+            user_ip=user_ip,
+            enrichment_status="pending"
+        )
+        
+        if not EnrichmentQueue.submit(formula_id, formula):
+            # Queue is full: enrich inline rather than leaving the row pending
+            properties = await AsyncPubChemService.get_chemical_properties(formula)
+            await AsyncFormulaHistoryService.apply_enrichment(db, [formula_id], properties, "complete")
+            return self.controller._build_formula_response(formula, molar_mass, properties, formula_id, "complete")
+        
+        return self.controller._build_formula_response(formula, molar_mass, None, formula_id, "pending")
+
+#=====================================================================================
+
+    async def get_recent_formulas(self, db, request: Request, view: str = "full") -> Response:
+        return await db.run_sync(lambda session: self.controller.get_recent_formulas(session, request, view))
+
+    async def get_formula_history(self, db, request: Request, skip: int = 0, limit: int = 10, view: str = "full") -> Response:
+        return await db.run_sync(lambda session: self.controller.get_formula_history(session, request, skip, limit, view))
+
+    async def get_formula_history_page(self, db, request: Request, cursor=None, limit: int = 10, view: str = "full") -> Response:
+        return await db.run_sync(lambda session: self.controller.get_formula_history_page(session, request, cursor, limit, view))
+
+    async def search_formulas(self, db, query: str, limit: int = 10):
+        return await db.run_sync(lambda session: self.controller.search_formulas(session, query, limit))
+
+    async def get_formula_by_id(self, formula_id: int, db, request: Request) -> Response:
+        return await db.run_sync(lambda session: self.controller.get_formula_by_id(formula_id, session, request))
+
+    async def update_formula(self, formula_id: int, formula_data: dict, db):
+        return await db.run_sync(lambda session: self.controller.update_formula(formula_id, formula_data, session))
+
+    async def delete_formula(self, formula_id: int, db):
+        return await db.run_sync(lambda session: self.controller.delete_formula(formula_id, session))
@@ -1,52 +1,154 @@
-from typing import List
+import asyncio
+import json
+import os
+import time
+from datetime import date, datetime
+from functools import cached_property
+from typing import List, Optional
 from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from app.schemas.schemas import FormulaResponse, FormulaHistoryModel
+from app.config.database_config import SessionLocal
+from app.schemas.schemas import (
+    FormulaResponse, FormulaHistoryModel, FormulaHistorySummary, FormulaHistoryPage,
+    BatchFormulaRequest, BatchFormulaResult, BatchFormulaResponse,
+    IsotopeRequest, IsotopePeak, IsotopePatternResult, IsotopeResponse,
+    FormulaUsageStat, UsageBucketStat, DailyClientStat, ClientStats
+)
 from app.services.formula_service import FormulaService
 from app.services.pubchem_service import PubChemService
+from app.services.pubchem_async_service import AsyncPubChemService
+from app.services.pubchem_cache_service import PubChemCache
+from app.services.local_compound_store import LocalCompoundStore
+from app.services.search_service import CompoundSearch
+from app.services.autocomplete_service import AutocompleteIndex
+from app.services.isotope_service import IsotopeService
+from app.services.usage_stats_service import UsageStatsService
 from app.services.formula_history_service import FormulaHistoryService
+from app.services.enrichment_service import EnrichmentQueue
+from app.services.history_write_buffer import HistoryWriteBuffer
+from app.services.recent_response_cache import RecentResponseCache
+from app.services.bulk_calculation_service import BulkCalculationSession, iter_request_lines
+from app.utils.http_cache import cache_headers, etag_matches, make_etag, not_modified
+from app.utils.metrics import span
+from app.utils.streaming import DuplexStreamingResponse
+
+
+HISTORY_LIST = TypeAdapter(List[FormulaHistoryModel])
+SUMMARY_LIST = TypeAdapter(List[FormulaHistorySummary])
+HISTORY_PAGE = TypeAdapter(FormulaHistoryPage)
 
 
 class FormulaController:
-    def __init__(self):
-        self.formula_service = FormulaService()
+    EVENT_POLL_INTERVAL = float(os.getenv("ENRICHMENT_EVENT_POLL_INTERVAL", 0.5))
+    EVENT_STREAM_TIMEOUT = float(os.getenv("ENRICHMENT_EVENT_TIMEOUT", 60))
+    BATCH_MAX_FORMULAS = int(os.getenv("BATCH_MAX_FORMULAS", 10000))
+
+    @cached_property
+    def formula_service(self) -> FormulaService:
+        # Built on first use; the controller itself is created when the routes are imported
+        return FormulaService()
         
 #=====================================================================================
 
-    def calculate_formula(self, formula: str, request: Request, db: Session) -> FormulaResponse:
+    def calculate_formula(self, formula: str, request: Request, db: Session, background: bool = False) -> FormulaResponse:
         try:
             # Calculate molar mass
-            molar_mass = self.formula_service.calculate_molar_mass(formula)
-            
-            # Try to get additional properties from PubChem
-            properties = PubChemService.get_chemical_properties(formula)
+            with span("molar_mass"):
+                molar_mass = self.formula_service.calculate_molar_mass(formula)
             
             # Get user IP if available
             user_ip = self._get_client_ip(request)
             
-            # Save the calculation to history and get the saved entry
-            db_formula = FormulaHistoryService.create_formula_entry(
-                db=db,
-                formula=formula,
-                molar_mass=molar_mass,
-                user_ip=user_ip,
-                properties=properties
-            )
+            # Return right away and let the worker pool fill in PubChem data,
+            # unless the properties are already cached and cost nothing to add
+            if background and PubChemCache.get(formula) is None:
+                return self._calculate_with_background_enrichment(formula, molar_mass, user_ip, db)
+            
+            # Try to get additional properties from PubChem
+            with span("pubchem"):
+                properties = PubChemService.get_chemical_properties(formula)
+            
+            # Save the calculation to history. With the write buffer enabled the row is
+            # flushed in a later batch, so there is no id to return yet
+            formula_id = None
+            with span("history_write"):
+                if HistoryWriteBuffer.ENABLED:
+                    HistoryWriteBuffer.add({
+                        "formula": formula,
+                        "molar_mass": molar_mass,
+                        "user_ip": user_ip,
+                        "properties": properties
+                    })
+                else:
+                    formula_id = FormulaHistoryService.insert_formula_entry(
+                        db=db,
+                        formula=formula,
+                        molar_mass=molar_mass,
+                        user_ip=user_ip,
+                        properties=properties
+                    )
+            
+            with span("response"):
+                return self._build_formula_response(formula, molar_mass, properties, formula_id)
+            
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Calculation failed: {str(e)}")
+
+
+#=====================================================================================
+
+
+    def _calculate_with_background_enrichment(self, formula: str, molar_mass: float, user_ip: str, db: Session) -> FormulaResponse:
+        # The worker needs the row id, so this write is never buffered
+        formula_id = FormulaHistoryService.insert_formula_entry(
+            db=db,
+            formula=formula,
+            molar_mass=molar_mass,
+            user_ip=user_ip,
+            enrichment_status="pending"
+        )
+        
+        if not EnrichmentQueue.submit(formula_id, formula):
+            # Queue is full: enrich inline rather than leaving the row pending
+            properties = PubChemService.get_chemical_properties(formula)
+            FormulaHistoryService.apply_enrichment(db, [formula_id], properties, "complete")
+            return self._build_formula_response(formula, molar_mass, properties, formula_id, "complete")
+        
+        return self._build_formula_response(formula, molar_mass, None, formula_id, "pending")
+
+
+#=====================================================================================
+
+
+    async def calculate_formula_async(self, formula: str, request: Request, db: Session) -> FormulaResponse:
+        try:
+            with span("molar_mass"):
+                molar_mass = self.formula_service.calculate_molar_mass(formula)
             
-            # Create response from the database entry
-            # This ensures all properties are consistently handled
-            response_data = {
-                "formula": db_formula.formula,
-                "molar_mass": round(db_formula.molar_mass, 6),  # Round to 6 decimal places for display
-                "unit": "g/mol"
-            }
+            # The PubChem fan-out runs concurrently on the event loop
+            with span("pubchem"):
+                properties = await AsyncPubChemService.get_chemical_properties(formula)
             
-            # Add all available properties from the database entry
-            for field in FormulaResponse.__annotations__:
-                if field not in response_data and hasattr(db_formula, field) and getattr(db_formula, field):
-                    response_data[field] = getattr(db_formula, field)
+            user_ip = self._get_client_ip(request)
+            
+            # The session is synchronous, so keep the commit off the event loop
+            with span("history_write"):
+                formula_id = await run_in_threadpool(
+                    FormulaHistoryService.insert_formula_entry,
+                    db=db,
+                    formula=formula,
+                    molar_mass=molar_mass,
+                    user_ip=user_ip,
+                    properties=properties
+                )
             
-            return FormulaResponse(**response_data)
+            with span("response"):
+                return self._build_formula_response(formula, molar_mass, properties, formula_id)
             
         except ValueError as ve:
             raise HTTPException(status_code=400, detail=str(ve))
@@ -56,41 +158,243 @@ class FormulaController:
 
 #=====================================================================================
 
+
+    def calculate_formula_batch(self, batch_request: BatchFormulaRequest, request: Request, db: Session) -> BatchFormulaResponse:
+        formulas = batch_request.formulas
+        if len(formulas) > self.BATCH_MAX_FORMULAS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch too large: {len(formulas)} formulas (maximum {self.BATCH_MAX_FORMULAS})"
+            )
+        
+        try:
+            # All molar masses in one vectorized pass; bad formulas come back as inline errors
+            calculated = self.formula_service.calculate_molar_masses(formulas)
+            
+            properties_by_formula = {}
+            if batch_request.enrich:
+                distinct = list(dict.fromkeys(f for f, (mass, _) in zip(formulas, calculated) if mass is not None))
+                properties_by_formula = self._get_properties_many(distinct)
+            
+            results = []
+            for formula, (molar_mass, error) in zip(formulas, calculated):
+                results.append(BatchFormulaResult(
+                    formula=formula,
+                    molar_mass=round(molar_mass, 6) if molar_mass is not None else None,
+                    error=error,
+                    properties=properties_by_formula.get(formula) if batch_request.enrich and error is None else None
+                ))
+            
+            saved = 0
+            if batch_request.save:
+                user_ip = self._get_client_ip(request)
+                saved = FormulaHistoryService.create_formula_entries(db, [
+                    {
+                        "formula": formula,
+                        "molar_mass": molar_mass,
+                        "user_ip": user_ip,
+                        "properties": properties_by_formula.get(formula)
+                    }
+                    for formula, (molar_mass, error) in zip(formulas, calculated) if error is None
+                ])
+            
+            failed = sum(1 for result in results if result.error)
+            return BatchFormulaResponse(results=results, succeeded=len(results) - failed, failed=failed, saved=saved)
+            
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Batch calculation failed: {str(e)}")
+    
     
-    def get_recent_formulas(self, db: Session) -> List[FormulaHistoryModel]:
+    def calculate_isotopes(self, isotope_request: IsotopeRequest) -> IsotopeResponse:
+        formulas = isotope_request.formulas
+        if len(formulas) > self.BATCH_MAX_FORMULAS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch too large: {len(formulas)} formulas (maximum {self.BATCH_MAX_FORMULAS})"
+            )
+        
         try:
-            formulas = FormulaHistoryService.get_recent_formulas(db)
-            return [FormulaHistoryModel.model_validate(formula) for formula in formulas]
+            results = []
+            patterns = IsotopeService.isotope_patterns(formulas, isotope_request.threshold, isotope_request.max_peaks)
+            for formula, (pattern, error) in zip(formulas, patterns):
+                if pattern is None:
+                    results.append(IsotopePatternResult(formula=formula, error=error))
+                    continue
+                results.append(IsotopePatternResult(
+                    formula=formula,
+                    charge=pattern.charge,
+                    monoisotopic_mass=round(pattern.monoisotopic_mass, 6),
+                    average_mass=round(pattern.average_mass, 6),
+                    most_abundant_mass=round(pattern.most_abundant_mass, 6),
+                    nominal_mass=pattern.nominal_mass,
+                    peaks=[
+                        IsotopePeak(mass=round(mass, 6), abundance=round(abundance, 4), probability=probability)
+                        for mass, abundance, probability in pattern.peaks
+                    ],
+                    estimated_elements=pattern.estimated_elements
+                ))
+            
+            failed = sum(1 for result in results if result.error)
+            return IsotopeResponse(results=results, succeeded=len(results) - failed, failed=failed)
+            
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to fetch history: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Isotope calculation failed: {str(e)}")
     
     
+    async def calculate_formula_stream(self, request: Request, input_format: Optional[str], output_format: Optional[str], save: bool) -> DuplexStreamingResponse:
+        if input_format is None:
+            input_format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+        
+        try:
+            session = BulkCalculationSession(
+                self.formula_service,
+                input_format=input_format,
+                output_format=output_format,
+                save=save,
+                user_ip=self._get_client_ip(request)
+            )
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        
+        async def results():
+            # The body is only read as fast as the client consumes results,
+            # and at most one chunk of rows is held in memory
+            chunk = []
+            try:
+                async for line in iter_request_lines(request.stream(), session.MAX_LINE_BYTES):
+                    chunk.append(line)
+                    if len(chunk) >= session.CHUNK_SIZE:
+                        yield "".join(await run_in_threadpool(session.process_lines, chunk))
+                        chunk = []
+                if chunk:
+                    yield "".join(await run_in_threadpool(session.process_lines, chunk))
+            except ValueError as ve:
+                yield json.dumps({"error": str(ve)}) + "\n" if session.output_format == "ndjson" else f"# error={ve}\n"
+            yield session.format_summary()
+        
+        media_type = "text/csv" if session.output_format == "csv" else "application/x-ndjson"
+        return DuplexStreamingResponse(results(), media_type=media_type)
+    
+    
+    def _get_properties_many(self, formulas: List[str]) -> dict:
+        # Cached formulas return immediately; the rest are fetched many CIDs per PubChem request
+        fetched = PubChemService.get_chemical_properties_many(formulas)
+        return {
+            formula: {field: properties[field] for field in ("cid",) + FormulaHistoryService.PROPERTY_FIELDS if field in properties}
+            for formula, properties in fetched.items()
+        }
+
+
 #=====================================================================================
 
+    
+    def get_recent_formulas(self, db: Session, request: Request, view: str = "full") -> Response:
+        try:
+            generation = FormulaHistoryService.generation()
+            cached = RecentResponseCache.get(view, generation)
+            if cached:
+                etag, body = cached
+            else:
+                # The ETag comes from the ids and versions of the newest rows only
+                versions = FormulaHistoryService.get_recent_formulas(db, view="version")
+                etag = make_etag("recent", view, [tuple(row) for row in versions])
+                body = RecentResponseCache.revalidate(view, generation, etag)
+                if body is None:
+                    if etag_matches(request, etag):
+                        return not_modified(etag)
+                    formulas = FormulaHistoryService.get_recent_formulas(db, view=view)
+                    body = self._dump_history(formulas, view)
+                    RecentResponseCache.put(view, generation, etag, body)
+
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            return Response(content=body, media_type="application/json", headers=cache_headers(etag))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to fetch history: {str(e)}")
+
+
+#=====================================================================================
 
-    def get_formula_history(self, db: Session, skip: int = 0, limit: int = 10) -> List[FormulaHistoryModel]:
+
+    def get_formula_history(self, db: Session, request: Request, skip: int = 0, limit: int = 10, view: str = "full") -> Response:
         try:
-            formulas = FormulaHistoryService.get_formula_history(db, skip, limit)
-            return [FormulaHistoryModel.model_validate(formula) for formula in formulas]
+            versions = FormulaHistoryService.get_formula_history(db, skip, limit, view="version")
+            etag = make_etag("history", view, skip, limit, [tuple(row) for row in versions])
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+            formulas = FormulaHistoryService.get_formula_history(db, skip, limit, view=view)
+            return Response(content=self._dump_history(formulas, view), media_type="application/json", headers=cache_headers(etag))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to fetch history: {str(e)}")
-    
+
+
+    def get_formula_history_page(self, db: Session, request: Request, cursor: Optional[str] = None, limit: int = 10, view: str = "full") -> Response:
+        try:
+            versions, _ = FormulaHistoryService.get_formula_history_page(db, cursor, limit, view="version")
+            etag = make_etag("history_page", view, cursor, limit, [tuple(row) for row in versions])
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+            formulas, next_cursor = FormulaHistoryService.get_formula_history_page(db, cursor, limit, view=view)
+            # The items are validated models already; skip re-checking them against the Union
+            page = FormulaHistoryPage.model_construct(items=self._history_items(formulas, view), next_cursor=next_cursor)
+            return Response(content=HISTORY_PAGE.dump_json(page), media_type="application/json", headers=cache_headers(etag))
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to fetch history: {str(e)}")
+
+
+    def search_formulas(self, db: Session, query: str, limit: int = 10) -> List[FormulaHistoryModel]:
+        try:
+            return [FormulaHistoryModel.model_validate(entry) for entry in CompoundSearch.search(db, query, limit)]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> List[dict]:
+        # Answered from memory; no database round trip
+        return AutocompleteIndex.complete(prefix, limit)
+
+
+    def _history_items(self, formulas, view: str) -> list:
+        model = FormulaHistorySummary if view == "summary" else FormulaHistoryModel
+        return [model.model_validate(formula) for formula in formulas]
+
+
+    def _dump_history(self, formulas, view: str) -> bytes:
+        # Serialized here rather than by FastAPI: the response carries an ETag, and going
+        # through the route's full/summary Union response_model would re-validate every row
+        adapter = SUMMARY_LIST if view == "summary" else HISTORY_LIST
+        return adapter.dump_json(self._history_items(formulas, view))
+
 
 #=====================================================================================
 
-            
-    def get_formula_by_id(self, formula_id: int, db: Session) -> FormulaHistoryModel:
+
+    def get_formula_by_id(self, formula_id: int, db: Session, request: Request) -> Response:
         try:
+            # A primary-key lookup of the version columns decides between 304, 404 and a full load
+            version = FormulaHistoryService.get_entry_version(db, formula_id)
+            if version is None:
+                raise HTTPException(status_code=404, detail=f"Formula with ID {formula_id} not found")
+
+            etag = make_etag("formula", tuple(version))
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
             formula = FormulaHistoryService.get_formula_by_id(db, formula_id)
             if not formula:
                 raise HTTPException(status_code=404, detail=f"Formula with ID {formula_id} not found")
-            return FormulaHistoryModel.model_validate(formula)
+            content = FormulaHistoryModel.model_validate(formula).model_dump_json()
+            return Response(content=content, media_type="application/json", headers=cache_headers(etag))
         except HTTPException:
             raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to retrieve formula: {str(e)}")
 
-        
+
 #=====================================================================================
 
 
@@ -121,6 +425,121 @@ class FormulaController:
         
 #=====================================================================================
 
+
+    async def stream_formula_events(self, formula_id: int) -> StreamingResponse:
+        record = await run_in_threadpool(self._load_formula_record, formula_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail=f"Formula with ID {formula_id} not found")
+        
+        async def events():
+            nonlocal record
+            deadline = time.monotonic() + self.EVENT_STREAM_TIMEOUT
+            
+            # Each poll is a single primary-key lookup, so this works across workers
+            while record.enrichment_status == "pending":
+                if time.monotonic() >= deadline:
+                    yield f"event: timeout\ndata: {record.model_dump_json()}\n\n"
+                    return
+                yield ": pending\n\n"
+                await asyncio.sleep(self.EVENT_POLL_INTERVAL)
+                record = await run_in_threadpool(self._load_formula_record, formula_id)
+                if record is None:
+                    yield f"event: deleted\ndata: {{\"id\": {formula_id}}}\n\n"
+                    return
+            
+            yield f"event: enriched\ndata: {record.model_dump_json()}\n\n"
+        
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    
+    def _load_formula_record(self, formula_id: int) -> Optional[FormulaHistoryModel]:
+        db = SessionLocal()
+        try:
+            formula = FormulaHistoryService.get_formula_by_id(db, formula_id)
+            return FormulaHistoryModel.model_validate(formula) if formula else None
+        finally:
+            db.close()
+
+
+#=====================================================================================
+
+
+    def get_cache_stats(self) -> dict:
+        return {
+            **PubChemCache.stats(),
+            "coalescing": {
+                "sync": PubChemService._single_flight.stats(),
+                "async": AsyncPubChemService._single_flight.stats()
+            },
+            "circuit_breaker": PubChemService._breaker.stats(),
+            "local_store": LocalCompoundStore.stats(),
+            "recent_responses": RecentResponseCache.stats(),
+            "autocomplete": AutocompleteIndex.stats()
+        }
+    
+    
+    def get_enrichment_stats(self) -> dict:
+        return EnrichmentQueue.stats()
+    
+    
+    # Usage analytics; each reads only the rollup tables
+    def get_top_formulas(self, db: Session, limit: int = 10) -> List[FormulaUsageStat]:
+        try:
+            return [FormulaUsageStat.model_validate(usage) for usage in UsageStatsService.top_formulas(db, limit)]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to fetch usage stats: {str(e)}")
+    
+    
+    def get_request_counts(self, db: Session, granularity: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[UsageBucketStat]:
+        default_start, default_end = UsageStatsService.default_range(granularity)
+        try:
+            buckets = UsageStatsService.request_counts(db, granularity, start or default_start, end or default_end)
+            return [UsageBucketStat.model_validate(bucket) for bucket in buckets]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to fetch usage stats: {str(e)}")
+    
+    
+    def get_client_counts(self, db: Session, start: Optional[date] = None, end: Optional[date] = None) -> ClientStats:
+        default_start, default_end = UsageStatsService.default_range("day")
+        try:
+            days, total = UsageStatsService.client_counts(db, start or default_start.date(), end or default_end.date())
+            return ClientStats(
+                days=[DailyClientStat(day=day, unique_clients=count) for day, count in days],
+                unique_clients=total
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to fetch usage stats: {str(e)}")
+
+
+#=====================================================================================
+
+    
+    def _build_formula_response(self,
+                                formula: str,
+                                molar_mass: float,
+                                properties: Optional[dict] = None,
+                                formula_id: Optional[int] = None,
+                                enrichment_status: Optional[str] = None) -> FormulaResponse:
+        # Built from the values that were written, so the saved row never has to be read back
+        response_data = {
+            "id": formula_id,
+            "formula": formula,
+            "molar_mass": round(molar_mass, 6),  # Round to 6 decimal places for display
+            "unit": "g/mol",
+            "enrichment_status": enrichment_status
+        }
+        
+        # Add the PubChem properties that are stored on a history entry
+        for field in FormulaHistoryService.PROPERTY_FIELDS:
+            if properties and properties.get(field):
+                response_data[field] = properties[field]
+        
+        return FormulaResponse(**response_data)
+    
     
     def _get_client_ip(self, request: Request) -> str:
         # Check for X-Forwarded-For header first (common with proxies)
@@ -0,0 +1,41 @@
+from sqlalchemy import Column, Integer, String, DateTime, func, Text
+from app.config.database_config import Base
+
+
+class Compound(Base):
+    __tablename__ = "compounds"
+
+    id = Column(Integer, primary_key=True, index=True)
+    formula_key = Column(String(100), unique=True, nullable=False)  # formula spelling, see CompoundService.compound_key; "row:<id>" for a private copy
+    hill_formula = Column(String(100), nullable=True, index=True)  # Hill-order formula; isomers share it, so not unique
+    cid = Column(Integer, nullable=True, index=True)  # PubChem compound ID
+    created_at = Column(DateTime, default=func.now())
+    version = Column(Integer, default=1, nullable=True)  # bumped on edits; part of the history ETags
+
+    # Physical properties
+    boiling_point = Column(String(100), nullable=True)
+    melting_point = Column(String(100), nullable=True)
+    flash_point = Column(String(100), nullable=True)
+    density = Column(String(100), nullable=True)
+    state_at_room_temp = Column(String(50), nullable=True)
+
+    # Chemical identifiers
+    iupac_name = Column(String(255), nullable=True)
+    common_name = Column(String(255), nullable=True)
+    synonyms = Column(Text, nullable=True)  # Store as JSON string or comma-separated values
+    smiles = Column(String(500), nullable=True)  # SMILES notation for molecular structure
+
+    # Hazard information
+    hazard_classification = Column(String(255), nullable=True)
+    hazard_statements = Column(Text, nullable=True)  # GHS hazard statements
+    precautionary_statements = Column(Text, nullable=True)  # GHS precautionary statements
+
+    # Structural information
+    structure_image_url = Column(String(255), nullable=True)  # 2D structure
+    structure_image_svg_url = Column(String(255), nullable=True)  # 2D structure as SVG
+    structure_3d_url = Column(String(255), nullable=True)  # URL to 3D structure model
+    crystal_structure = Column(String(255), nullable=True)  # Crystal system/structure type
+
+    # Additional information
+    description = Column(Text, nullable=True)  # General description of the compound
+    compound_url = Column(String(255), nullable=True)  # Reference URL
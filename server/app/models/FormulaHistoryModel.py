@@ -1,9 +1,16 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, func, Text
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, Float, DateTime, func
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.orm import relationship
 from app.config.database_config import Base
+from app.models.CompoundModel import Compound
 
 
 class FormulaHistory(Base):
     __tablename__ = "formulas"
+    __table_args__ = (
+        # Newest-first listing and keyset pagination on (timestamp, id)
+        Index("ix_formulas_timestamp_id", "timestamp", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     formula = Column(String(100), index=True)
@@ -11,31 +18,41 @@ class FormulaHistory(Base):
     timestamp = Column(DateTime, default=func.now())
     user_ip = Column(String(45), nullable=True)  # IPv6 addresses can be long
     
+    # PubChem data lives once per compound (see CompoundModel); rows without a compound read None
+    compound_id = Column(Integer, ForeignKey("compounds.id"), nullable=True, index=True)
+    compound = relationship(Compound, lazy="selectin")  # one extra IN query per page, not a join per row
+    
     # Physical properties
-    boiling_point = Column(String(100), nullable=True)
-    melting_point = Column(String(100), nullable=True)
-    flash_point = Column(String(100), nullable=True)
-    density = Column(String(100), nullable=True)
-    state_at_room_temp = Column(String(50), nullable=True)
+    boiling_point = association_proxy("compound", "boiling_point")
+    melting_point = association_proxy("compound", "melting_point")
+    flash_point = association_proxy("compound", "flash_point")
+    density = association_proxy("compound", "density")
+    state_at_room_temp = association_proxy("compound", "state_at_room_temp")
     
     # Chemical identifiers
-    iupac_name = Column(String(255), nullable=True)
-    common_name = Column(String(255), nullable=True)
-    synonyms = Column(Text, nullable=True)  # Store as JSON string or comma-separated values
-    smiles = Column(String(500), nullable=True)  # SMILES notation for molecular structure
+    iupac_name = association_proxy("compound", "iupac_name")
+    common_name = association_proxy("compound", "common_name")
+    synonyms = association_proxy("compound", "synonyms")
+    smiles = association_proxy("compound", "smiles")
     
     # Hazard information
-    hazard_classification = Column(String(255), nullable=True)
-    hazard_statements = Column(Text, nullable=True)  # GHS hazard statements
-    precautionary_statements = Column(Text, nullable=True)  # GHS precautionary statements
+    hazard_classification = association_proxy("compound", "hazard_classification")
+    hazard_statements = association_proxy("compound", "hazard_statements")
+    precautionary_statements = association_proxy("compound", "precautionary_statements")
     
     # Structural information
-    structure_image_url = Column(String(255), nullable=True)  # 2D structure
-    structure_image_svg_url = Column(String(255), nullable=True)  # 2D structure as SVG
-    structure_3d_url = Column(String(255), nullable=True)  # URL to 3D structure model
-    crystal_structure = Column(String(255), nullable=True)  # Crystal system/structure type
+    structure_image_url = association_proxy("compound", "structure_image_url")
+    structure_image_svg_url = association_proxy("compound", "structure_image_svg_url")
+    structure_3d_url = association_proxy("compound", "structure_3d_url")
+    crystal_structure = association_proxy("compound", "crystal_structure")
     
     # Additional information
-    description = Column(Text, nullable=True)  # General description of the compound
-    compound_url = Column(String(255), nullable=True)  # Reference URL
+    description = association_proxy("compound", "description")
+    compound_url = association_proxy("compound", "compound_url")
+    
+    # Background enrichment: "pending", "complete" or "failed"; NULL when enriched inline
+    enrichment_status = Column(String(20), nullable=True)
+    
+    # Bumped by every update of the row (see FormulaHistoryService); part of the HTTP ETag
+    version = Column(Integer, default=1, nullable=True)
     
\ No newline at end of file
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Float, Text, Boolean
+from app.config.database_config import Base
+
+
+class PubChemCacheEntry(Base):
+    __tablename__ = "pubchem_cache"
+
+    # "formula:<normalized formula>" or "cid:<cid>"
+    cache_key = Column(String(255), primary_key=True)
+    payload = Column(Text, nullable=True)  # PubChem properties stored as a JSON string
+    is_negative = Column(Boolean, default=False)  # True when PubChem has no compound for the key
+    created_at = Column(Float)  # Unix timestamps, so TTL checks don't depend on DB timezones
+    expires_at = Column(Float, index=True)
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Date, DateTime, Index, Integer, String
+from app.config.database_config import Base
+
+
+# Rollups of the `formulas` table, maintained by UsageStatsService as history rows are
+# written, so the /stats endpoints never scan the history itself
+
+
+class FormulaUsage(Base):
+    __tablename__ = "formula_usage"
+    __table_args__ = (
+        # Top formulas: read the first rows of this index instead of sorting the table
+        Index("ix_formula_usage_requests", "requests"),
+    )
+
+    formula_key = Column(String(100), primary_key=True)  # formula spelling, like compounds.formula_key
+    formula = Column(String(100), nullable=True)  # first spelling seen, for display
+    requests = Column(Integer, nullable=False, default=0)
+    last_seen = Column(DateTime, nullable=True)
+
+
+class UsageBucket(Base):
+    __tablename__ = "usage_buckets"
+
+    granularity = Column(String(4), primary_key=True)  # "hour" or "day"
+    bucket_start = Column(DateTime, primary_key=True)  # UTC
+    requests = Column(Integer, nullable=False, default=0)
+
+
+class DailyClient(Base):
+    __tablename__ = "usage_daily_clients"
+
+    # One row per client IP per day; a day's unique clients is a primary-key range count
+    day = Column(Date, primary_key=True)
+    user_ip = Column(String(45), primary_key=True)
@@ -0,0 +1,153 @@
+from typing import List, Literal, Optional, Union
+from fastapi import APIRouter, Depends, Query, Request
+
+from app.config.async_database_config import get_async_db
+from app.controllers.formula_async_controller import AsyncFormulaController
+from app.routes.formula_routes import formula_controller
+from app.services.enrichment_service import EnrichmentQueue
+from app.schemas.schemas import (
+    FormulaRequest, FormulaResponse, FormulaHistoryModel, FormulaHistorySummary, FormulaHistoryPage,
+    AutocompleteSuggestion
+)
+
+
+# Async handlers for the database-bound formula routes. Included ahead of the sync
+# router when ASYNC_DATABASE_ENABLED=true, so they take over these paths; the
+# remaining routes (batch, stream, stats, events) are served by formula_routes.
+router = APIRouter(prefix="/api/formula", tags=["Formula Operations"])
+
+
+async_formula_controller = AsyncFormulaController(formula_controller)
+
+#=====================================================================================
+
+@router.post("/" , response_model=FormulaResponse)
+async def calculate_formula(
+    formula_request: FormulaRequest,
+    request: Request,
+    db = Depends(get_async_db),  #AsyncSession
+    background: bool = EnrichmentQueue.BACKGROUND_BY_DEFAULT
+    ):
+    return await async_formula_controller.calculate_formula(
+        formula=formula_request.formula,
+        request=request,
+        db=db,
+        background=background
+    )
+    
+#=====================================================================================
+
+@router.get("/recent", response_model=Union[List[FormulaHistoryModel], List[FormulaHistorySummary]])
+async def get_recent_formulas(
+    request: Request,
+    db = Depends(get_async_db),
+    view: Literal["full", "summary"] = "full"
+    ):
+    return await async_formula_controller.get_recent_formulas(
+        db=db,
+        request=request,
+        view=view
+    )
+    
+#=====================================================================================
+
+@router.get("/history", response_model=Union[List[FormulaHistoryModel], List[FormulaHistorySummary]])
+async def get_formula_history(
+    request: Request,
+    db = Depends(get_async_db),
+    skip: int = 0,
+    limit: int = 10,
+    view: Literal["full", "summary"] = "full"
+    ):
+    return await async_formula_controller.get_formula_history(
+        db=db,
+        request=request,
+        skip=skip,
+        limit=limit,
+        view=view
+    )
+    
+#=====================================================================================
+
+@router.get("/history/page", response_model=FormulaHistoryPage)
+async def get_formula_history_page(
+    request: Request,
+    db = Depends(get_async_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=1000),
+    view: Literal["full", "summary"] = "full"
+    ):
+    return await async_formula_controller.get_formula_history_page(
+        db=db,
+        request=request,
+        cursor=cursor,
+        limit=limit,
+        view=view
+    )
+    
+#=====================================================================================
+
+@router.get("/search", response_model=List[FormulaHistoryModel])
+async def search_formulas(
+    q: str = Query(..., min_length=1, max_length=200),
+    db = Depends(get_async_db),
+    limit: int = Query(10, ge=1, le=100)
+    ):
+    return await async_formula_controller.search_formulas(
+        db=db,
+        query=q,
+        limit=limit
+    )
+    
+#=====================================================================================
+
+@router.get("/autocomplete", response_model=List[AutocompleteSuggestion])
+async def autocomplete(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=50)
+    ):
+    # Served from memory; declared here only so /{formula_id} below doesn't capture it
+    return formula_controller.autocomplete(
+        prefix=q,
+        limit=limit
+    )
+    
+#=====================================================================================
+
+@router.get("/{formula_id}", response_model=FormulaHistoryModel)
+async def get_formula_by_id(
+    formula_id: int,
+    request: Request,
+    db = Depends(get_async_db)
+    ):
+    return await async_formula_controller.get_formula_by_id(
+        formula_id=formula_id,
+        db=db,
+        request=request
+    )
+    
+#=====================================================================================
+
+@router.put("/{formula_id}" , response_model=FormulaHistoryModel)
+async def update_formula(
+    formula_id: int,
+    formula_data: dict,
+    db = Depends(get_async_db)
+    ):
+    return await async_formula_controller.update_formula(
+        formula_id=formula_id,
+        formula_data=formula_data,
+        db=db
+    )
+    
+#=====================================================================================
+
+@router.delete("/{formula_id}")
+async def delete_formula(
+    formula_id: int,
+    db = Depends(get_async_db)
+    ):
+    return await async_formula_controller.delete_formula(
+        formula_id=formula_id,
+        db=db
+    )
@@ -1,10 +1,16 @@
-from typing import List
-from fastapi import APIRouter, Depends, Request
+from datetime import date, datetime
+from typing import List, Literal, Optional, Union
+from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.orm import Session
 
 from app.config.database_config import get_db
 from app.controllers.formula_controller import FormulaController
-from app.schemas.schemas import FormulaRequest, FormulaResponse, FormulaHistoryModel
+from app.services.enrichment_service import EnrichmentQueue
+from app.schemas.schemas import (
+    FormulaRequest, FormulaResponse, FormulaHistoryModel, FormulaHistorySummary, FormulaHistoryPage,
+    BatchFormulaRequest, BatchFormulaResponse, AutocompleteSuggestion, IsotopeRequest, IsotopeResponse,
+    FormulaUsageStat, UsageBucketStat, ClientStats
+)
 
 
 router = APIRouter(prefix="/api/formula", tags=["Formula Operations"])
@@ -18,9 +24,25 @@ formula_controller = FormulaController()
 def calculate_formula(
     formula_request: FormulaRequest,  #input json body
     request: Request,  #full HTTP request info(optional)
-    db: Session = Depends(get_db)  #database session
+    db: Session = Depends(get_db),  #database session
+    background: bool = EnrichmentQueue.BACKGROUND_BY_DEFAULT  #return before PubChem enrichment finishes
     ):
     return formula_controller.calculate_formula(
+        formula=formula_request.formula,
+        request=request,
+        db=db,
+        background=background
+    )
+    
+#=====================================================================================
+
+@router.post("/async", response_model=FormulaResponse)
+async def calculate_formula_async(
+    formula_request: FormulaRequest,
+    request: Request,
+    db: Session = Depends(get_db)
+    ):
+    return await formula_controller.calculate_formula_async(
         formula=formula_request.formula,
         request=request,
         db=db
@@ -28,38 +50,196 @@ def calculate_formula(
     
 #=====================================================================================
 
-@router.get("/recent", response_model=List[FormulaHistoryModel])
-def get_recent_formulas(
+@router.post("/batch", response_model=BatchFormulaResponse)
+def calculate_formula_batch(
+    batch_request: BatchFormulaRequest,
+    request: Request,
     db: Session = Depends(get_db)
     ):
-    return formula_controller.get_recent_formulas(
+    return formula_controller.calculate_formula_batch(
+        batch_request=batch_request,
+        request=request,
         db=db
     )
     
 #=====================================================================================
 
-@router.get("/history", response_model=List[FormulaHistoryModel])
+@router.post("/isotopes", response_model=IsotopeResponse)
+def calculate_isotopes(
+    isotope_request: IsotopeRequest  #one or many formulas; each gets its own result or error
+    ):
+    return formula_controller.calculate_isotopes(
+        isotope_request=isotope_request
+    )
+    
+#=====================================================================================
+
+@router.post("/stream")
+async def calculate_formula_stream(
+    request: Request,  #NDJSON or CSV body, read incrementally
+    input_format: Optional[str] = None,  #"ndjson" or "csv"; inferred from Content-Type when omitted
+    output_format: Optional[str] = None,  #defaults to the input format
+    save: bool = False
+    ):
+    return await formula_controller.calculate_formula_stream(
+        request=request,
+        input_format=input_format,
+        output_format=output_format,
+        save=save
+    )
+    
+#=====================================================================================
+
+@router.get("/recent", response_model=Union[List[FormulaHistoryModel], List[FormulaHistorySummary]])
+def get_recent_formulas(
+    request: Request,  #If-None-Match is answered with 304 when the list is unchanged
+    db: Session = Depends(get_db),
+    view: Literal["full", "summary"] = "full"  #summary: id, formula, molar_mass and timestamp only
+    ):
+    return formula_controller.get_recent_formulas(
+        db=db,
+        request=request,
+        view=view
+    )
+    
+#=====================================================================================
+
+@router.get("/history", response_model=Union[List[FormulaHistoryModel], List[FormulaHistorySummary]])
 def get_formula_history(
+    request: Request,
     db: Session = Depends(get_db),
     skip: int = 0,
-    limit: int = 10
+    limit: int = 10,
+    view: Literal["full", "summary"] = "full"
     ):
     return formula_controller.get_formula_history(
         db=db,
+        request=request,
         skip=skip,
+        limit=limit,
+        view=view
+    )
+    
+#=====================================================================================
+
+@router.get("/history/page", response_model=FormulaHistoryPage)
+def get_formula_history_page(
+    request: Request,
+    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,  #next_cursor from the previous page; omit for the first page
+    limit: int = Query(10, ge=1, le=1000),
+    view: Literal["full", "summary"] = "full"
+    ):
+    return formula_controller.get_formula_history_page(
+        db=db,
+        request=request,
+        cursor=cursor,
+        limit=limit,
+        view=view
+    )
+    
+#=====================================================================================
+
+@router.get("/search", response_model=List[FormulaHistoryModel])
+def search_formulas(
+    q: str = Query(..., min_length=1, max_length=200),  #words are matched as prefixes against formulas, names and synonyms
+    db: Session = Depends(get_db),
+    limit: int = Query(10, ge=1, le=100)
+    ):
+    return formula_controller.search_formulas(
+        db=db,
+        query=q,
+        limit=limit
+    )
+    
+#=====================================================================================
+
+@router.get("/autocomplete", response_model=List[AutocompleteSuggestion])
+def autocomplete(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=50)
+    ):
+    return formula_controller.autocomplete(
+        prefix=q,
         limit=limit
     )
     
 #=====================================================================================
 
+@router.get("/cache/stats")
+def get_cache_stats():
+    return formula_controller.get_cache_stats()
+    
+#=====================================================================================
+
+@router.get("/enrichment/stats")
+def get_enrichment_stats():
+    return formula_controller.get_enrichment_stats()
+    
+#=====================================================================================
+
+@router.get("/stats/top", response_model=List[FormulaUsageStat])
+def get_top_formulas(
+    db: Session = Depends(get_db),
+    limit: int = Query(10, ge=1, le=100)
+    ):
+    return formula_controller.get_top_formulas(
+        db=db,
+        limit=limit
+    )
+    
+#=====================================================================================
+
+@router.get("/stats/requests", response_model=List[UsageBucketStat])
+def get_request_counts(
+    db: Session = Depends(get_db),
+    granularity: Literal["hour", "day"] = "day",
+    start: Optional[datetime] = None,  #UTC; defaults to 48 hours (hour) or 30 days (day) ago
+    end: Optional[datetime] = None  #UTC; defaults to now
+    ):
+    return formula_controller.get_request_counts(
+        db=db,
+        granularity=granularity,
+        start=start,
+        end=end
+    )
+    
+#=====================================================================================
+
+@router.get("/stats/clients", response_model=ClientStats)
+def get_client_counts(
+    db: Session = Depends(get_db),
+    start: Optional[date] = None,  #defaults to 30 days ago
+    end: Optional[date] = None
+    ):
+    return formula_controller.get_client_counts(
+        db=db,
+        start=start,
+        end=end
+    )
+    
+#=====================================================================================
+
+@router.get("/{formula_id}/events")
+async def stream_formula_events(
+    formula_id: int
+    ):
+    return await formula_controller.stream_formula_events(
+        formula_id=formula_id
+    )
+    
+#=====================================================================================
+
 @router.get("/{formula_id}", response_model=FormulaHistoryModel)
 def get_formula_by_id(
     formula_id: int,
+    request: Request,
     db: Session = Depends(get_db)
     ):
     return formula_controller.get_formula_by_id(
         formula_id=formula_id,
-        db=db
+        db=db,
+        request=request
     )
     
 #=====================================================================================
@@ -1,11 +1,17 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional, Union
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime
 
 class FormulaRequest(BaseModel):
     formula: str
 
 
+class BatchFormulaRequest(BaseModel):
+    formulas: List[str]
+    enrich: bool = False  # look up PubChem properties for each distinct formula
+    save: bool = False  # store successful calculations in the history
+
+
 class FormulaData(BaseModel):
     formula: str
     molar_mass: float
@@ -41,13 +47,113 @@ class FormulaData(BaseModel):
 
 class FormulaResponse(FormulaData):
     unit: str = "g/mol"
+    id: Optional[int] = None
+    enrichment_status: Optional[str] = None
 
 
 class FormulaHistoryModel(FormulaData):
     id: int
     timestamp: datetime
+    enrichment_status: Optional[str] = None
 
     # allows creating model from an object, not just a dict
     model_config = {
         "from_attributes": True
-    }
\ No newline at end of file
+    }
+
+
+class FormulaHistorySummary(BaseModel):
+    # view=summary rows for list screens; the full record is at /api/formula/{id}
+    id: int
+    formula: str
+    molar_mass: float
+    timestamp: datetime
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+class AutocompleteSuggestion(BaseModel):
+    text: str  # the matched formula, name or synonym
+    formula: str  # the formula it belongs to
+
+
+class FormulaHistoryPage(BaseModel):
+    items: Union[List[FormulaHistoryModel], List[FormulaHistorySummary]]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page; null on the last page
+
+
+class BatchFormulaResult(BaseModel):
+    formula: str
+    molar_mass: Optional[float] = None
+    unit: str = "g/mol"
+    error: Optional[str] = None
+    properties: Optional[Dict[str, Any]] = None
+
+
+class BatchFormulaResponse(BaseModel):
+    results: List[BatchFormulaResult]
+    succeeded: int
+    failed: int
+    saved: int = 0
+
+
+class IsotopeRequest(BaseModel):
+    formulas: List[str]
+    threshold: float = 1e-4  # leave out peaks below this fraction of the base peak
+    max_peaks: Optional[int] = 50  # keep the most abundant peaks; null for all
+
+
+class IsotopePeak(BaseModel):
+    mass: float  # m/z for charged formulas
+    abundance: float  # % of the base peak
+    probability: float
+
+
+class IsotopePatternResult(BaseModel):
+    formula: str
+    charge: int = 0
+    monoisotopic_mass: Optional[float] = None
+    average_mass: Optional[float] = None
+    most_abundant_mass: Optional[float] = None
+    nominal_mass: Optional[int] = None
+    peaks: List[IsotopePeak] = []
+    estimated_elements: List[str] = []  # no natural isotopic composition; a single peak at the atomic weight
+    error: Optional[str] = None
+
+
+class IsotopeResponse(BaseModel):
+    results: List[IsotopePatternResult]
+    succeeded: int
+    failed: int
+
+
+class FormulaUsageStat(BaseModel):
+    formula: str  # first spelling seen
+    formula_key: str
+    requests: int
+    last_seen: Optional[datetime] = None
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+class UsageBucketStat(BaseModel):
+    bucket_start: datetime  # UTC
+    requests: int
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+class DailyClientStat(BaseModel):
+    day: date
+    unique_clients: int
+
+
+class ClientStats(BaseModel):
+    days: List[DailyClientStat]
+    unique_clients: int  # over the whole range, not the sum of the days
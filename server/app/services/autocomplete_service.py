@@ -0,0 +1,118 @@
+import logging
+import os
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from sqlalchemy import text
+
+from app.config.database_config import SessionLocal
+from app.utils.prefix_trie import PrefixTrie
+
+
+logger = logging.getLogger(__name__)
+
+
+class AutocompleteIndex:
+    """
+    In-memory prefix index behind /api/formula/autocomplete: every formula in the
+    history plus the formula, common name, IUPAC name and synonyms of every
+    compound. It is loaded from the database in a background thread at startup and
+    kept current by the history and compound writers, which add their new terms as
+    they insert. Terms are only ever added; an edited name stays completable until
+    the next restart.
+    """
+
+    ENABLED = os.getenv("AUTOCOMPLETE_ENABLED", "true").lower() == "true"
+    LOAD_CHUNK_SIZE = int(os.getenv("AUTOCOMPLETE_LOAD_CHUNK_SIZE", 10000))
+    MAX_LIMIT = 50
+
+    _trie = PrefixTrie()
+    _lock = threading.Lock()
+    _loader: Optional[threading.Thread] = None
+    _stats = {"ready": False, "load_seconds": None}
+
+    @classmethod
+    def start(cls) -> None:
+        with cls._lock:
+            if not cls.ENABLED or cls._loader is not None:
+                return
+            cls._loader = threading.Thread(target=cls._load, name="autocomplete-loader", daemon=True)
+            cls._loader.start()
+
+    @classmethod
+    def complete(cls, prefix: str, limit: int = 10) -> List[dict]:
+        matches = cls._trie.complete(prefix, min(limit, cls.MAX_LIMIT))
+        return [{"text": text, "formula": formula} for text, formula in matches]
+
+    @classmethod
+    def add_formulas(cls, formulas: Iterable[str]) -> None:
+        if cls.ENABLED:
+            for formula in formulas:
+                cls._trie.add(formula, (formula, formula))
+
+    @classmethod
+    def add_compound(cls, formula_key: str, properties: dict) -> None:
+        if cls.ENABLED:
+            for term in cls._terms(formula_key, properties.get("common_name"),
+                                   properties.get("iupac_name"), properties.get("synonyms")):
+                cls._trie.add(term, (term, formula_key))
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {**cls._stats, "terms": len(cls._trie)}
+
+    @classmethod
+    def clear(cls) -> None:
+        cls._trie.clear()
+
+
+    @staticmethod
+    def _terms(formula_key: str, common_name: Optional[str], iupac_name: Optional[str], synonyms: Optional[str]) -> List[str]:
+        terms = [formula_key, common_name, iupac_name]
+        if synonyms:
+            terms.extend(synonyms.split(";"))  # stored "; "-joined, see PubChemService._parse_synonyms
+        return [term.strip() for term in terms if term and term.strip()]
+
+    @classmethod
+    def _load(cls) -> None:
+        # Keyset pagination, so each chunk is an index range scan however large the tables
+        start = time.perf_counter()
+        db = SessionLocal()
+        try:
+            last_id = 0
+            while True:
+                rows = db.execute(
+                    text("SELECT id, formula_key, common_name, iupac_name, synonyms FROM compounds "
+                         "WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                    {"last_id": last_id, "limit": cls.LOAD_CHUNK_SIZE}
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                for _, formula_key, common_name, iupac_name, synonyms in rows:
+                    if formula_key.startswith("row:"):
+                        continue  # one history row's edited copy, see CompoundService.edit_compound
+                    for term in cls._terms(formula_key, common_name, iupac_name, synonyms):
+                        cls._trie.add(term, (term, formula_key))
+
+            last_formula = ""
+            while True:
+                formulas = db.execute(
+                    text("SELECT DISTINCT formula FROM formulas WHERE formula > :last_formula "
+                         "ORDER BY formula LIMIT :limit"),
+                    {"last_formula": last_formula, "limit": cls.LOAD_CHUNK_SIZE}
+                ).scalars().all()
+                if not formulas:
+                    break
+                last_formula = formulas[-1]
+                cls.add_formulas(formulas)
+        except Exception as e:
+            logger.error(f"Loading the autocomplete index failed: {str(e)}")
+            return
+        finally:
+            db.close()
+
+        cls._stats["ready"] = True
+        cls._stats["load_seconds"] = round(time.perf_counter() - start, 2)
+        logger.info(f"Loaded {len(cls._trie)} autocomplete terms in {cls._stats['load_seconds']}s")
@@ -0,0 +1,185 @@
+import csv
+import io
+import json
+import os
+import time
+from typing import AsyncIterator, Iterable, Iterator, List, Optional
+
+from app.config.database_config import SessionLocal
+from app.services.formula_history_service import FormulaHistoryService
+from app.services.formula_service import FormulaService
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+INPUT_FORMATS = ("ndjson", "csv")
+
+
+class BulkCalculationSession:
+    """
+    Incremental calculator for arbitrarily large NDJSON/CSV inputs. Lines are fed in
+    chunks, each chunk is calculated with one FormulaService.calculate_molar_masses
+    call and (optionally) saved with one bulk INSERT, and the formatted output lines
+    are handed back straight away, so memory stays bounded by the chunk size.
+    """
+
+    CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 1000))
+    MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", 64 * 1024))
+
+    def __init__(self,
+                 formula_service: FormulaService,
+                 input_format: str = "ndjson",
+                 output_format: Optional[str] = None,
+                 save: bool = False,
+                 user_ip: Optional[str] = None):
+        if input_format not in INPUT_FORMATS or (output_format or input_format) not in INPUT_FORMATS:
+            raise ValueError(f"Unsupported format; expected one of {', '.join(INPUT_FORMATS)}")
+
+        self.formula_service = formula_service
+        self.input_format = input_format
+        self.output_format = output_format or input_format
+        self.save = save
+        self.user_ip = user_ip
+
+        self.rows = 0
+        self.errors = 0
+        self.saved = 0
+        self.started_at = time.perf_counter()
+        self._csv_column: Optional[int] = None
+        self._header_written = False
+
+    def process_lines(self, lines: List[str]) -> List[str]:
+        row_numbers, formulas, output = [], [], []
+
+        for line in lines:
+            formula = self._extract_formula(line)
+            if formula is None:
+                continue
+            self.rows += 1
+            row_numbers.append(self.rows)
+            formulas.append(formula)
+
+        if not self._header_written and self.output_format == "csv":
+            output.append(self._format_csv(["row", "formula", "molar_mass", "error"]))
+            self._header_written = True
+
+        calculated = self.formula_service.calculate_molar_masses(formulas)
+
+        entries = []
+        for row, formula, (molar_mass, error) in zip(row_numbers, formulas, calculated):
+            if error:
+                self.errors += 1
+            elif self.save:
+                entries.append({"formula": formula, "molar_mass": molar_mass, "user_ip": self.user_ip})
+            output.append(self._format_result(row, formula, molar_mass, error))
+
+        if entries:
+            self.saved += self._save_entries(entries)
+
+        return output
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.started_at
+        return {
+            "rows": self.rows,
+            "errors": self.errors,
+            "saved": self.saved,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed > 0 else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def format_summary(self) -> str:
+        summary = self.summary()
+        if self.output_format == "csv":
+            # CSV has no place for metadata, so the summary goes on a trailing comment line
+            return "# " + " ".join(f"{key}={value}" for key, value in summary.items()) + "\n"
+        return json.dumps({"summary": summary}) + "\n"
+
+    def iter_chunks(self, lines: Iterable[str]) -> Iterator[List[str]]:
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= self.CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+    def _extract_formula(self, line: str) -> Optional[str]:
+        line = line.strip()
+        if not line:
+            return None
+
+        if self.input_format == "ndjson":
+            try:
+                value = json.loads(line)
+            except json.JSONDecodeError:
+                return line  # tolerate bare formulas, one per line
+            if isinstance(value, dict):
+                return str(value.get("formula", ""))
+            return str(value)
+
+        cells = next(csv.reader([line]))
+        if self._csv_column is None:
+            # The first row is a header when one of its cells is "formula"
+            header = [cell.strip().lower() for cell in cells]
+            if "formula" in header:
+                self._csv_column = header.index("formula")
+                return None
+            self._csv_column = 0
+        return cells[self._csv_column].strip() if self._csv_column < len(cells) else ""
+
+    def _format_result(self, row: int, formula: str, molar_mass: Optional[float], error: Optional[str]) -> str:
+        molar_mass = round(molar_mass, 6) if molar_mass is not None else None
+        if self.output_format == "csv":
+            return self._format_csv([row, formula, "" if molar_mass is None else molar_mass, error or ""])
+        return json.dumps({"row": row, "formula": formula, "molar_mass": molar_mass, "error": error}) + "\n"
+
+    @staticmethod
+    def _format_csv(cells: list) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerow(cells)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _save_entries(entries: List[dict]) -> int:
+        db = SessionLocal()
+        try:
+            return FormulaHistoryService.create_formula_entries(db, entries)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+async def iter_request_lines(stream: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[str]:
+    # Splits an incoming byte stream into lines without buffering the whole body
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        if b"\n" not in chunk:
+            if len(buffer) > max_line_bytes:
+                raise ValueError(f"Input line longer than {max_line_bytes} bytes")
+            continue
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > max_line_bytes:
+            raise ValueError(f"Input line longer than {max_line_bytes} bytes")
+        for line in lines:
+            yield line.decode("utf-8")
+    if buffer:
+        yield buffer.decode("utf-8")
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    divisor = 1024 * 1024 if os.uname().sysname == "Darwin" else 1024
+    return round(peak / divisor, 1)
@@ -0,0 +1,280 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.CompoundModel import Compound
+from app.services.autocomplete_service import AutocompleteIndex
+from app.services.pubchem_cache_service import PubChemCache
+from app.utils.formula_parser import hill_formula, parse_formula
+
+
+# session.info key for compounds inserted in the session's open transaction
+PENDING_COMPOUNDS = "pending_compounds"
+
+# Keys of compounds private to one history row (see CompoundService.edit_compound);
+# no formula spelling starts with it, so they never match a lookup by formula
+PRIVATE_KEY_PREFIX = "row:"
+
+
+class CompoundService:
+    """
+    Upserts PubChem payloads into the `compounds` table, one row per formula
+    spelling, and maps formulas to compound ids for history rows. A spelling whose
+    payload has the CID of a stored compound ("ClNa" after "NaCl") links to that
+    compound instead. Spellings are not reduced to their Hill formula: isomers
+    ("CH3CH2OH", "CH3OCH3") share it, and it is only kept as a secondary column.
+    Resolved ids are kept in a small in-process LRU, so repeated formulas cost no
+    queries at all.
+
+    Compounds are inserted in the caller's transaction, so a compound and the
+    history rows that link to it are committed (or rolled back) together. Ids of
+    new compounds reach the LRU only once that transaction commits.
+    """
+
+    # PubChem properties that are stored on a compound
+    PROPERTY_FIELDS = (
+        # Physical properties
+        "boiling_point", "melting_point", "density", "state_at_room_temp", "flash_point",
+        # Chemical identifiers
+        "iupac_name", "common_name", "synonyms", "smiles",
+        # Hazard information
+        "hazard_classification", "hazard_statements", "precautionary_statements",
+        # Structural information
+        "structure_image_url", "structure_image_svg_url", "structure_3d_url", "crystal_structure",
+        # Additional information
+        "description", "compound_url",
+    )
+
+    ID_CACHE_SIZE = int(os.getenv("COMPOUND_ID_CACHE_SIZE", 4096))
+
+    _lock = threading.Lock()
+    _ids: "OrderedDict[str, int]" = OrderedDict()  # compound key -> compounds.id
+
+    @staticmethod
+    def compound_key(formula: str) -> str:
+        return PubChemCache.normalize_formula(formula)
+
+    @staticmethod
+    def hill_key(formula: str) -> Optional[str]:
+        # The Hill-order formula, for mass lookups and search; None for a spelling that doesn't parse
+        try:
+            return hill_formula(parse_formula(formula))
+        except ValueError:
+            return None
+
+    @classmethod
+    def get_compound_id(cls, db: Session, formula: str, properties: Optional[dict]) -> Optional[int]:
+        return cls.get_compound_ids(db, {formula: properties}).get(formula)
+
+    @classmethod
+    def get_compound_ids(cls, db: Session, properties_by_formula: Dict[str, Optional[dict]]) -> Dict[str, Optional[int]]:
+        """
+        Returns formula -> compound id, creating compounds that don't exist yet.
+        Formulas without a complete PubChem payload map to None. An existing
+        compound is never overwritten, so the first payload stored for a formula
+        wins, which is why an incomplete one never gets stored.
+        """
+        ids: Dict[str, Optional[int]] = {}
+        missing: Dict[str, dict] = {}  # compound key -> properties
+        pending = db.info.get(PENDING_COMPOUNDS, {})
+
+        with cls._lock:
+            for formula, properties in properties_by_formula.items():
+                key = cls.compound_key(formula)
+                compound_id = cls._ids.get(key)
+                if compound_id is None:
+                    compound_id = pending.get(key, (None,))[0]
+                if compound_id is not None:
+                    if key in cls._ids:
+                        cls._ids.move_to_end(key)
+                    ids[formula] = compound_id
+                elif cls.is_complete(properties):
+                    missing.setdefault(key, properties)
+                else:
+                    ids[formula] = None
+
+        if missing:
+            resolved = cls._upsert(db, missing)
+            # Rows this transaction inserted wait for its commit (see _publish_pending)
+            pending = db.info.get(PENDING_COMPOUNDS, {})
+            cls._cache_ids({key: compound_id for key, compound_id in resolved.items() if key not in pending})
+            for formula in properties_by_formula:
+                if formula not in ids:
+                    ids[formula] = resolved.get(cls.compound_key(formula))
+
+        return ids
+
+    @staticmethod
+    def private_key(formula_id: int) -> str:
+        # Key of the compound a history row gets once its PubChem fields are edited
+        return f"{PRIVATE_KEY_PREFIX}{formula_id}"
+
+    @classmethod
+    def edit_compound(cls, db: Session, formula_id: int, compound_id: Optional[int], updated_data: dict) -> Optional[int]:
+        """
+        Applies PubChem field edits made on one history row and returns the compound
+        id the row should point at. A compound is shared by every row of its formula,
+        so it is never edited for one of them: the row gets a private copy with the
+        edits applied (copy-on-write), and later edits of the row update that copy.
+        """
+        values = cls.property_values(updated_data)
+        if not values:
+            return compound_id
+
+        key = cls.private_key(formula_id)
+        private = db.query(Compound).filter(Compound.formula_key == key).first()
+        if private is not None and private.id == compound_id:
+            values["version"] = func.coalesce(Compound.version, 0) + 1
+            db.query(Compound).filter(Compound.id == compound_id).update(values, synchronize_session=False)
+            return compound_id
+
+        source = db.query(Compound).filter(Compound.id == compound_id).first() if compound_id is not None else None
+        copy = {field: getattr(source, field) if source is not None else None for field in cls.PROPERTY_FIELDS}
+        copy.update(values)
+        copy["cid"] = source.cid if source is not None else updated_data.get("cid")
+        copy["hill_formula"] = source.hill_formula if source is not None else None
+        if private is not None:
+            # Left over from before the row was linked to another compound (e.g. by enrichment)
+            copy["version"] = func.coalesce(Compound.version, 0) + 1
+            db.query(Compound).filter(Compound.id == private.id).update(copy, synchronize_session=False)
+            return private.id
+        return db.execute(insert(Compound).values(formula_key=key, **copy)).inserted_primary_key[0]
+
+    @staticmethod
+    def is_complete(properties: Optional[dict]) -> bool:
+        # Same test as the PubChem cache: a failed properties request leaves just the CID and URLs
+        return bool(properties) and bool(properties.get("formula"))
+
+    @classmethod
+    def private_payloads(cls, db: Session, formula_ids: List[int]) -> Dict[int, dict]:
+        # History row id -> CID and PubChem fields of its private copy, for rows that have one
+        keys = {cls.private_key(formula_id): formula_id for formula_id in formula_ids}
+        if not keys:
+            return {}
+        compounds = db.query(Compound).filter(Compound.formula_key.in_(list(keys))).all()
+        return {
+            keys[compound.formula_key]: {"cid": compound.cid, **{field: getattr(compound, field) for field in cls.PROPERTY_FIELDS}}
+            for compound in compounds
+        }
+
+    @classmethod
+    def delete_private(cls, db: Session, formula_ids: List[int]) -> int:
+        # A private copy goes with its history row, nothing else links to it; the caller commits
+        keys = [cls.private_key(formula_id) for formula_id in formula_ids]
+        if not keys:
+            return 0
+        return db.query(Compound).filter(Compound.formula_key.in_(keys)).delete(synchronize_session=False)
+
+    @classmethod
+    def property_values(cls, properties: Optional[dict]) -> dict:
+        if not properties:
+            return {}
+        return {field: properties[field] for field in cls.PROPERTY_FIELDS if field in properties}
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._ids.clear()
+
+
+    @classmethod
+    def _cache_ids(cls, ids: Dict[str, int]) -> None:
+        with cls._lock:
+            for key, compound_id in ids.items():
+                cls._ids[key] = compound_id
+                cls._ids.move_to_end(key)
+            while len(cls._ids) > cls.ID_CACHE_SIZE:
+                cls._ids.popitem(last=False)
+
+    @classmethod
+    def _upsert(cls, db: Session, properties_by_key: Dict[str, dict]) -> Dict[str, int]:
+        keys = list(properties_by_key)
+        existing = cls._select_ids(db, keys)
+
+        # Once PubChem has resolved a spelling to a CID, a compound with that CID is the same compound
+        cids = {key: properties_by_key[key].get("cid") for key in keys if key not in existing}
+        by_cid = cls._select_ids_by_cid(db, [cid for cid in cids.values() if cid is not None])
+        same = {}  # key -> key of the first new spelling with its CID
+        first = {}
+        for key, cid in cids.items():
+            if cid is None:
+                continue
+            if cid in by_cid:
+                existing[key] = by_cid[cid]
+            else:
+                same[key] = first.setdefault(cid, key)
+
+        # Every row carries every column so the whole list goes out as one executemany
+        rows = [
+            {
+                "formula_key": key,
+                "hill_formula": cls.hill_key(key),
+                "cid": properties_by_key[key].get("cid"),
+                **{field: properties_by_key[key].get(field) for field in cls.PROPERTY_FIELDS}
+            }
+            for key in keys if key not in existing and same.get(key, key) == key
+        ]
+        if rows:
+            # Part of the caller's transaction; the caller commits
+            db.execute(cls._insert_ignore(db), rows)
+            inserted = cls._select_ids(db, [row["formula_key"] for row in rows])
+            existing.update(inserted)
+            pending = db.info.setdefault(PENDING_COMPOUNDS, {})
+            for row in rows:
+                if row["formula_key"] in inserted:
+                    pending[row["formula_key"]] = (inserted[row["formula_key"]], row)
+        for key, first_key in same.items():
+            if key != first_key and first_key in existing:
+                existing[key] = existing[first_key]
+
+        return existing
+
+    @staticmethod
+    def _select_ids(db: Session, keys: list) -> Dict[str, int]:
+        rows = db.query(Compound.formula_key, Compound.id).filter(Compound.formula_key.in_(keys)).all()
+        return {formula_key: compound_id for formula_key, compound_id in rows}
+
+    @staticmethod
+    def _select_ids_by_cid(db: Session, cids: list) -> Dict[int, int]:
+        # Oldest shared compound per CID; private copies belong to their history row
+        if not cids:
+            return {}
+        rows = (
+            db.query(Compound.cid, func.min(Compound.id))
+            .filter(Compound.cid.in_(cids), ~Compound.formula_key.startswith(PRIVATE_KEY_PREFIX))
+            .group_by(Compound.cid)
+            .all()
+        )
+        return dict(rows)
+
+    @staticmethod
+    def _insert_ignore(db: Session):
+        # Another worker may insert the same compound concurrently; keep whichever landed first
+        dialect = db.get_bind().dialect.name
+        if dialect == "sqlite":
+            return sqlite.insert(Compound).on_conflict_do_nothing(index_elements=["formula_key"])
+        if dialect == "postgresql":
+            return postgresql.insert(Compound).on_conflict_do_nothing(index_elements=["formula_key"])
+        if dialect in ("mysql", "mariadb"):
+            return insert(Compound).prefix_with("IGNORE")
+        return insert(Compound)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    # The compounds are durable now: cache their ids and make their names completable
+    pending = session.info.pop(PENDING_COMPOUNDS, None)
+    if pending:
+        CompoundService._cache_ids({key: compound_id for key, (compound_id, _) in pending.items()})
+        for key, (_, row) in pending.items():
+            AutocompleteIndex.add_compound(key, row)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(PENDING_COMPOUNDS, None)
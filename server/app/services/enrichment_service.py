@@ -0,0 +1,227 @@
+import logging
+import os
+import queue
+import threading
+from typing import Dict, List, Optional
+
+from app.config.database_config import SessionLocal
+from app.models.FormulaHistoryModel import FormulaHistory
+from app.services.formula_history_service import FormulaHistoryService
+from app.services.pubchem_cache_service import PubChemCache
+from app.services.pubchem_service import PubChemService
+
+
+logger = logging.getLogger(__name__)
+
+
+class EnrichmentQueue:
+    """
+    Background worker pool that fills in PubChem fields on history rows saved with
+    enrichment_status="pending". The queue is bounded, failed lookups are retried
+    with exponential backoff, and rows for a formula that is already in flight
+    are attached to the running job instead of triggering another lookup.
+    """
+
+    BACKGROUND_BY_DEFAULT = os.getenv("ENRICHMENT_MODE", "sync").lower() == "background"
+    WORKERS = int(os.getenv("ENRICHMENT_WORKERS", 4))
+    MAX_QUEUE_DEPTH = int(os.getenv("ENRICHMENT_QUEUE_MAX_DEPTH", 1000))
+    MAX_RETRIES = int(os.getenv("ENRICHMENT_MAX_RETRIES", 3))
+    RETRY_BASE_DELAY = float(os.getenv("ENRICHMENT_RETRY_BASE_DELAY", 1.0))
+    RETRY_MAX_DELAY = float(os.getenv("ENRICHMENT_RETRY_MAX_DELAY", 30.0))
+    BACKFILL_BATCH_SIZE = int(os.getenv("ENRICHMENT_BACKFILL_BATCH_SIZE", 500))
+
+    _queue: "queue.Queue" = queue.Queue(maxsize=MAX_QUEUE_DEPTH)
+    _lock = threading.Lock()
+    _in_flight: Dict[str, List[int]] = {}  # formula key -> history ids waiting on that lookup
+    _workers: List[threading.Thread] = []
+    _retry_timers: List[threading.Timer] = []
+    _stats = {"submitted": 0, "deduplicated": 0, "rejected": 0, "retried": 0, "completed": 0, "failed": 0}
+
+    @classmethod
+    def start(cls) -> None:
+        with cls._lock:
+            if cls._workers:
+                return
+            for index in range(cls.WORKERS):
+                worker = threading.Thread(target=cls._run_worker, name=f"enrichment-worker-{index}", daemon=True)
+                worker.start()
+                cls._workers.append(worker)
+        logger.info(f"Started {cls.WORKERS} enrichment workers")
+        cls._resume_pending()
+
+    @classmethod
+    def stop(cls, timeout: float = 5.0) -> None:
+        with cls._lock:
+            workers, cls._workers = cls._workers, []
+            timers, cls._retry_timers = cls._retry_timers, []
+        for timer in timers:
+            timer.cancel()
+        for _ in workers:
+            cls._queue.put(None)
+        for worker in workers:
+            worker.join(timeout)
+
+    # Returns False when the queue is full so the caller can enrich inline instead
+    @classmethod
+    def submit(cls, formula_id: int, formula: str) -> bool:
+        key = PubChemCache.normalize_formula(formula)
+
+        with cls._lock:
+            if key in cls._in_flight:
+                cls._in_flight[key].append(formula_id)
+                cls._stats["deduplicated"] += 1
+                return True
+
+            try:
+                cls._queue.put_nowait((key, formula, 0))
+            except queue.Full:
+                cls._stats["rejected"] += 1
+                return False
+
+            cls._in_flight[key] = [formula_id]
+            cls._stats["submitted"] += 1
+            return True
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._lock:
+            stats = dict(cls._stats)
+            stats["in_flight"] = len(cls._in_flight)
+        stats["queue_depth"] = cls._queue.qsize()
+        stats["max_queue_depth"] = cls.MAX_QUEUE_DEPTH
+        stats["workers"] = len(cls._workers)
+        return stats
+
+
+    @classmethod
+    def backfill(cls, statuses=("pending", "failed"), batch_size: Optional[int] = None, physical_properties: bool = True) -> dict:
+        """
+        Enriches the history rows with one of `statuses`, batch_size distinct formulas
+        at a time through PubChemService.get_chemical_properties_many, instead of one
+        queued job per formula. Meant for backlogs; new rows go through the workers.
+        Formulas whose lookup fails keep their status and are counted as failed.
+        """
+        batch_size = batch_size or cls.BACKFILL_BATCH_SIZE
+        totals = {"formulas": 0, "rows": 0, "failed": 0}
+        last_formula = ""
+
+        while True:
+            db = SessionLocal()
+            try:
+                formulas = [formula for (formula,) in db.query(FormulaHistory.formula).filter(
+                    FormulaHistory.enrichment_status.in_(statuses),
+                    FormulaHistory.formula > last_formula
+                ).distinct().order_by(FormulaHistory.formula).limit(batch_size)]
+            finally:
+                db.close()
+            if not formulas:
+                return totals
+            last_formula = formulas[-1]
+
+            fetched = PubChemService.get_chemical_properties_many(formulas, physical_properties=physical_properties)
+
+            db = SessionLocal()
+            try:
+                for formula in formulas:
+                    if formula not in fetched:
+                        totals["failed"] += 1
+                        continue
+                    formula_ids = [formula_id for (formula_id,) in db.query(FormulaHistory.id).filter(
+                        FormulaHistory.formula == formula,
+                        FormulaHistory.enrichment_status.in_(statuses)
+                    )]
+                    totals["rows"] += FormulaHistoryService.apply_enrichment(db, formula_ids, fetched[formula], "complete")
+                    totals["formulas"] += 1
+            finally:
+                db.close()
+            logger.info(f"Backfilled {totals['formulas']} formulas ({totals['rows']} rows) so far")
+
+    @classmethod
+    def _resume_pending(cls) -> None:
+        # Rows left pending by a previous shutdown would otherwise never be enriched
+        db = SessionLocal()
+        try:
+            pending = db.query(FormulaHistory.id, FormulaHistory.formula).filter(
+                FormulaHistory.enrichment_status == "pending"
+            ).limit(cls.MAX_QUEUE_DEPTH).all()
+        except Exception as e:
+            logger.warning(f"Could not load pending enrichment jobs: {str(e)}")
+            return
+        finally:
+            db.close()
+
+        for formula_id, formula in pending:
+            if not cls.submit(formula_id, formula):
+                break
+        if pending:
+            logger.info(f"Resumed enrichment for {len(pending)} pending entries")
+
+    @classmethod
+    def _run_worker(cls) -> None:
+        while True:
+            job = cls._queue.get()
+            try:
+                if job is None:
+                    return
+                cls._process(*job)
+            except Exception as e:
+                logger.error(f"Enrichment worker error: {str(e)}")
+            finally:
+                cls._queue.task_done()
+
+    @classmethod
+    def _process(cls, key: str, formula: str, attempt: int) -> None:
+        try:
+            properties = PubChemService.get_chemical_properties(formula, raise_errors=True)
+            # {} is a real answer (no such compound); a payload without the formula is a failed lookup
+            if properties and not properties.get("formula"):
+                raise RuntimeError("PubChem returned an incomplete payload")
+        except Exception as e:
+            if attempt < cls.MAX_RETRIES and cls._schedule_retry(key, formula, attempt + 1):
+                return
+            logger.error(f"Giving up enrichment for '{formula}' after {attempt + 1} attempts: {str(e)}")
+            cls._finish(key, None, "failed")
+            return
+
+        cls._finish(key, properties, "complete")
+
+    @classmethod
+    def _schedule_retry(cls, key: str, formula: str, attempt: int) -> bool:
+        delay = min(cls.RETRY_BASE_DELAY * (2 ** (attempt - 1)), cls.RETRY_MAX_DELAY)
+
+        def requeue():
+            try:
+                cls._queue.put_nowait((key, formula, attempt))
+            except queue.Full:
+                logger.error(f"Enrichment queue full, dropping retry for '{formula}'")
+                cls._finish(key, None, "failed")
+
+        with cls._lock:
+            if not cls._workers:
+                return False
+            timer = threading.Timer(delay, requeue)
+            timer.daemon = True
+            cls._retry_timers = [t for t in cls._retry_timers if t.is_alive()] + [timer]
+            cls._stats["retried"] += 1
+        logger.info(f"Retrying enrichment for '{formula}' in {delay:.1f}s (attempt {attempt + 1})")
+        timer.start()
+        return True
+
+    @classmethod
+    def _finish(cls, key: str, properties: Optional[dict], status: str) -> None:
+        # Pop under the lock so rows submitted from now on start a fresh lookup
+        with cls._lock:
+            formula_ids = cls._in_flight.pop(key, [])
+            cls._stats["completed" if status == "complete" else "failed"] += 1
+
+        if not formula_ids:
+            return
+
+        db = SessionLocal()
+        try:
+            FormulaHistoryService.apply_enrichment(db, formula_ids, properties, status)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to store enrichment for {formula_ids}: {str(e)}")
+        finally:
+            db.close()
@@ -0,0 +1,63 @@
+from typing import Any, Callable, List, Optional, Tuple
+
+from app.models.FormulaHistoryModel import FormulaHistory
+from app.services.formula_history_service import FormulaHistoryService
+
+
+class AsyncFormulaHistoryService:
+    """
+    FormulaHistoryService on an AsyncSession. Every method runs the sync service
+    method through AsyncSession.run_sync, so the queries, compound upserts and
+    write-generation bookkeeping stay in one place while the driver I/O is awaited
+    on the event loop instead of holding a threadpool thread.
+    """
+
+    @staticmethod
+    async def run(db, function: Callable, *args, **kwargs) -> Any:
+        return await db.run_sync(lambda session: function(session, *args, **kwargs))
+
+    @staticmethod
+    async def insert_formula_entry(db, 
+                                   formula: str, 
+                                   molar_mass: float, 
+                                   user_ip: Optional[str] = None, 
+                                   properties: Optional[dict] = None,
+                                   enrichment_status: Optional[str] = None) -> int:
+        return await AsyncFormulaHistoryService.run(
+            db, FormulaHistoryService.insert_formula_entry,
+            formula, molar_mass, user_ip, properties, enrichment_status
+        )
+
+    @staticmethod
+    async def apply_enrichment(db, formula_ids: List[int], properties: Optional[dict], enrichment_status: str) -> int:
+        return await AsyncFormulaHistoryService.run(
+            db, FormulaHistoryService.apply_enrichment, formula_ids, properties, enrichment_status
+        )
+
+    @staticmethod
+    async def get_recent_formulas(db, limit: int = 10, view: str = "full") -> List[FormulaHistory]:
+        return await AsyncFormulaHistoryService.run(db, FormulaHistoryService.get_recent_formulas, limit, view)
+
+    @staticmethod
+    async def get_formula_history(db, skip: int = 0, limit: int = 100, view: str = "full") -> List[FormulaHistory]:
+        return await AsyncFormulaHistoryService.run(db, FormulaHistoryService.get_formula_history, skip, limit, view)
+
+    @staticmethod
+    async def get_formula_history_page(db, cursor: Optional[str] = None, limit: int = 100, view: str = "full") -> Tuple[list, Optional[str]]:
+        return await AsyncFormulaHistoryService.run(db, FormulaHistoryService.get_formula_history_page, cursor, limit, view)
+
+    @staticmethod
+    async def get_entry_version(db, formula_id: int) -> Optional[tuple]:
+        return await AsyncFormulaHistoryService.run(db, FormulaHistoryService.get_entry_version, formula_id)
+
+    @staticmethod
+    async def get_formula_by_id(db, formula_id: int) -> FormulaHistory:
+        return await AsyncFormulaHistoryService.run(db, FormulaHistoryService.get_formula_by_id, formula_id)
+
+    @staticmethod
+    async def update_formula_entry(db, formula_id: int, updated_data: dict) -> FormulaHistory:
+        return await AsyncFormulaHistoryService.run(db, FormulaHistoryService.update_formula_entry, formula_id, updated_data)
+
+    @staticmethod
+    async def delete_formula_entry(db, formula_id: int) -> bool:
+        return await AsyncFormulaHistoryService.run(db, FormulaHistoryService.delete_formula_entry, formula_id)
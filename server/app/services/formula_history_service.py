@@ -1,87 +1,209 @@
-from typing import List, Optional
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import and_, func, insert, literal, or_
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import Session
 
+from app.models.CompoundModel import Compound
 from app.models.FormulaHistoryModel import FormulaHistory
+from app.services.autocomplete_service import AutocompleteIndex
+from app.services.compound_service import CompoundService
+from app.services.usage_stats_service import UsageStatsService
+from app.utils.pagination import decode_cursor, encode_cursor
 
 
 class FormulaHistoryService:
 
+    # PubChem properties shown on a history entry; stored once per compound
+    PROPERTY_FIELDS = CompoundService.PROPERTY_FIELDS
+
+    # Row columns a PUT may change. id, timestamp, compound_id, enrichment_status and
+    # version are the server's: a client-sent version could reproduce an old ETag
+    EDITABLE_FIELDS = ("formula", "molar_mass")
+
+    # Columns selected for view=summary listings; skips the large Text property columns
+    SUMMARY_COLUMNS = (FormulaHistory.id, FormulaHistory.formula, FormulaHistory.molar_mass, FormulaHistory.timestamp)
+    # Columns selected for view=version: just enough to build an ETag for the same rows
+    VERSION_COLUMNS = (FormulaHistory.id, FormulaHistory.timestamp, FormulaHistory.version, Compound.version)
+
+    # Bumped after every write in this process, so in-process response caches know when to rebuild
+    _generation = 0
+    _generation_lock = threading.Lock()
+
+    @staticmethod
+    def generation() -> int:
+        return FormulaHistoryService._generation
+
     @staticmethod
     def create_formula_entry(db: Session, 
                             formula: str, 
                             molar_mass: float, 
                             user_ip: Optional[str] = None, 
-                            properties: Optional[dict] = None) -> FormulaHistory:
-        # Create the base object with required fields
+                            properties: Optional[dict] = None,
+                            enrichment_status: Optional[str] = None) -> FormulaHistory:
+        # Create the base object with required fields, linked to its compound if PubChem knows it
         db_formula = FormulaHistory(
             formula=formula,
             molar_mass=molar_mass,
-            user_ip=user_ip
+            user_ip=user_ip,
+            enrichment_status=enrichment_status,
+            compound_id=CompoundService.get_compound_id(db, formula, properties)
         )
         
-        # Add additional properties if available
-        if properties:
-            # Physical properties
-            if "boiling_point" in properties:
-                db_formula.boiling_point = properties["boiling_point"]
-            if "melting_point" in properties:
-                db_formula.melting_point = properties["melting_point"]
-            if "density" in properties:
-                db_formula.density = properties["density"]
-            if "state_at_room_temp" in properties:
-                db_formula.state_at_room_temp = properties["state_at_room_temp"]
-            if "flash_point" in properties:
-                db_formula.flash_point = properties["flash_point"]
-            
-            # Chemical identifiers
-            if "iupac_name" in properties:
-                db_formula.iupac_name = properties["iupac_name"]
-            if "common_name" in properties:
-                db_formula.common_name = properties["common_name"]
-            if "synonyms" in properties:
-                db_formula.synonyms = properties["synonyms"]
-            if "smiles" in properties:
-                db_formula.smiles = properties["smiles"]
-            
-            # Hazard information
-            if "hazard_classification" in properties:
-                db_formula.hazard_classification = properties["hazard_classification"]
-            if "hazard_statements" in properties:
-                db_formula.hazard_statements = properties["hazard_statements"]
-            if "precautionary_statements" in properties:
-                db_formula.precautionary_statements = properties["precautionary_statements"]
-            
-            # Structural information
-            if "structure_image_url" in properties:
-                db_formula.structure_image_url = properties["structure_image_url"]
-            if "structure_image_svg_url" in properties:
-                db_formula.structure_image_svg_url = properties["structure_image_svg_url"]
-            if "structure_3d_url" in properties:
-                db_formula.structure_3d_url = properties["structure_3d_url"]
-            if "crystal_structure" in properties:
-                db_formula.crystal_structure = properties["crystal_structure"]
-            
-            # Additional information
-            if "description" in properties:
-                db_formula.description = properties["description"]
-            if "compound_url" in properties:
-                db_formula.compound_url = properties["compound_url"]
-        
         db.add(db_formula)
+        UsageStatsService.record(db, [(formula, user_ip, None)])  # same transaction as the row
         db.commit()
+        FormulaHistoryService._bump_generation()
+        AutocompleteIndex.add_formulas([formula])
         db.refresh(db_formula)
         return db_formula
     
+    @staticmethod
+    def insert_formula_entry(db: Session, 
+                            formula: str, 
+                            molar_mass: float, 
+                            user_ip: Optional[str] = None, 
+                            properties: Optional[dict] = None,
+                            enrichment_status: Optional[str] = None) -> int:
+        # For callers that only need the id: a plain INSERT, without loading an ORM
+        # object or re-SELECTing the row afterwards like create_formula_entry does
+        compound_id = CompoundService.get_compound_id(db, formula, properties)
+        row = FormulaHistoryService._entry_values(formula, molar_mass, user_ip, compound_id, enrichment_status)
+        result = db.execute(insert(FormulaHistory).values(**row))
+        UsageStatsService.record(db, [(formula, user_ip, None)])
+        db.commit()
+        FormulaHistoryService._bump_generation()
+        AutocompleteIndex.add_formulas([formula])
+        return result.inserted_primary_key[0]
+    
+    @staticmethod
+    def create_formula_entries(db: Session, entries: List[dict]) -> int:
+        # One executemany INSERT for the whole list instead of a commit and refresh per row.
+        # Each entry holds formula, molar_mass and optionally user_ip and properties.
+        if not entries:
+            return 0
+        
+        # Each distinct compound is upserted once for the whole batch
+        properties_by_formula = {}
+        for entry in entries:
+            if not properties_by_formula.get(entry["formula"]):
+                properties_by_formula[entry["formula"]] = entry.get("properties")
+        compound_ids = CompoundService.get_compound_ids(db, properties_by_formula)
+        rows = [
+            FormulaHistoryService._entry_values(
+                entry["formula"], entry["molar_mass"], entry.get("user_ip"), compound_ids[entry["formula"]]
+            )
+            for entry in entries
+        ]
+        db.execute(insert(FormulaHistory), rows)
+        UsageStatsService.record(db, [(entry["formula"], entry.get("user_ip"), None) for entry in entries])
+        db.commit()
+        FormulaHistoryService._bump_generation()
+        AutocompleteIndex.add_formulas(properties_by_formula)
+        return len(rows)
+    
+    @staticmethod
+    def apply_enrichment(db: Session, 
+                        formula_ids: List[int], 
+                        properties: Optional[dict], 
+                        enrichment_status: str) -> int:
+        # Link rows that were saved before enrichment finished to their compound
+        values = {"enrichment_status": enrichment_status, "version": func.coalesce(FormulaHistory.version, 0) + 1}
+        if properties:
+            formula = db.query(FormulaHistory.formula).filter(FormulaHistory.id.in_(formula_ids)).limit(1).scalar()
+            if formula is not None:
+                values["compound_id"] = CompoundService.get_compound_id(db, formula, properties)
+        
+        updated = db.query(FormulaHistory).filter(FormulaHistory.id.in_(formula_ids)).update(
+            values, synchronize_session=False
+        )
+        db.commit()
+        FormulaHistoryService._bump_generation()
+        return updated
+    
+    @staticmethod
+    def _entry_values(formula: str, 
+                    molar_mass: float, 
+                    user_ip: Optional[str] = None, 
+                    compound_id: Optional[int] = None,
+                    enrichment_status: Optional[str] = None) -> dict:
+        return {
+            "formula": formula,
+            "molar_mass": molar_mass,
+            "user_ip": user_ip,
+            "enrichment_status": enrichment_status,
+            "compound_id": compound_id
+        }
+    
 
     @staticmethod
-    def get_recent_formulas(db: Session, limit: int = 10) -> List[FormulaHistory]:
-        return db.query(FormulaHistory).order_by(FormulaHistory.timestamp.desc()).limit(limit).all()
+    def get_recent_formulas(db: Session, limit: int = 10, view: str = "full") -> List[FormulaHistory]:
+        return FormulaHistoryService._newest_first(db, view).limit(limit).all()
     
     @staticmethod
     def get_formula_history(db: Session, 
                         skip: int = 0, 
-                        limit: int = 100) -> List[FormulaHistory]:
-        return db.query(FormulaHistory).order_by(FormulaHistory.timestamp.desc()).offset(skip).limit(limit).all()
+                        limit: int = 100,
+                        view: str = "full") -> List[FormulaHistory]:
+        # Offset mode, kept for compatibility: the database still walks past `skip` rows
+        return FormulaHistoryService._newest_first(db, view).offset(skip).limit(limit).all()
+    
+    @staticmethod
+    def get_formula_history_page(db: Session, 
+                                cursor: Optional[str] = None, 
+                                limit: int = 100,
+                                view: str = "full") -> Tuple[List[FormulaHistory], Optional[str]]:
+        # Keyset mode: seek straight to the row after the cursor on the (timestamp, id)
+        # index, so every page costs the same no matter how deep it is
+        query = FormulaHistoryService._newest_first(db, view)
+        if cursor:
+            timestamp, last_id = decode_cursor(cursor)
+            timestamp = FormulaHistoryService._timestamp_param(db, timestamp)
+            query = query.filter(
+                FormulaHistory.timestamp <= timestamp,
+                or_(FormulaHistory.timestamp < timestamp, and_(FormulaHistory.timestamp == timestamp, FormulaHistory.id < last_id))
+            )
+        
+        # One extra row tells whether there is a next page without a COUNT
+        rows = query.limit(limit + 1).all()
+        if len(rows) <= limit:
+            return rows, None
+        last = rows[limit - 1]
+        return rows[:limit], encode_cursor(last.timestamp, last.id)
+    
+    @staticmethod
+    def get_entry_version(db: Session, formula_id: int) -> Optional[tuple]:
+        # (id, timestamp, version, compound version) without loading the row itself
+        return FormulaHistoryService._select_view(db, "version").filter(FormulaHistory.id == formula_id).first()
+    
+    @staticmethod
+    def _newest_first(db: Session, view: str = "full"):
+        query = FormulaHistoryService._select_view(db, view)
+        # id breaks ties between rows written in the same second; matches ix_formulas_timestamp_id
+        return query.order_by(FormulaHistory.timestamp.desc(), FormulaHistory.id.desc())
+    
+    @staticmethod
+    def _select_view(db: Session, view: str = "full"):
+        # "summary" and "version" select plain rows of a few columns instead of hydrating ORM objects
+        if view == "summary":
+            return db.query(*FormulaHistoryService.SUMMARY_COLUMNS)
+        if view == "version":
+            return db.query(*FormulaHistoryService.VERSION_COLUMNS).outerjoin(Compound, FormulaHistory.compound_id == Compound.id)
+        return db.query(FormulaHistory)
+    
+    @staticmethod
+    def _bump_generation() -> None:
+        with FormulaHistoryService._generation_lock:
+            FormulaHistoryService._generation += 1
+    
+    @staticmethod
+    def _timestamp_param(db: Session, timestamp: datetime):
+        # SQLite keeps DateTime as text and CURRENT_TIMESTAMP has no fractional seconds, while
+        # SQLAlchemy binds "...:SS.000000"; compare in the stored form so equal timestamps match
+        if db.get_bind().dialect.name == "sqlite" and not timestamp.microsecond:
+            return literal(timestamp, type_=sqlite.DATETIME(truncate_microseconds=True))
+        return timestamp
     
     @staticmethod
     def update_formula_entry(db: Session, formula_id: int, updated_data: dict) -> FormulaHistory:
@@ -90,24 +212,31 @@ class FormulaHistoryService:
         if not db_formula:
             return None
             
-        # Update fields that are present in the request
-        for key, value in updated_data.items():
-            if hasattr(db_formula, key):
-                setattr(db_formula, key, value)
+        # Update fields that are present in the request. PubChem fields live on a compound
+        # that other rows share, so the edit goes to this row's own copy of it
+        for key in FormulaHistoryService.EDITABLE_FIELDS:
+            if key in updated_data:
+                setattr(db_formula, key, updated_data[key])
+        
+        db_formula.compound_id = CompoundService.edit_compound(db, formula_id, db_formula.compound_id, updated_data)
+        db_formula.version = (db_formula.version or 0) + 1
                 
         db.commit()
+        FormulaHistoryService._bump_generation()
         db.refresh(db_formula)
         return db_formula
         
     @staticmethod
     def delete_formula_entry(db: Session, formula_id: int) -> bool:
-        db_formula = db.query(FormulaHistory).filter(FormulaHistory.id == formula_id).first()
-        
-        if not db_formula:
+        # One DELETE by primary key; nothing is loaded first. Bulk expiry is RetentionService.
+        deleted = db.query(FormulaHistory).filter(FormulaHistory.id == formula_id).delete(synchronize_session=False)
+        if deleted:
+            CompoundService.delete_private(db, [formula_id])
+        db.commit()
+        if not deleted:
             return False
             
-        db.delete(db_formula)
-        db.commit()
+        FormulaHistoryService._bump_generation()
         return True
         
     @staticmethod
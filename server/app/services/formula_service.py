@@ -1,81 +1,71 @@
-import re
 import json
 import os
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.utils.formula_parser import parse_formula
+from app.utils.formula_table import load_formula_table, lookup_formula
+
+
+ATOMIC_MASSES_PATHS = [
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'atomic_masses.json'),
+    "./app/data/atomic_masses.json",
+    "./atomic_masses.json",
+    "atomic_masses.json"
+]
+
+
+class AtomicMasses(NamedTuple):
+    masses: Dict[str, float]
+    element_index: Dict[str, int]  # column order of the composition matrix used by calculate_molar_masses
+    element_masses: Tuple[float, ...]  # masses in column order
+
+
+@lru_cache(maxsize=None)
+def load_atomic_masses() -> AtomicMasses:
+    # Read once per process; every FormulaService shares the result
+    for path in ATOMIC_MASSES_PATHS:
+        try:
+            with open(path) as file:
+                masses = json.load(file)
+        except (FileNotFoundError, IOError):
+            continue
+        print(f"Loaded atomic masses from {path}")
+        return AtomicMasses(
+            masses,
+            {element: column for column, element in enumerate(masses)},
+            tuple(masses.values())
+        )
+    raise FileNotFoundError("Could not find atomic_masses.json in any expected location")
+
+
+@lru_cache(maxsize=None)
+def _mass_vector():
+    # numpy is imported by the first batch calculation, not at startup; None means
+    # it isn't installed and batch calculation falls back to pure Python
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    return np.array(load_atomic_masses().element_masses, dtype=np.float64)
 
 
 class FormulaService:
 
     def __init__(self):
-        self.atomic_masses = self._load_atomic_masses()
+        atomic_masses = load_atomic_masses()
+        self.atomic_masses = atomic_masses.masses
+        self.element_index = atomic_masses.element_index
+        self.element_masses = atomic_masses.element_masses
 
-        
-    def _load_atomic_masses(self):
-        possible_paths = [
-            os.path.join(os.path.dirname(__file__), '..', 'data', 'atomic_masses.json'),  
-            "./app/data/atomic_masses.json", 
-            "./atomic_masses.json", 
-            "atomic_masses.json"     
-        ]
-
-        for path in possible_paths:
-            try:
-                with open(path) as file:
-                    print(f"Loaded atomic masses from {path}")
-                    return json.load(file)
-            except (FileNotFoundError, IOError):
-                continue
-        raise FileNotFoundError("Could not find atomic_masses.json in any expected location")
+        # Precomputed masses for known formulas; mapped once per process
+        self.formula_table = load_formula_table(self.atomic_masses)
 
 
 
     def parse_formula(self, formula):
         try:
-            tokens = re.findall(r'[A-Z][a-z]?|\d+|\(|\)', formula)
-            if not tokens:
-                raise ValueError(f"Invalid formula format: {formula}")
-            
-            stack = [[]]
-            i = 0
-
-            while i < len(tokens):
-                token = tokens[i]
-                i += 1  
-
-                if token == '(':
-                    stack.append([])
-                elif token == ')':
-                    if len(stack) <= 1:
-                        raise ValueError(f"Unbalanced parentheses in formula: {formula}")
-                        
-                    group = stack.pop()
-                    
-                    if i < len(tokens) and tokens[i].isdigit():
-                        multiplier = int(tokens[i])
-                        i += 1
-                    else:
-                        multiplier = 1
-                        
-                    for elem, count in group:
-                        stack[-1].append((elem, count * multiplier))
-                elif re.match(r'[A-Z][a-z]?', token):
-                    element = token
-                    
-                    if i < len(tokens) and tokens[i].isdigit():
-                        count = int(tokens[i])
-                        i += 1
-                    else:
-                        count = 1
-                        
-                    stack[-1].append((element, count))
-                elif token.isdigit():
-                    raise ValueError(f"Unexpected number in formula: {formula} at position {i-1}")
-                else:
-                    raise ValueError(f"Invalid token in formula: {token}")
-
-            if len(stack) != 1:
-                raise ValueError(f"Unbalanced parentheses in formula: {formula}")
-                
-            return stack[0]  
+            return parse_formula(formula).as_dict()
         except Exception as e:
             print(f"Error parsing formula '{formula}': {str(e)}")
             raise ValueError(f"Error parsing formula: {str(e)}")
@@ -83,10 +73,64 @@ class FormulaService:
     
 
     def calculate_molar_mass(self, formula):
+        entry = lookup_formula(formula)
+        if entry is not None:
+            return entry.molar_mass
+        return self.compute_molar_mass(formula)
+
+
+    def compute_molar_mass(self, formula):
+        # Always parses; calculate_molar_mass is the same with the formula table in front
         parsed = self.parse_formula(formula)
         total_mass = 0
-        for element, count in parsed:
+        for element, count in parsed.items():
             if element not in self.atomic_masses:
                 raise ValueError(f"Unknown element: {element}")
             total_mass += self.atomic_masses[element] * count
-        return total_mass
\ No newline at end of file
+        return total_mass
+
+
+    def calculate_molar_masses(self, formulas: List[str]) -> List[Tuple[Optional[float], Optional[str]]]:
+        # Returns (molar_mass, error) per formula; a bad formula never fails the whole batch
+        errors: List[Optional[str]] = [None] * len(formulas)
+        known: List[Tuple[int, float]] = []
+        
+        # Sparse (formulas x elements) composition matrix in coordinate form
+        rows, columns, counts = [], [], []
+        for row, formula in enumerate(formulas):
+            entry = lookup_formula(formula)
+            if entry is not None:
+                known.append((row, entry.molar_mass))
+                continue
+            try:
+                composition = parse_formula(formula).composition
+            except ValueError as e:
+                errors[row] = f"Error parsing formula: {str(e)}"
+                continue
+            
+            unknown = [element for element, _ in composition if element not in self.element_index]
+            if unknown:
+                errors[row] = f"Unknown element: {unknown[0]}"
+                continue
+            
+            for element, count in composition:
+                rows.append(row)
+                columns.append(self.element_index[element])
+                counts.append(count)
+        
+        mass_vector = _mass_vector()
+        if mass_vector is not None:
+            import numpy as np
+            # One sparse matrix-vector product: sum of count * atomic mass per row
+            weights = np.asarray(counts, dtype=np.float64) * mass_vector[np.asarray(columns, dtype=np.intp)]
+            masses = np.bincount(np.asarray(rows, dtype=np.intp), weights=weights, minlength=len(formulas)).tolist()
+        else:
+            masses = [0.0] * len(formulas)
+            element_masses = self.element_masses
+            for row, column, count in zip(rows, columns, counts):
+                masses[row] += element_masses[column] * count
+        
+        for row, molar_mass in known:
+            masses[row] = molar_mass
+        
+        return [(None, error) if error else (mass, None) for mass, error in zip(masses, errors)]
@@ -0,0 +1,139 @@
+import logging
+import os
+import threading
+import time
+from typing import List
+
+from app.config.database_config import SessionLocal
+from app.services.formula_history_service import FormulaHistoryService
+
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryWriteBuffer:
+    """
+    Optional write-behind buffer for formula history rows. Entries are collected in
+    memory and written with one executemany INSERT when MAX_ROWS are waiting or the
+    oldest entry is MAX_STALENESS seconds old, whichever comes first. stop() does a
+    final synchronous flush so nothing buffered is lost on a clean shutdown.
+    """
+
+    ENABLED = os.getenv("HISTORY_WRITE_BUFFER_ENABLED", "false").lower() == "true"
+    MAX_ROWS = int(os.getenv("HISTORY_WRITE_BUFFER_SIZE", 500))
+    MAX_STALENESS = float(os.getenv("HISTORY_WRITE_MAX_STALENESS", 1.0))
+    # Upper bound on buffered rows while the database is failing; beyond it callers flush inline
+    MAX_PENDING = int(os.getenv("HISTORY_WRITE_BUFFER_MAX_PENDING", 10 * MAX_ROWS))
+
+    _condition = threading.Condition()
+    _pending: List[dict] = []
+    _oldest_at = 0.0
+    _flusher = None
+    _stopping = False
+    _flush_lock = threading.Lock()  # one flush at a time keeps rows in insertion order
+    _stats = {"buffered": 0, "flushed": 0, "flushes": 0, "failed_flushes": 0, "dropped": 0}
+
+    @classmethod
+    def start(cls) -> None:
+        with cls._condition:
+            if cls._flusher is not None:
+                return
+            cls._stopping = False
+            cls._flusher = threading.Thread(target=cls._run_flusher, name="history-write-buffer", daemon=True)
+            cls._flusher.start()
+
+    @classmethod
+    def stop(cls) -> None:
+        with cls._condition:
+            flusher, cls._flusher = cls._flusher, None
+            cls._stopping = True
+            cls._condition.notify_all()
+        if flusher is not None:
+            flusher.join()
+        # Durable final flush of anything added after the flusher exited
+        cls.flush()
+
+    @classmethod
+    def add(cls, entry: dict) -> None:
+        # entry holds formula, molar_mass and optionally user_ip and properties
+        with cls._condition:
+            if not cls._pending:
+                cls._oldest_at = time.monotonic()
+            cls._pending.append(entry)
+            cls._stats["buffered"] += 1
+            pending = len(cls._pending)
+            # Wake the flusher to start the staleness timer, or to flush a full batch
+            if pending == 1 or pending >= cls.MAX_ROWS:
+                cls._condition.notify_all()
+
+        if pending >= cls.MAX_PENDING or cls._flusher is None:
+            # The flusher is falling behind (or not running): apply backpressure
+            cls.flush()
+
+    @classmethod
+    def flush(cls) -> int:
+        with cls._flush_lock:
+            with cls._condition:
+                rows, cls._pending = cls._pending, []
+            if not rows:
+                return 0
+
+            db = SessionLocal()
+            try:
+                written = FormulaHistoryService.create_formula_entries(db, rows)
+            except Exception as e:
+                db.rollback()
+                cls._requeue(rows, e)
+                return 0
+            finally:
+                db.close()
+
+            with cls._condition:
+                cls._stats["flushed"] += written
+                cls._stats["flushes"] += 1
+            return written
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._condition:
+            stats = dict(cls._stats)
+            stats["pending"] = len(cls._pending)
+        stats["enabled"] = cls.ENABLED
+        stats["max_rows"] = cls.MAX_ROWS
+        stats["max_staleness_seconds"] = cls.MAX_STALENESS
+        return stats
+
+
+    @classmethod
+    def _run_flusher(cls) -> None:
+        while True:
+            with cls._condition:
+                while not cls._stopping:
+                    if len(cls._pending) >= cls.MAX_ROWS:
+                        break
+                    if cls._pending:
+                        remaining = cls.MAX_STALENESS - (time.monotonic() - cls._oldest_at)
+                        if remaining <= 0:
+                            break
+                        cls._condition.wait(remaining)
+                    else:
+                        cls._condition.wait()
+                stopping = cls._stopping
+
+            cls.flush()
+            if stopping:
+                return
+
+    @classmethod
+    def _requeue(cls, rows: List[dict], error: Exception) -> None:
+        with cls._condition:
+            cls._stats["failed_flushes"] += 1
+            room = max(cls.MAX_PENDING - len(cls._pending), 0)
+            kept = rows[:room]
+            dropped = len(rows) - len(kept)
+            # Put the failed rows back in front so the next flush retries them first
+            cls._pending = kept + cls._pending
+            cls._oldest_at = time.monotonic()
+            cls._stats["dropped"] += dropped
+
+        logger.error(f"History flush of {len(rows)} rows failed ({dropped} dropped): {str(error)}")
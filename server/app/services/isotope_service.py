@@ -0,0 +1,164 @@
+import json
+import os
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.services.formula_service import load_atomic_masses
+from app.utils.formula_parser import parse_formula
+
+
+ISOTOPES_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'isotopes.json')
+ELECTRON_MASS = 0.000548579909065
+
+# Peaks less likely than this are dropped during convolution, far below anything a
+# spectrometer resolves; it is what keeps large molecules from growing without bound
+PRUNE_PROBABILITY = float(os.getenv("ISOTOPE_PRUNE_PROBABILITY", 1e-16))
+DISTRIBUTION_CACHE_SIZE = int(os.getenv("ISOTOPE_CACHE_SIZE", 4096))
+
+# (nominal mass, probability, mean exact mass) per peak, ascending by nominal mass.
+# Isotopologues with the same nominal mass are merged into one peak at their
+# probability-weighted mass, the way a unit- or medium-resolution spectrum shows them.
+Distribution = Tuple[Tuple[int, float, float], ...]
+
+
+class IsotopePattern(NamedTuple):
+    formula: str
+    charge: int
+    monoisotopic_mass: float  # most abundant isotope of every element
+    average_mass: float
+    most_abundant_mass: float
+    nominal_mass: int  # of the formula, not divided by the charge
+    peaks: List[Tuple[float, float, float]]  # (mass, abundance relative to the base peak in %, probability)
+    estimated_elements: List[str]  # no natural isotopic composition; one peak at the standard atomic weight
+
+
+@lru_cache(maxsize=None)
+def load_isotopes() -> Dict[str, Tuple[Tuple[float, float], ...]]:
+    # Exact masses and natural abundances (NIST); read once per process
+    with open(ISOTOPES_PATH) as file:
+        table = json.load(file)
+    return {element: tuple((mass, abundance) for mass, abundance in isotopes) for element, isotopes in table.items()}
+
+
+@lru_cache(maxsize=None)
+def single_atom(element: str) -> Distribution:
+    isotopes = load_isotopes().get(element)
+    if isotopes is None:
+        mass = load_atomic_masses().masses.get(element)
+        if mass is None:
+            raise ValueError(f"Unknown element: {element}")
+        return ((round(mass), 1.0, mass),)
+    return tuple((round(mass), abundance, mass) for mass, abundance in isotopes if abundance > 0)
+
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def element_distribution(element: str, count: int) -> Distribution:
+    """
+    The isotope distribution of `count` atoms of one element, by repeated squaring:
+    X^n is X^(n//2) convolved with itself, times one more atom when n is odd. C100
+    takes 8 convolutions instead of 99, and every intermediate power is memoized,
+    so C60 and C120 reuse the C30 that C100H202 already computed.
+    """
+    if count == 1:
+        return single_atom(element)
+    half = element_distribution(element, count // 2)
+    result = convolve(half, half)
+    if count % 2:
+        result = convolve(result, single_atom(element))
+    return result
+
+
+def convolve(first: Distribution, second: Distribution) -> Distribution:
+    # Pruned convolution: products under PRUNE_PROBABILITY are never accumulated
+    peaks: Dict[int, list] = {}
+    for nominal_a, probability_a, mass_a in first:
+        for nominal_b, probability_b, mass_b in second:
+            probability = probability_a * probability_b
+            if probability < PRUNE_PROBABILITY:
+                continue
+            peak = peaks.get(nominal_a + nominal_b)
+            if peak is None:
+                peaks[nominal_a + nominal_b] = [probability, probability * (mass_a + mass_b)]
+            else:
+                peak[0] += probability
+                peak[1] += probability * (mass_a + mass_b)
+    return tuple((nominal, probability, weighted / probability) for nominal, (probability, weighted) in sorted(peaks.items()))
+
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def formula_distribution(composition: Tuple[Tuple[str, int], ...]) -> Distribution:
+    distribution: Distribution = ((0, 1.0, 0.0),)
+    for element, count in composition:
+        if count > 0:
+            distribution = convolve(distribution, element_distribution(element, count))
+    return distribution
+
+
+class IsotopeService:
+    """
+    Exact masses and isotope patterns for mass spectrometry. FormulaService gives the
+    average molar mass; this gives the monoisotopic mass and the full distribution,
+    built from per-element distributions that are memoized by element and count.
+    """
+
+    @staticmethod
+    def isotope_pattern(formula: str, threshold: float = 1e-4, max_peaks: Optional[int] = None) -> IsotopePattern:
+        """
+        Peaks whose abundance is below `threshold` times the base peak are left out;
+        `max_peaks` keeps only the most abundant ones. Charged formulas ("SO4^2-")
+        report m/z: the electrons gained or lost are accounted for and masses divided
+        by the charge.
+        """
+        try:
+            parsed = parse_formula(formula)
+        except ValueError as e:
+            raise ValueError(f"Error parsing formula: {str(e)}")
+
+        isotopes = load_isotopes()
+        composition = tuple(sorted(parsed.composition))  # "OH2" and "H2O" share a cache entry
+        if not any(count > 0 for _, count in composition):
+            raise ValueError(f"Formula has no atoms: {formula}")
+        distribution = formula_distribution(composition)
+
+        charge = parsed.charge
+        divisor = abs(charge) or 1
+        to_mz = lambda mass: (mass - charge * ELECTRON_MASS) / divisor
+
+        total = sum(probability for _, probability, _ in distribution)
+        base = max(distribution, key=lambda peak: peak[1])
+        peaks = [
+            (to_mz(mass), probability / base[1] * 100, probability / total)
+            for _, probability, mass in distribution
+            if probability >= base[1] * threshold
+        ]
+        if max_peaks is not None and len(peaks) > max_peaks:
+            peaks = sorted(sorted(peaks, key=lambda peak: peak[1], reverse=True)[:max_peaks])
+
+        monoisotopic, nominal = 0.0, 0
+        for element, count in composition:
+            element_isotopes = isotopes.get(element)
+            mass = max(element_isotopes, key=lambda isotope: isotope[1])[0] if element_isotopes else single_atom(element)[0][2]
+            monoisotopic += mass * count
+            nominal += round(mass) * count  # mass numbers; rounding the sum drifts once the mass defect passes 0.5
+
+        return IsotopePattern(
+            formula=formula,
+            charge=charge,
+            monoisotopic_mass=to_mz(monoisotopic),
+            average_mass=to_mz(sum(probability * mass for _, probability, mass in distribution) / total),
+            most_abundant_mass=to_mz(base[2]),
+            nominal_mass=nominal,
+            peaks=peaks,
+            estimated_elements=[element for element, _ in composition if element not in isotopes],
+        )
+
+    @staticmethod
+    def isotope_patterns(formulas: List[str], threshold: float = 1e-4, max_peaks: Optional[int] = None) -> List[Tuple[Optional[IsotopePattern], Optional[str]]]:
+        # (pattern, None) or (None, error) per formula, in input order
+        results = []
+        for formula in formulas:
+            try:
+                results.append((IsotopeService.isotope_pattern(formula, threshold, max_peaks), None))
+            except ValueError as e:
+                results.append((None, str(e)))
+        return results
@@ -0,0 +1,295 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.utils.formula_parser import hill_formula, parse_formula
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.getenv(
+    "LOCAL_COMPOUND_STORE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "compound_store.sqlite"),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS compounds (
+    cid INTEGER PRIMARY KEY,
+    formula TEXT,
+    formula_key TEXT,
+    title TEXT,
+    iupac_name TEXT,
+    smiles TEXT,
+    molar_mass REAL,
+    synonyms TEXT
+);
+CREATE TABLE IF NOT EXISTS names (
+    name_key TEXT NOT NULL,
+    cid INTEGER NOT NULL
+);
+"""
+# Created after the bulk load; maintaining them row by row would slow the import several times over
+INDEXES = """
+CREATE INDEX IF NOT EXISTS ix_compounds_formula_key ON compounds (formula_key, cid);
+CREATE INDEX IF NOT EXISTS ix_names_name_key ON names (name_key, cid);
+"""
+
+MAX_SYNONYMS = 10  # the live client keeps the first 10 too
+
+
+class StoredCompound(NamedTuple):
+    cid: int
+    formula: Optional[str]
+    title: Optional[str]
+    iupac_name: Optional[str]
+    smiles: Optional[str]
+    molar_mass: Optional[float]
+    synonyms: List[str]
+
+
+def formula_key(formula: str) -> str:
+    # Hill order like canonical_formula, without its cache: an import sees millions of formulas once
+    try:
+        return hill_formula(parse_formula.__wrapped__(formula))
+    except ValueError:
+        return "".join(formula.split())
+
+
+class LocalCompoundStore:
+    """
+    Read side of the offline compound store: an indexed SQLite file built from a
+    PubChem bulk extract by import_compounds.py. Lookups by CID use the primary
+    key, by formula and by name a covering index, so each is a single B-tree
+    probe however large the extract. Connections are read-only, one per thread.
+    """
+
+    ENABLED = os.getenv("LOCAL_COMPOUND_STORE_ENABLED", "true").lower() == "true"
+
+    _path: Optional[str] = None
+    _loaded = False
+    _load_lock = threading.Lock()
+    _local = threading.local()
+    _stats_lock = threading.Lock()
+    _stats = {"hits": 0, "misses": 0}
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> bool:
+        # Checked once per process; without a store file every lookup is a miss
+        with cls._load_lock:
+            if cls._loaded:
+                return cls._path is not None
+            cls._loaded = True
+
+            path = path or DEFAULT_PATH
+            if not cls.ENABLED or not os.path.exists(path):
+                return False
+            cls._path = path
+        logger.info("Using local compound store at %s", path)
+        return True
+
+    @classmethod
+    def lookup(cls, formula: str, cid: Optional[int] = None) -> Optional[StoredCompound]:
+        """
+        The compound for a formula: by CID when the caller already knows it, then the
+        formula as a name, the way the live client's name search does ("CH3OCH3"), then
+        by canonical formula, but only when a single compound has it: isomers share
+        one, and picking any of them would answer for a different compound.
+        """
+        if not cls.load():
+            return None
+
+        compound = cls.lookup_cid(cid) if cid is not None else None
+        if compound is None:
+            compound = cls.lookup_name(formula)
+        if compound is None:
+            compound = cls._fetch_unique(
+                "SELECT * FROM compounds WHERE formula_key = ? ORDER BY cid LIMIT 2", (formula_key(formula),)
+            )
+
+        with cls._stats_lock:
+            cls._stats["hits" if compound is not None else "misses"] += 1
+        return compound
+
+    @classmethod
+    def lookup_cid(cls, cid: int) -> Optional[StoredCompound]:
+        if not cls.load():
+            return None
+        return cls._fetch_one("SELECT * FROM compounds WHERE cid = ?", (cid,))
+
+    @classmethod
+    def lookup_name(cls, name: str) -> Optional[StoredCompound]:
+        if not cls.load():
+            return None
+        return cls._fetch_one(
+            "SELECT compounds.* FROM names JOIN compounds ON compounds.cid = names.cid "
+            "WHERE names.name_key = ? ORDER BY names.cid LIMIT 1",
+            (name.strip().lower(),)
+        )
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._stats_lock:
+            stats = dict(cls._stats)
+        stats["path"] = cls._path
+        return stats
+
+    @classmethod
+    def _connection(cls) -> sqlite3.Connection:
+        connection = getattr(cls._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{cls._path}?mode=ro", uri=True, check_same_thread=False)
+            connection.execute("PRAGMA mmap_size = 268435456")  # index pages are read from the page cache
+            cls._local.connection = connection
+        return connection
+
+    @classmethod
+    def _fetch_one(cls, query: str, parameters: tuple) -> Optional[StoredCompound]:
+        try:
+            row = cls._connection().execute(query, parameters).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Local compound store lookup failed: {str(e)}")
+            return None
+        return cls._compound(row) if row is not None else None
+
+    @classmethod
+    def _fetch_unique(cls, query: str, parameters: tuple) -> Optional[StoredCompound]:
+        # The single matching compound; None when there is none or more than one
+        try:
+            rows = cls._connection().execute(query, parameters).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Local compound store lookup failed: {str(e)}")
+            return None
+        return cls._compound(rows[0]) if len(rows) == 1 else None
+
+    @staticmethod
+    def _compound(row: tuple) -> StoredCompound:
+        cid, formula, _, title, iupac_name, smiles, molar_mass, synonyms = row
+        return StoredCompound(cid, formula, title, iupac_name, smiles, molar_mass, synonyms.split("\n") if synonyms else [])
+
+
+# ---------------------------------------------------------------------------
+# Import
+
+class CompoundStoreWriter:
+    """
+    Bulk loader for the store. Each PubChem extract (CID-Mass, CID-Title,
+    CID-IUPAC, CID-SMILES, CID-Synonym-filtered: tab-separated, sorted by CID)
+    is streamed and written chunk_size rows per transaction, so memory use is
+    bounded by one chunk whatever the file size.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 50000):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.connection = sqlite3.connect(path)
+        # A half-written store is rebuilt, not recovered, so skip the journal and fsyncs
+        self.connection.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + SCHEMA)
+
+    def import_masses(self, lines: Iterable[str], atomic_masses: Dict[str, float]) -> dict:
+        # CID-Mass: cid, formula, monoisotopic mass, exact mass
+        def rows():
+            for fields in _split(lines, 2):
+                cid, formula = int(fields[0]), fields[1]
+                yield cid, formula, formula_key(formula), _molar_mass(formula, atomic_masses)
+
+        return self._load(
+            "INSERT INTO compounds (cid, formula, formula_key, molar_mass) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(cid) DO UPDATE SET formula = excluded.formula, formula_key = excluded.formula_key, "
+            "molar_mass = excluded.molar_mass",
+            rows()
+        )
+
+    def import_column(self, lines: Iterable[str], column: str) -> dict:
+        # CID-Title, CID-IUPAC, CID-SMILES: cid, value
+        if column not in ("title", "iupac_name", "smiles"):
+            raise ValueError(f"Unknown column: {column}")
+        statement = (
+            f"INSERT INTO compounds (cid, {column}) VALUES (?, ?) "
+            f"ON CONFLICT(cid) DO UPDATE SET {column} = excluded.{column}"
+        )
+        return self._load(statement, ((int(fields[0]), fields[1]) for fields in _split(lines, 2)))
+
+    def import_synonyms(self, lines: Iterable[str], max_synonyms: int = MAX_SYNONYMS) -> dict:
+        # CID-Synonym-filtered: one (cid, synonym) line per synonym, grouped by CID
+        def rows():
+            for cid, synonyms in _group_by_cid(_split(lines, 2), max_synonyms):
+                yield cid, "\n".join(synonyms)
+
+        return self._load(
+            "INSERT INTO compounds (cid, synonyms) VALUES (?, ?) "
+            "ON CONFLICT(cid) DO UPDATE SET synonyms = excluded.synonyms",
+            rows()
+        )
+
+    def finish(self) -> dict:
+        # The name index covers titles and the stored synonyms, whichever files were imported
+        def names():
+            for cid, title, synonyms in self.connection.execute(
+                "SELECT cid, title, synonyms FROM compounds WHERE title IS NOT NULL OR synonyms IS NOT NULL"
+            ):
+                keys = {title.lower()} if title else set()
+                if synonyms:
+                    keys.update(name.lower() for name in synonyms.split("\n"))
+                for key in keys:
+                    yield key, cid
+
+        self.connection.execute("DELETE FROM names")
+        self.connection.commit()
+        summary = self._load("INSERT INTO names (name_key, cid) VALUES (?, ?)", names())
+        self.connection.executescript(INDEXES)
+        self.connection.execute("ANALYZE")
+        self.connection.commit()
+        self.connection.close()
+        return summary
+
+    def _load(self, statement: str, rows: Iterator[tuple]) -> dict:
+        start = time.perf_counter()
+        count = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                count += self._write(statement, chunk)
+                chunk = []
+        if chunk:
+            count += self._write(statement, chunk)
+        elapsed = time.perf_counter() - start
+        return {"rows": count, "seconds": round(elapsed, 2), "rows_per_sec": round(count / elapsed) if elapsed else count}
+
+    def _write(self, statement: str, chunk: List[tuple]) -> int:
+        # Its own cursor, so the SELECT that finish() is streaming from isn't reset
+        self.connection.cursor().executemany(statement, chunk)
+        self.connection.commit()
+        return len(chunk)
+
+
+def _split(lines: Iterable[str], fields: int) -> Iterator[List[str]]:
+    for line in lines:
+        parts = line.rstrip("\n").split("\t")
+        if len(parts) >= fields and parts[0].isdigit():
+            yield parts
+
+
+def _group_by_cid(rows: Iterator[List[str]], limit: int) -> Iterator[Tuple[int, List[str]]]:
+    current, synonyms = None, []
+    for fields in rows:
+        cid = int(fields[0])
+        if cid != current:
+            if current is not None:
+                yield current, synonyms
+            current, synonyms = cid, []
+        if len(synonyms) < limit:
+            synonyms.append(fields[1])
+    if current is not None:
+        yield current, synonyms
+
+
+def _molar_mass(formula: str, atomic_masses: Dict[str, float]) -> Optional[float]:
+    try:
+        composition = parse_formula.__wrapped__(formula).composition
+        return sum(atomic_masses[element] * count for element, count in composition)
+    except (ValueError, KeyError):
+        return None
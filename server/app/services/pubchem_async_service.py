@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.services.pubchem_cache_service import PubChemCache
+from app.services.pubchem_service import PubChemService
+from app.utils.formula_table import lookup_cid
+from app.utils.metrics import record_throttle, record_upstream
+from app.utils.resilience import CircuitOpenError, Deadline, DeadlineExceeded
+from app.utils.single_flight import AsyncSingleFlight
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncPubChemService:
+    """
+    asyncio counterpart of PubChemService. Keeps one pooled keep-alive client per
+    event loop and runs the independent per-CID requests concurrently, capped by a
+    per-host semaphore. URL building, response parsing, the rate limiter and the
+    circuit breaker are shared with the sync client.
+    """
+
+    MAX_CONNECTIONS = int(os.getenv("PUBCHEM_MAX_CONNECTIONS", 10))
+    MAX_CONCURRENCY_PER_HOST = int(os.getenv("PUBCHEM_MAX_CONCURRENCY", 5))
+    HTTP2 = os.getenv("PUBCHEM_HTTP2", "false").lower() == "true"  # needs the optional `h2` package
+
+    _client: Optional[httpx.AsyncClient] = None
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _semaphores: Dict[str, asyncio.Semaphore] = {}
+    _single_flight = AsyncSingleFlight()
+
+    @classmethod
+    async def get_chemical_properties(cls, formula: str) -> Dict[str, Any]:
+        cached = await asyncio.to_thread(PubChemCache.get, formula)
+        if cached is not None:
+            logger.info(f"PubChem cache hit for formula: {formula}")
+            return cached
+
+        # A local SQLite read, off the event loop like the cache's DB tier
+        stored = await asyncio.to_thread(PubChemService._lookup_store, formula)
+        if stored is not None:
+            logger.info(f"Local compound store hit for formula: {formula}")
+            return stored
+
+        try:
+            # Concurrent tasks for the same formula share a single upstream fetch
+            properties = await cls._single_flight.do(
+                PubChemCache.normalize_formula(formula),
+                lambda: cls._fetch_and_cache(formula, Deadline(PubChemService.REQUEST_BUDGET))
+            )
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            logger.warning(f"Skipping PubChem lookup for formula '{formula}': {str(e)}")
+            return {}
+        except Exception as e:
+            # Upstream errors are not cached, so the next request retries PubChem
+            logger.error(f"Error fetching compound properties for formula '{formula}': {str(e)}")
+            return {}
+
+        return dict(properties)
+
+    @classmethod
+    async def aclose(cls) -> None:
+        if cls._client is not None:
+            await cls._client.aclose()
+        cls._client = None
+        cls._loop = None
+        cls._semaphores = {}
+
+
+    @classmethod
+    async def _fetch_and_cache(cls, formula: str, deadline: Deadline) -> Dict[str, Any]:
+        properties = await cls._fetch_chemical_properties(formula, deadline)
+        if not deadline.skipped and (not properties or properties.get("formula")):
+            await asyncio.to_thread(PubChemCache.set, formula, properties)
+        return properties
+
+    @classmethod
+    def _get_client(cls) -> httpx.AsyncClient:
+        # Clients and semaphores are bound to the loop that created them
+        loop = asyncio.get_running_loop()
+        if cls._client is None or cls._loop is not loop:
+            limits = httpx.Limits(
+                max_connections=cls.MAX_CONNECTIONS,
+                max_keepalive_connections=cls.MAX_CONNECTIONS
+            )
+            cls._client = httpx.AsyncClient(limits=limits, timeout=PubChemService.TIMEOUT, http2=cls.HTTP2)
+            cls._loop = loop
+            cls._semaphores = {}
+        return cls._client
+
+    @classmethod
+    async def _get_json(cls, url: str, endpoint: str, deadline: Deadline) -> Tuple[int, Optional[dict]]:
+        wait = PubChemService._admit(deadline)
+        if wait > 0:
+            await asyncio.sleep(wait)
+            record_throttle("pubchem", wait)
+
+        client = cls._get_client()
+        host = urlsplit(url).netloc
+        semaphore = cls._semaphores.get(host)
+        if semaphore is None:
+            semaphore = cls._semaphores[host] = asyncio.Semaphore(cls.MAX_CONCURRENCY_PER_HOST)
+
+        async with semaphore:
+            # Timed inside the semaphore, so the metric is upstream latency, not queueing
+            timeout = deadline.timeout(PubChemService.TIMEOUT)
+            start = time.perf_counter()
+            status = "error"
+            try:
+                response = await client.get(url, timeout=timeout)
+                status = response.status_code
+            except httpx.TimeoutException:
+                if timeout < PubChemService.TIMEOUT:
+                    status = "deadline"
+                    raise DeadlineExceeded(f"PubChem {endpoint} request ran past the request budget")
+                raise
+            finally:
+                PubChemService._record_outcome(status)
+                record_upstream("pubchem", endpoint, time.perf_counter() - start, status)
+        if response.status_code != 200:
+            return response.status_code, None
+        return response.status_code, response.json()
+
+    @classmethod
+    async def _fetch_chemical_properties(cls, formula: str, deadline: Deadline) -> Dict[str, Any]:
+        cid = lookup_cid(formula)
+        if cid is not None:
+            logger.info(f"Formula table has CID {cid} for formula: {formula}")
+        else:
+            cid = await cls._search_cid(formula, deadline)
+            if cid is None:
+                logger.warning(f"No compound ID found for formula: {formula}")
+                return {}
+            logger.info(f"Found CID {cid} for formula: {formula}")
+
+        properties = await cls._fetch_properties_by_cid(cid, deadline)
+        return PubChemService._add_compound_urls(cid, properties)
+
+    @classmethod
+    async def _search_cid(cls, formula: str, deadline: Deadline) -> Optional[int]:
+        # Same fallback order as PubChemService._search_cid
+        logger.info(f"Requesting CID for formula: {formula}")
+        status, data = await cls._get_json(PubChemService._cid_url(formula), "cid", deadline)
+        if status == 200:
+            cid = PubChemService._parse_cid(data)
+            if cid is not None:
+                return cid
+        elif status != 404:
+            raise RuntimeError(f"PubChem CID lookup returned HTTP {status}")
+        if not PubChemService._is_molecular_formula(formula):
+            return None
+
+        status, data = await cls._get_json(PubChemService._formula_cid_url(formula), "fastformula", deadline)
+        if status in (400, 404):
+            return None
+        if status != 200:
+            raise RuntimeError(f"PubChem formula search returned HTTP {status}")
+        return PubChemService._parse_cid(data)
+
+    @classmethod
+    async def _fetch_properties_by_cid(cls, cid: int, deadline: Deadline) -> Dict[str, Any]:
+        # Everything after the CID lookup is independent, so fetch it all at once
+        results = await asyncio.gather(
+            cls._get_json(PubChemService._properties_url(cid), "properties", deadline),
+            cls._get_json(PubChemService._classification_url(cid), "classification", deadline),
+            cls._get_json(PubChemService._synonyms_url(cid), "synonyms", deadline),
+            cls._get_json(PubChemService._description_url(cid), "description", deadline),
+            cls._get_json(PubChemService._sections_url(cid), "sections", deadline),
+            return_exceptions=True
+        )
+        # The properties request is the lookup itself; its failure propagates like in the sync
+        # client. The other requests are optional and only mark the result incomplete.
+        if isinstance(results[0], Exception):
+            raise results[0]
+        if results[0][0] not in (200, 404):
+            raise RuntimeError(f"PubChem properties request returned HTTP {results[0][0]}")
+        props_result, classification, synonyms, description, sections = [
+            (0, None) if isinstance(result, Exception) else result for result in results
+        ]
+        for result in results[1:]:
+            if isinstance(result, Exception):
+                logger.error(f"Error fetching PubChem data for CID {cid}: {str(result)}")
+                deadline.skipped.append("cid_data")
+
+        combined_properties = PubChemService._parse_properties(cid, props_result[1]) if props_result[1] else {}
+        if not combined_properties:
+            logger.warning(f"No properties found for CID: {cid}")
+            return {}
+
+        # Merge in the same order as the sync client so precedence is identical
+        if classification[1]:
+            combined_properties.update(PubChemService._parse_classification(classification[1]))
+        if synonyms[1]:
+            combined_properties.update(PubChemService._parse_synonyms(synonyms[1]))
+        if description[1]:
+            combined_properties.update(PubChemService._parse_description(description[1]))
+
+        section_ids = PubChemService._parse_section_ids(sections[1]) if sections[1] else []
+        if section_ids:
+            section_results = await asyncio.gather(
+                *(cls._get_json(PubChemService._section_url(cid, section_id), "section", deadline) for section_id in section_ids),
+                return_exceptions=True
+            )
+            for result in section_results:
+                if isinstance(result, Exception):
+                    logger.error(f"Error fetching PubChem section for CID {cid}: {str(result)}")
+                    deadline.skipped.append("section")
+                elif result[1]:
+                    PubChemService._merge_section(combined_properties, result[1])
+
+        return combined_properties
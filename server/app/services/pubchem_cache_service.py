@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from app.config.database_config import SessionLocal
+from app.models.PubChemCacheModel import PubChemCacheEntry
+
+
+logger = logging.getLogger(__name__)
+
+
+class PubChemCache:
+    """
+    Two-tier cache for PubChem properties: an in-process LRU with TTL eviction in
+    front of the `pubchem_cache` table, which survives restarts and is shared by
+    all workers. Negative results ("no compound for this formula") are cached too,
+    with a shorter TTL.
+    """
+
+    MAX_ENTRIES = int(os.getenv("PUBCHEM_CACHE_MAX_ENTRIES", 1024))
+    TTL_SECONDS = int(os.getenv("PUBCHEM_CACHE_TTL", 7 * 24 * 3600))
+    NEGATIVE_TTL_SECONDS = int(os.getenv("PUBCHEM_CACHE_NEGATIVE_TTL", 3600))
+    DB_ENABLED = os.getenv("PUBCHEM_CACHE_DB_ENABLED", "true").lower() == "true"
+
+    _lock = threading.Lock()
+    _entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, properties)
+    _stats = {
+        "memory_hits": 0,
+        "db_hits": 0,
+        "negative_hits": 0,
+        "misses": 0,
+        "evictions": 0,
+        "stores": 0,
+    }
+
+    @staticmethod
+    def normalize_formula(formula: str) -> str:
+        # The spelling minus whitespace, not the Hill formula: isomers share a Hill
+        # formula ("C2H5OH" and "CH3OCH3" are both C2H6O) but not a compound
+        return "".join(formula.split())
+
+    @classmethod
+    def formula_key(cls, formula: str) -> str:
+        return f"formula:{cls.normalize_formula(formula)}"
+
+    @staticmethod
+    def cid_key(cid: int) -> str:
+        return f"cid:{cid}"
+
+    # Returns the cached properties, {} for a cached negative result, or None on a miss.
+    @classmethod
+    def get(cls, formula: str) -> Optional[Dict[str, Any]]:
+        return cls._get(cls.formula_key(formula))
+
+    @classmethod
+    def get_by_cid(cls, cid: int) -> Optional[Dict[str, Any]]:
+        return cls._get(cls.cid_key(cid))
+
+    @classmethod
+    def set(cls, formula: str, properties: Dict[str, Any]) -> None:
+        ttl = cls.TTL_SECONDS if properties else cls.NEGATIVE_TTL_SECONDS
+        expires_at = time.time() + ttl
+
+        keys = [cls.formula_key(formula)]
+        if properties.get("cid"):
+            keys.append(cls.cid_key(properties["cid"]))
+
+        for key in keys:
+            cls._set_memory(key, expires_at, properties)
+        cls._set_db(keys, expires_at, properties)
+
+        with cls._lock:
+            cls._stats["stores"] += 1
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        with cls._lock:
+            stats = dict(cls._stats)
+            stats["size"] = len(cls._entries)
+        lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["memory_hits"] + stats["db_hits"]) / lookups, 4) if lookups else 0.0
+        stats["max_entries"] = cls.MAX_ENTRIES
+        return stats
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._entries.clear()
+            for name in cls._stats:
+                cls._stats[name] = 0
+
+
+    @classmethod
+    def _get(cls, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is not None:
+                expires_at, properties = entry
+                if expires_at > now:
+                    cls._entries.move_to_end(key)
+                    cls._stats["memory_hits"] += 1
+                    if not properties:
+                        cls._stats["negative_hits"] += 1
+                    return dict(properties)
+                del cls._entries[key]
+
+        entry = cls._get_db(key, now)
+        if entry is None:
+            with cls._lock:
+                cls._stats["misses"] += 1
+            return None
+
+        expires_at, properties = entry
+        cls._set_memory(key, expires_at, properties)
+        with cls._lock:
+            cls._stats["db_hits"] += 1
+            if not properties:
+                cls._stats["negative_hits"] += 1
+        return dict(properties)
+
+    @classmethod
+    def _set_memory(cls, key: str, expires_at: float, properties: Dict[str, Any]) -> None:
+        with cls._lock:
+            cls._entries[key] = (expires_at, dict(properties))
+            cls._entries.move_to_end(key)
+            while len(cls._entries) > cls.MAX_ENTRIES:
+                cls._entries.popitem(last=False)
+                cls._stats["evictions"] += 1
+
+    @classmethod
+    def _get_db(cls, key: str, now: float) -> Optional[tuple]:
+        if not cls.DB_ENABLED:
+            return None
+
+        db = SessionLocal()
+        try:
+            row = db.query(PubChemCacheEntry).filter(PubChemCacheEntry.cache_key == key).first()
+            if row is None or row.expires_at is None or row.expires_at <= now:
+                return None
+            properties = {} if row.is_negative else json.loads(row.payload or "{}")
+            return row.expires_at, properties
+        except Exception as e:
+            logger.warning(f"PubChem cache lookup failed for '{key}': {str(e)}")
+            return None
+        finally:
+            db.close()
+
+    @classmethod
+    def _set_db(cls, keys: list, expires_at: float, properties: Dict[str, Any]) -> None:
+        if not cls.DB_ENABLED:
+            return
+
+        db = SessionLocal()
+        try:
+            now = time.time()
+            payload = json.dumps(properties) if properties else None
+            for key in keys:
+                db.merge(PubChemCacheEntry(
+                    cache_key=key,
+                    payload=payload,
+                    is_negative=not properties,
+                    created_at=now,
+                    expires_at=expires_at
+                ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"PubChem cache write failed for {keys}: {str(e)}")
+        finally:
+            db.close()
@@ -1,199 +1,574 @@
+import os
 import requests
 import logging
-from typing import Dict, Any
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterable, List, Optional
+from requests.adapters import HTTPAdapter
+
+from app.services.local_compound_store import LocalCompoundStore, StoredCompound
+from app.services.pubchem_cache_service import PubChemCache
+from app.utils.formula_parser import canonical_formula, hill_formula, parse_formula
+from app.utils.formula_table import lookup_cid
+from app.utils.metrics import record_throttle, record_upstream, record_upstream_rejected
+from app.utils.resilience import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded, TokenBucket
+from app.utils.single_flight import SingleFlight
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class PubChemService:
-    BASE_URL = "https://pubchem.ncbi.nlm.nih.gov/rest/pug"
+    # Overridable so the client can be pointed at a local stub server
+    BASE_URL = os.getenv("PUBCHEM_BASE_URL", "https://pubchem.ncbi.nlm.nih.gov/rest/pug")
+    PROPERTY_LIST = "MolecularFormula,MolecularWeight,CanonicalSMILES,IsomericSMILES,IUPACName,XLogP,Complexity,HBondDonorCount,HBondAcceptorCount,RotatableBondCount,ExactMass,MonoisotopicMass,TPSA,HeavyAtomCount,AtomChiralCount,BondChiralCount"
+    TIMEOUT = float(os.getenv("PUBCHEM_TIMEOUT", 10))  # per request
+    REQUEST_BUDGET = float(os.getenv("PUBCHEM_REQUEST_BUDGET", 15))  # all requests of one lookup together
+    POOL_SIZE = int(os.getenv("PUBCHEM_MAX_CONNECTIONS", 10))
+    BATCH_SIZE = int(os.getenv("PUBCHEM_BATCH_SIZE", 100))  # CIDs per multi-CID request
+
+    # PUG REST allows 5 requests per second per client; 0 turns the limiter off (local stubs)
+    RATE_LIMIT = float(os.getenv("PUBCHEM_RATE_LIMIT", 5))
+    RATE_BURST = float(os.getenv("PUBCHEM_RATE_BURST", 5))
+
+    # Stop calling PubChem for a while when half of the recent requests failed
+    BREAKER_FAILURE_RATE = float(os.getenv("PUBCHEM_BREAKER_FAILURE_RATE", 0.5))
+    BREAKER_MIN_CALLS = int(os.getenv("PUBCHEM_BREAKER_MIN_CALLS", 10))
+    BREAKER_WINDOW = float(os.getenv("PUBCHEM_BREAKER_WINDOW", 30))
+    BREAKER_OPEN_SECONDS = float(os.getenv("PUBCHEM_BREAKER_OPEN_SECONDS", 30))
+
+    _session: Optional[requests.Session] = None
+    _single_flight = SingleFlight()
+    # Shared with AsyncPubChemService: both clients talk to the same upstream
+    _rate_limiter = TokenBucket(RATE_LIMIT, RATE_BURST)
+    _breaker = CircuitBreaker(BREAKER_FAILURE_RATE, BREAKER_MIN_CALLS, BREAKER_WINDOW, BREAKER_OPEN_SECONDS)
 
     @classmethod
-    def get_chemical_properties(cls, formula: str) -> Dict[str, Any]:
+    def get_chemical_properties(cls, formula: str, raise_errors: bool = False) -> Dict[str, Any]:
+        cached = PubChemCache.get(formula)
+        if cached is not None:
+            logger.info(f"PubChem cache hit for formula: {formula}")
+            return cached
+
+        stored = cls._lookup_store(formula)
+        if stored is not None:
+            logger.info(f"Local compound store hit for formula: {formula}")
+            return stored
+
         try:
-            # Step 1: Try to get the CID (PubChem Compound ID) based on the formula
-            cid_url = f"{cls.BASE_URL}/compound/name/{formula}/cids/JSON"
-            
-            logger.info(f"Requesting CID for formula: {formula}")
-            response = requests.get(cid_url, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            if "IdentifierList" not in data or "CID" not in data["IdentifierList"] or not data["IdentifierList"]["CID"]:
+            # Concurrent requests for the same formula share a single upstream fetch
+            properties = cls._single_flight.do(
+                PubChemCache.normalize_formula(formula),
+                lambda: cls._fetch_and_cache(formula, Deadline(cls.REQUEST_BUDGET))
+            )
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            # PubChem is failing or slow: answer without enrichment instead of waiting on it
+            logger.warning(f"Skipping PubChem lookup for formula '{formula}': {str(e)}")
+            if raise_errors:
+                raise
+            return {}
+        except Exception as e:
+            # Upstream errors are not cached, so the next request retries PubChem
+            logger.error(f"Error fetching compound properties for formula '{formula}': {str(e)}")
+            if raise_errors:
+                raise
+            return {}
+
+        # Every caller gets its own copy of the shared result
+        return dict(properties)
+
+
+    @classmethod
+    def get_chemical_properties_many(cls, formulas: Iterable[str], physical_properties: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Properties for many formulas at once, for batch requests and backfills.
+        Cached formulas and those in the local compound store cost nothing. For the rest the CIDs are resolved first, then
+        properties, synonyms and descriptions are fetched for up to BATCH_SIZE CIDs
+        per request and split back per compound.
+
+        Classification and experimental sections have no multi-CID form, so they
+        stay one request per compound. With physical_properties=False they are
+        skipped; those partial results are returned but not cached. Formulas that
+        PubChem doesn't know map to {}; formulas whose lookup failed are left out,
+        so the caller can retry them.
+        """
+        results, missing = {}, []
+        for formula in dict.fromkeys(formulas):
+            cached = PubChemCache.get(formula)
+            if cached is None:
+                cached = cls._lookup_store(formula)
+            if cached is not None:
+                results[formula] = cached
+            else:
+                missing.append(formula)
+        if not missing:
+            return results
+
+        with ThreadPoolExecutor(max_workers=cls.POOL_SIZE) as executor:
+            # Step 1: CIDs, one search per formula the formula table doesn't cover
+            cids = dict(zip(missing, executor.map(cls._resolve_cid, missing)))
+            distinct_cids = list(dict.fromkeys(cid for cid in cids.values() if cid))
+
+            # Step 2: core properties, BATCH_SIZE compounds per request
+            chunks = [distinct_cids[i:i + cls.BATCH_SIZE] for i in range(0, len(distinct_cids), cls.BATCH_SIZE)]
+            by_cid, partial = {}, set()
+            for fetched, incomplete in executor.map(cls._fetch_properties_batch, chunks):
+                by_cid.update(fetched)
+                partial.update(incomplete)
+
+            # Step 3: the per-compound requests
+            if physical_properties:
+                found = [cid for cid in distinct_cids if cid in by_cid]
+                for cid, (properties, incomplete) in zip(found, executor.map(cls._fetch_physical_properties_for, found)):
+                    by_cid[cid].update(properties)
+                    if incomplete:
+                        partial.add(cid)
+            else:
+                partial.update(distinct_cids)
+
+        for formula in missing:
+            cid = cids[formula]
+            if cid is None:
+                # Not found: a negative result, cached with the shorter TTL
+                PubChemCache.set(formula, {})
+                results[formula] = {}
+            elif cid is not False and cid in by_cid:
+                # A CID without properties had its batch request fail: left out, like a failed CID lookup
+                properties = cls._add_compound_urls(cid, dict(by_cid[cid]))
+                if properties.get("formula") and cid not in partial:
+                    PubChemCache.set(formula, properties)
+                results[formula] = properties
+        return results
+
+
+    @classmethod
+    def _lookup_store(cls, formula: str) -> Optional[Dict[str, Any]]:
+        # The offline store answers without any upstream call; None falls through to PubChem
+        compound = LocalCompoundStore.lookup(formula, lookup_cid(formula))
+        if compound is None:
+            return None
+        return cls._properties_from_store(compound)
+
+
+    @classmethod
+    def _fetch_and_cache(cls, formula: str, deadline: Deadline) -> Dict[str, Any]:
+        properties = cls._fetch_chemical_properties(formula, deadline)
+
+        # Only cache complete lookups; a failed property request leaves just the CID and URLs,
+        # and a sub-request cut off by the deadline leaves some fields empty
+        if not deadline.skipped and (not properties or properties.get("formula")):
+            PubChemCache.set(formula, properties)
+        return properties
+
+
+    @classmethod
+    def _get_session(cls) -> requests.Session:
+        # One pooled keep-alive session per process instead of a new TLS connection per call
+        if cls._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=cls.POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            cls._session = session
+        return cls._session
+
+    @classmethod
+    def _get(cls, url: str, endpoint: str, deadline: Deadline) -> requests.Response:
+        # Every upstream call goes through here: rate limit, circuit breaker, deadline and metrics
+        wait = cls._admit(deadline)
+        if wait > 0:
+            time.sleep(wait)
+            record_throttle("pubchem", wait)
+        timeout = deadline.timeout(cls.TIMEOUT)
+
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = cls._get_session().get(url, timeout=timeout)
+            status = response.status_code
+            return response
+        except requests.Timeout:
+            # Cut off by our own budget rather than PubChem's timeout: not an upstream failure
+            if timeout < cls.TIMEOUT:
+                status = "deadline"
+                raise DeadlineExceeded(f"PubChem {endpoint} request ran past the request budget")
+            raise
+        finally:
+            cls._record_outcome(status)
+            record_upstream("pubchem", endpoint, time.perf_counter() - start, status)
+
+    @classmethod
+    def _admit(cls, deadline: Deadline) -> float:
+        # Returns how long to wait for a rate-limit token; raises when the call must not be made
+        try:
+            deadline.timeout(cls.TIMEOUT)
+        except DeadlineExceeded:
+            record_upstream_rejected("pubchem", "deadline")
+            raise
+
+        wait = cls._rate_limiter.reserve(max_wait=deadline.remaining())
+        if wait is None:
+            record_upstream_rejected("pubchem", "rate_limit")
+            raise DeadlineExceeded("PubChem rate limit wait exceeds the request budget")
+
+        if not cls._breaker.allow():
+            record_upstream_rejected("pubchem", "circuit_open")
+            raise CircuitOpenError("PubChem circuit breaker is open")
+        return wait
+
+    @classmethod
+    def _record_outcome(cls, status) -> None:
+        # Throttling, server errors and transport errors count against the breaker;
+        # 4xx answers (unknown formula) are PubChem working as intended
+        if status == "deadline":
+            return
+        if status == "error" or status == 429 or status >= 500:
+            cls._breaker.record_failure()
+        else:
+            cls._breaker.record_success()
+
+
+    @classmethod
+    def _fetch_chemical_properties(cls, formula: str, deadline: Deadline) -> Dict[str, Any]:
+        # Step 1: Get the CID (PubChem Compound ID), from the formula table if it lists this spelling
+        cid = lookup_cid(formula)
+        if cid is not None:
+            logger.info(f"Formula table has CID {cid} for formula: {formula}")
+        else:
+            cid = cls._search_cid(formula, deadline)
+            if cid is None:
                 logger.warning(f"No compound ID found for formula: {formula}")
                 return {}
-                
-            cid = data["IdentifierList"]["CID"][0]
             logger.info(f"Found CID {cid} for formula: {formula}")
-            
-            # Step 2: Fetch properties using the CID
-            properties = cls._fetch_properties_by_cid(cid)
-            
-            # Step 3: Add image URLs
-            properties["structure_image_url"] = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/PNG"
-            properties["structure_image_svg_url"] = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/SVG"
-            properties["compound_url"] = f"https://pubchem.ncbi.nlm.nih.gov/compound/{cid}"
-            
-            return properties
-            
+
+        # Step 2: Fetch properties using the CID
+        properties = cls._fetch_properties_by_cid(cid, deadline)
+
+        # Step 3: Add image URLs
+        return cls._add_compound_urls(cid, properties)
+
+
+    @classmethod
+    def _resolve_cid(cls, formula: str):
+        # The CID, None when PubChem has no compound for the formula, False when the lookup failed
+        cid = lookup_cid(formula)
+        if cid is not None:
+            return cid
+        try:
+            return cls._search_cid(formula, Deadline(cls.REQUEST_BUDGET))
         except Exception as e:
-            logger.error(f"Error fetching compound properties for formula '{formula}': {str(e)}")
+            logger.error(f"Error resolving CID for formula '{formula}': {str(e)}")
+            return False
+
+
+    @classmethod
+    def _search_cid(cls, formula: str, deadline: Deadline) -> Optional[int]:
+        # The name search finds common spellings ("NaCl", "CH3OCH3"). Only a formula written
+        # in Hill order ("ClNa", "C2H6O") falls back to the formula search: it names a
+        # composition, and any compound with it answers it, which is not true of "CH3OCH3"
+        logger.info(f"Requesting CID for formula: {formula}")
+        response = cls._get(cls._cid_url(formula), "cid", deadline)
+        if response.status_code != 404:
+            response.raise_for_status()
+            cid = cls._parse_cid(response.json())
+            if cid is not None:
+                return cid
+        if not cls._is_molecular_formula(formula):
+            return None
+
+        response = cls._get(cls._formula_cid_url(formula), "fastformula", deadline)
+        if response.status_code in (400, 404):
+            return None
+        response.raise_for_status()
+        return cls._parse_cid(response.json())
+
+
+    @classmethod
+    def _fetch_properties_by_cid(cls, cid: int, deadline: Deadline) -> Dict[str, Any]:
+        # A failed properties request propagates (open breaker, deadline, HTTP error): the CID
+        # and URLs alone must not pass for a finished lookup. Only the optional requests fall back.
+        logger.info(f"Requesting properties for CID: {cid}")
+        response = cls._get(cls._properties_url(cid), "properties", deadline)
+        if response.status_code != 404:
+            response.raise_for_status()
+
+        combined_properties = cls._parse_properties(cid, response.json()) if response.status_code == 200 else {}
+        if not combined_properties:
+            logger.warning(f"No properties found for CID: {cid}")
             return {}
 
+        # Try to get physical and chemical properties
+        combined_properties.update(cls._fetch_physical_properties(cid, deadline))
+        return combined_properties
 
     @classmethod
-    def _fetch_properties_by_cid(cls, cid: int) -> Dict[str, Any]:
+    def _fetch_properties_batch(cls, cids: List[int]):
+        # Returns ({cid: properties}, CIDs whose lookup is incomplete); a failed properties
+        # request reports the whole chunk as incomplete, and none of its CIDs has properties
+        deadline = Deadline(cls.REQUEST_BUDGET)
+        ids = ",".join(str(cid) for cid in cids)  # the URL builders take a CID list as well
         try:
-            # Request basic properties - added more properties
-            props_url = f"{cls.BASE_URL}/compound/cid/{cid}/property/MolecularFormula,MolecularWeight,CanonicalSMILES,IsomericSMILES,IUPACName,XLogP,Complexity,HBondDonorCount,HBondAcceptorCount,RotatableBondCount,ExactMass,MonoisotopicMass,TPSA,HeavyAtomCount,AtomChiralCount,BondChiralCount/JSON"
-            
-            logger.info(f"Requesting properties for CID: {cid}")
-            response = requests.get(props_url, timeout=10)
+            logger.info(f"Requesting properties for {len(cids)} CIDs")
+            response = cls._get(cls._properties_url(ids), "properties_batch", deadline)
             response.raise_for_status()
-            
-            data = response.json()
-            if "PropertyTable" not in data or "Properties" not in data["PropertyTable"] or not data["PropertyTable"]["Properties"]:
-                logger.warning(f"No properties found for CID: {cid}")
-                return {}
-                
-            prop_data = data["PropertyTable"]["Properties"][0]
-            
-            # Try to get physical and chemical properties
-            physchem_props = cls._fetch_physical_properties(cid)
-            
-            # Combine the data
-            combined_properties = {
-                "formula": prop_data.get("MolecularFormula", ""),
-                "molar_mass": float(prop_data.get("MolecularWeight", 0)),
-                "iupac_name": prop_data.get("IUPACName", ""),
-                "smiles": prop_data.get("CanonicalSMILES", ""),
-                "structure_3d_url": f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/record/3d/JSON",
-                **physchem_props
-            }
-            
-            return combined_properties
-            
         except Exception as e:
-            logger.error(f"Error fetching properties for CID {cid}: {str(e)}")
-            return {}
-    
+            logger.error(f"Error fetching properties for {len(cids)} CIDs: {str(e)}")
+            return {}, set(cids)
+
+        by_cid = {}
+        for entry in response.json().get("PropertyTable", {}).get("Properties", []):
+            properties = cls._parse_properties(entry.get("CID"), {"PropertyTable": {"Properties": [entry]}})
+            if properties:
+                by_cid[entry["CID"]] = properties
+
+        partial = set()
+        for endpoint, url, parse in (
+            ("synonyms_batch", cls._synonyms_url(ids), cls._parse_synonyms),
+            ("description_batch", cls._description_url(ids), cls._parse_description),
+        ):
+            try:
+                response = cls._get(url, endpoint, deadline)
+                if response.status_code != 200:
+                    continue  # 404: none of these CIDs has any
+                for cid, information in cls._split_information(response.json()).items():
+                    if cid in by_cid:
+                        by_cid[cid].update(parse({"InformationList": {"Information": information}}))
+            except Exception as e:
+                logger.error(f"Error fetching {endpoint} for {len(cids)} CIDs: {str(e)}")
+                partial.update(cids)
+        return by_cid, partial
+
+    @classmethod
+    def _fetch_physical_properties_for(cls, cid: int):
+        # Returns (properties, incomplete) with a budget of its own, for the batch path
+        deadline = Deadline(cls.REQUEST_BUDGET)
+        properties = cls._fetch_physical_properties(cid, deadline, with_names=False)
+        return properties, bool(deadline.skipped)
+
     @classmethod
-    def _fetch_physical_properties(cls, cid: int) -> Dict[str, Any]:
+    def _fetch_physical_properties(cls, cid: int, deadline: Deadline, with_names: bool = True) -> Dict[str, Any]:
+        # with_names=False skips synonyms and description, which the batch path fetches per chunk
         properties = {}
-        
+
         try:
             # Get more detailed information from PubChem's Classification section
-            classifications_url = f"{cls.BASE_URL}/compound/cid/{cid}/classification/JSON"
-            
             logger.info(f"Requesting classification data for CID: {cid}")
-            response = requests.get(classifications_url, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if "Hierarchies" in data["Classification"]:
-                    for hierarchy in data["Classification"]["Hierarchies"]:
-                        if hierarchy.get("SourceName") == "Physical State" and hierarchy.get("Nodes"):
-                            state = hierarchy["Nodes"][0].get("Information", {}).get("Name", "")
-                            if state:
-                                properties["state_at_room_temp"] = state
-                        
-                        # Try to find hazard classification
-                        if hierarchy.get("SourceName") == "GHS Classification" and hierarchy.get("Nodes"):
-                            hazards = []
-                            hazard_statements = []
-                            precautionary_statements = []
-                            
-                            for node in hierarchy["Nodes"]:
-                                if node.get("Information", {}).get("Name"):
-                                    hazards.append(node["Information"]["Name"])
-                                    
-                                    # Look for detailed hazard statements
-                                    if "Description" in node.get("Information", {}):
-                                        if "H" in node["Information"]["Description"]:
-                                            hazard_statements.append(node["Information"]["Description"])
-                                        if "P" in node["Information"]["Description"]:
-                                            precautionary_statements.append(node["Information"]["Description"])
-                            
-                            if hazards:
-                                properties["hazard_classification"] = ", ".join(hazards)
-                            if hazard_statements:
-                                properties["hazard_statements"] = "; ".join(hazard_statements)
-                            if precautionary_statements:
-                                properties["precautionary_statements"] = "; ".join(precautionary_statements)
-            
-            # Get synonyms
-            synonyms_url = f"{cls.BASE_URL}/compound/cid/{cid}/synonyms/JSON"
-            logger.info(f"Requesting synonyms for CID: {cid}")
-            response = requests.get(synonyms_url, timeout=10)
-            
+            response = cls._get(cls._classification_url(cid), "classification", deadline)
             if response.status_code == 200:
-                data = response.json()
-                if "InformationList" in data and "Information" in data["InformationList"]:
-                    info = data["InformationList"]["Information"][0]
-                    if "Synonym" in info:
-                        # Get the first 10 synonyms to avoid extremely long lists
-                        synonyms = info["Synonym"][:10]
-                        properties["synonyms"] = "; ".join(synonyms)
-                        if synonyms:
-                            properties["common_name"] = synonyms[0]  # Use first synonym as common name
-            
-            # Try to get crystal structure and description information
-            description_url = f"{cls.BASE_URL}/compound/cid/{cid}/description/JSON"
-            logger.info(f"Requesting description for CID: {cid}")
-            response = requests.get(description_url, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if "InformationList" in data and "Information" in data["InformationList"]:
-                    for info in data["InformationList"]["Information"]:
-                        if "Description" in info:
-                            # Get the first description as the main description
-                            properties["description"] = info["Description"]
-                            break
-            
+                properties.update(cls._parse_classification(response.json()))
+
+            if with_names:
+                # Get synonyms
+                logger.info(f"Requesting synonyms for CID: {cid}")
+                response = cls._get(cls._synonyms_url(cid), "synonyms", deadline)
+                if response.status_code == 200:
+                    properties.update(cls._parse_synonyms(response.json()))
+
+                # Try to get crystal structure and description information
+                logger.info(f"Requesting description for CID: {cid}")
+                response = cls._get(cls._description_url(cid), "description", deadline)
+                if response.status_code == 200:
+                    properties.update(cls._parse_description(response.json()))
+
             # Get more detailed properties from PubChem's Sections
-            sections_url = f"{cls.BASE_URL}/compound/cid/{cid}/sections/JSON"
             logger.info(f"Requesting sections data for CID: {cid}")
-            response = requests.get(sections_url, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if "Sections" in data:
-                    # Look for the section with experimental properties
-                    section_ids = []
-                    for section in data["Sections"]:
-                        if "Experimental Properties" in section.get("TOCHeading", ""):
-                            section_ids.append(section.get("Section"))
-            
+            response = cls._get(cls._sections_url(cid), "sections", deadline)
+            section_ids = cls._parse_section_ids(response.json()) if response.status_code == 200 else []
+
             # If we found relevant sections, fetch them
-            if section_ids:
-                # Fetch the experimental properties section
-                for section_id in section_ids:
-                    section_url = f"{cls.BASE_URL}/compound/cid/{cid}/section/{section_id}/JSON"
-                    logger.info(f"Requesting section {section_id} for CID: {cid}")
-                    response = requests.get(section_url, timeout=10)
-                    
-                    if response.status_code == 200:
-                        section_data = response.json()
-                        if "Section" in section_data and section_data["Section"].get("Information"):
-                            for info in section_data["Section"]["Information"]:
-                                if info.get("Value") and info.get("Value").get("StringWithMarkup"):
-                                    name = info.get("Name", "").lower()
-                                    value = info["Value"]["StringWithMarkup"][0].get("String", "")
-                                    
-                                    if "boiling point" in name and not properties.get("boiling_point"):
-                                        properties["boiling_point"] = value
-                                    elif "melting point" in name and not properties.get("melting_point"):
-                                        properties["melting_point"] = value
-                                    elif "density" in name and not properties.get("density"):
-                                        properties["density"] = value
-                                    elif "flash point" in name and not properties.get("flash_point"):
-                                        properties["flash_point"] = value
-                                    elif "crystal" in name and not properties.get("crystal_structure"):
-                                        properties["crystal_structure"] = value
-                
+            for section_id in section_ids:
+                logger.info(f"Requesting section {section_id} for CID: {cid}")
+                response = cls._get(cls._section_url(cid, section_id), "section", deadline)
+                if response.status_code == 200:
+                    cls._merge_section(properties, response.json())
+
         except Exception as e:
             logger.error(f"Error fetching physical properties for CID {cid}: {str(e)}")
-        
-        return properties
\ No newline at end of file
+            deadline.skipped.append("physical_properties")
+
+        return properties
+
+
+    # URL builders and response parsers, shared with AsyncPubChemService
+
+    @classmethod
+    def _cid_url(cls, formula: str) -> str:
+        return f"{cls.BASE_URL}/compound/name/{formula}/cids/JSON"
+
+    @classmethod
+    def _formula_cid_url(cls, formula: str) -> str:
+        return f"{cls.BASE_URL}/compound/fastformula/{canonical_formula(formula)}/cids/JSON"
+
+    @classmethod
+    def _properties_url(cls, cid: int) -> str:
+        return f"{cls.BASE_URL}/compound/cid/{cid}/property/{cls.PROPERTY_LIST}/JSON"
+
+    @classmethod
+    def _classification_url(cls, cid: int) -> str:
+        return f"{cls.BASE_URL}/compound/cid/{cid}/classification/JSON"
+
+    @classmethod
+    def _synonyms_url(cls, cid: int) -> str:
+        return f"{cls.BASE_URL}/compound/cid/{cid}/synonyms/JSON"
+
+    @classmethod
+    def _description_url(cls, cid: int) -> str:
+        return f"{cls.BASE_URL}/compound/cid/{cid}/description/JSON"
+
+    @classmethod
+    def _sections_url(cls, cid: int) -> str:
+        return f"{cls.BASE_URL}/compound/cid/{cid}/sections/JSON"
+
+    @classmethod
+    def _section_url(cls, cid: int, section_id: str) -> str:
+        return f"{cls.BASE_URL}/compound/cid/{cid}/section/{section_id}/JSON"
+
+    @staticmethod
+    def _is_molecular_formula(formula: str) -> bool:
+        # Written in Hill order, so it stands for a composition rather than one structure
+        try:
+            return hill_formula(parse_formula(formula)) == "".join(formula.split())
+        except ValueError:
+            return False
+
+    @staticmethod
+    def _add_compound_urls(cid: int, properties: Dict[str, Any]) -> Dict[str, Any]:
+        properties["cid"] = cid
+        properties["structure_image_url"] = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/PNG"
+        properties["structure_image_svg_url"] = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/SVG"
+        properties["compound_url"] = f"https://pubchem.ncbi.nlm.nih.gov/compound/{cid}"
+        return properties
+
+    @classmethod
+    def _properties_from_store(cls, compound: StoredCompound) -> Dict[str, Any]:
+        # Same fields as a live lookup, minus the classification and experimental
+        # sections (state, hazards, melting point...) that the bulk extracts don't carry
+        properties = cls._parse_properties(compound.cid, {"PropertyTable": {"Properties": [{
+            "MolecularFormula": compound.formula or "",
+            "MolecularWeight": compound.molar_mass or 0,
+            "IUPACName": compound.iupac_name or "",
+            "CanonicalSMILES": compound.smiles or "",
+        }]}})
+        properties.update(cls._parse_synonyms({"InformationList": {"Information": [{"Synonym": compound.synonyms}]}}))
+        if compound.title and not compound.synonyms:
+            properties["common_name"] = compound.title
+        return cls._add_compound_urls(compound.cid, properties)
+
+    @staticmethod
+    def _split_information(data: dict) -> Dict[int, List[dict]]:
+        # A multi-CID InformationList interleaves the entries of every compound
+        by_cid = defaultdict(list)
+        for info in data.get("InformationList", {}).get("Information", []):
+            if "CID" in info:
+                by_cid[info["CID"]].append(info)
+        return by_cid
+
+    @staticmethod
+    def _parse_cid(data: dict) -> Optional[int]:
+        if "IdentifierList" not in data or "CID" not in data["IdentifierList"] or not data["IdentifierList"]["CID"]:
+            return None
+        return data["IdentifierList"]["CID"][0]
+
+    @staticmethod
+    def _parse_properties(cid: int, data: dict) -> Dict[str, Any]:
+        if "PropertyTable" not in data or "Properties" not in data["PropertyTable"] or not data["PropertyTable"]["Properties"]:
+            return {}
+
+        prop_data = data["PropertyTable"]["Properties"][0]
+        return {
+            "formula": prop_data.get("MolecularFormula", ""),
+            "molar_mass": float(prop_data.get("MolecularWeight", 0)),
+            "iupac_name": prop_data.get("IUPACName", ""),
+            "smiles": prop_data.get("CanonicalSMILES", ""),
+            "structure_3d_url": f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/record/3d/JSON",
+        }
+
+    @staticmethod
+    def _parse_classification(data: dict) -> Dict[str, Any]:
+        properties = {}
+        if "Hierarchies" not in data.get("Classification", {}):
+            return properties
+
+        for hierarchy in data["Classification"]["Hierarchies"]:
+            if hierarchy.get("SourceName") == "Physical State" and hierarchy.get("Nodes"):
+                state = hierarchy["Nodes"][0].get("Information", {}).get("Name", "")
+                if state:
+                    properties["state_at_room_temp"] = state
+
+            # Try to find hazard classification
+            if hierarchy.get("SourceName") == "GHS Classification" and hierarchy.get("Nodes"):
+                hazards = []
+                hazard_statements = []
+                precautionary_statements = []
+
+                for node in hierarchy["Nodes"]:
+                    if node.get("Information", {}).get("Name"):
+                        hazards.append(node["Information"]["Name"])
+
+                        # Look for detailed hazard statements
+                        if "Description" in node.get("Information", {}):
+                            if "H" in node["Information"]["Description"]:
+                                hazard_statements.append(node["Information"]["Description"])
+                            if "P" in node["Information"]["Description"]:
+                                precautionary_statements.append(node["Information"]["Description"])
+
+                if hazards:
+                    properties["hazard_classification"] = ", ".join(hazards)
+                if hazard_statements:
+                    properties["hazard_statements"] = "; ".join(hazard_statements)
+                if precautionary_statements:
+                    properties["precautionary_statements"] = "; ".join(precautionary_statements)
+        return properties
+
+    @staticmethod
+    def _parse_synonyms(data: dict) -> Dict[str, Any]:
+        properties = {}
+        if "InformationList" in data and "Information" in data["InformationList"]:
+            info = data["InformationList"]["Information"][0]
+            if "Synonym" in info:
+                # Get the first 10 synonyms to avoid extremely long lists
+                synonyms = info["Synonym"][:10]
+                properties["synonyms"] = "; ".join(synonyms)
+                if synonyms:
+                    properties["common_name"] = synonyms[0]  # Use first synonym as common name
+        return properties
+
+    @staticmethod
+    def _parse_description(data: dict) -> Dict[str, Any]:
+        if "InformationList" in data and "Information" in data["InformationList"]:
+            for info in data["InformationList"]["Information"]:
+                if "Description" in info:
+                    # Get the first description as the main description
+                    return {"description": info["Description"]}
+        return {}
+
+    @staticmethod
+    def _parse_section_ids(data: dict) -> List[str]:
+        # Look for the section with experimental properties
+        section_ids = []
+        for section in data.get("Sections", []):
+            if "Experimental Properties" in section.get("TOCHeading", ""):
+                section_ids.append(section.get("Section"))
+        return section_ids
+
+    @staticmethod
+    def _merge_section(properties: Dict[str, Any], section_data: dict) -> None:
+        if "Section" not in section_data or not section_data["Section"].get("Information"):
+            return
+
+        for info in section_data["Section"]["Information"]:
+            if info.get("Value") and info.get("Value").get("StringWithMarkup"):
+                name = info.get("Name", "").lower()
+                value = info["Value"]["StringWithMarkup"][0].get("String", "")
+
+                if "boiling point" in name and not properties.get("boiling_point"):
+                    properties["boiling_point"] = value
+                elif "melting point" in name and not properties.get("melting_point"):
+                    properties["melting_point"] = value
+                elif "density" in name and not properties.get("density"):
+                    properties["density"] = value
+                elif "flash point" in name and not properties.get("flash_point"):
+                    properties["flash_point"] = value
+                elif "crystal" in name and not properties.get("crystal_structure"):
+                    properties["crystal_structure"] = value
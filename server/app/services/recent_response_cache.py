@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class RecentResponseCache:
+    """
+    In-process cache of serialized /recent responses, one per view. An entry is
+    served without touching the database while no history write has happened in
+    this process (FormulaHistoryService.generation) and it is younger than
+    TTL_SECONDS. After that the caller revalidates it against the current ETag,
+    which also picks up writes made by other workers.
+    """
+
+    ENABLED = os.getenv("RECENT_RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    TTL_SECONDS = float(os.getenv("RECENT_RESPONSE_CACHE_TTL", 2.0))
+
+    _lock = threading.Lock()
+    _entries: Dict[str, list] = {}  # view -> [generation, checked_at, etag, body]
+    _stats = {"hits": 0, "revalidated": 0, "misses": 0}
+
+    # Returns (etag, body) when the entry can be served as is, otherwise None.
+    @classmethod
+    def get(cls, view: str, generation: int) -> Optional[Tuple[str, bytes]]:
+        if not cls.ENABLED:
+            return None
+        with cls._lock:
+            entry = cls._entries.get(view)
+            if entry and entry[0] == generation and time.monotonic() - entry[1] < cls.TTL_SECONDS:
+                cls._stats["hits"] += 1
+                return entry[2], entry[3]
+        return None
+
+    # Returns the cached body if it still has the given ETag, restarting its TTL.
+    @classmethod
+    def revalidate(cls, view: str, generation: int, etag: str) -> Optional[bytes]:
+        if not cls.ENABLED:
+            return None
+        with cls._lock:
+            entry = cls._entries.get(view)
+            if entry and entry[2] == etag:
+                entry[0], entry[1] = generation, time.monotonic()
+                cls._stats["revalidated"] += 1
+                return entry[3]
+            cls._stats["misses"] += 1
+        return None
+
+    @classmethod
+    def put(cls, view: str, generation: int, etag: str, body: bytes) -> None:
+        if not cls.ENABLED:
+            return
+        with cls._lock:
+            cls._entries[view] = [generation, time.monotonic(), etag, body]
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._lock:
+            stats = dict(cls._stats)
+            stats["entries"] = len(cls._entries)
+        stats["enabled"] = cls.ENABLED
+        stats["ttl_seconds"] = cls.TTL_SECONDS
+        return stats
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._entries.clear()
@@ -0,0 +1,389 @@
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from app.config.database_config import SessionLocal
+from app.models.FormulaHistoryModel import FormulaHistory
+from app.services.compound_service import PRIVATE_KEY_PREFIX, CompoundService
+from app.services.formula_history_service import FormulaHistoryService
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+HISTORY_COLUMNS = list(FormulaHistory.__table__.columns)
+
+# Monthly partitions of a declaratively partitioned `formulas` table on PostgreSQL
+PARTITION_NAME = re.compile(r"^formulas_y(\d{4})m(\d{2})$")
+
+
+def _zstandard():
+    # zstandard is optional; without it archives are gzip
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+class ArchiveWriter:
+    """
+    Compressed JSON Lines, one history row per line, one file per calendar month of the
+    rows. sync() makes everything written so far durable: the compressor is flushed to
+    a block boundary and the file fsynced, so rows are only deleted once they are on disk.
+    """
+
+    def __init__(self, directory: str, compression: str, run_stamp: str):
+        self.directory = directory
+        self.compression = compression
+        self.run_stamp = run_stamp
+        self.paths: List[str] = []
+        self.bytes_written = 0
+        self._files: Dict[str, tuple] = {}  # month -> (raw file, compressed stream)
+
+    def write(self, rows: List[dict]) -> None:
+        for row in rows:
+            month = row["timestamp"][:7] if row["timestamp"] else "undated"
+            _, stream = self._files.get(month) or self._open(month)
+            stream.write(json.dumps(row, separators=(",", ":")).encode() + b"\n")
+
+    def sync(self) -> None:
+        for raw, stream in self._files.values():
+            if self.compression == "zstd":
+                stream.flush(_zstandard().FLUSH_BLOCK)
+            else:
+                stream.flush()  # Z_SYNC_FLUSH
+            raw.flush()
+            os.fsync(raw.fileno())
+
+    def close(self) -> None:
+        for raw, stream in self._files.values():
+            stream.close()  # writes the frame end / gzip trailer
+            raw.flush()
+            os.fsync(raw.fileno())
+            self.bytes_written += raw.tell()
+            raw.close()
+        self._files = {}
+
+    def _open(self, month: str) -> tuple:
+        extension = {"zstd": "zst", "gzip": "gz"}[self.compression]
+        path = os.path.join(self.directory, f"formulas-{month}-{self.run_stamp}.jsonl.{extension}")
+        raw = open(path, "xb")  # a run never appends to another run's file
+        if self.compression == "zstd":
+            stream = _zstandard().ZstdCompressor(level=RetentionService.ZSTD_LEVEL).stream_writer(raw, closefd=False)
+        else:
+            stream = gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0)
+        self._files[month] = (raw, stream)
+        self.paths.append(path)
+        return self._files[month]
+
+
+class RetentionService:
+    """
+    Keeps the history table to the last RETENTION_DAYS days. Older rows are streamed
+    to compressed archive files in chunks of CHUNK_SIZE and each chunk is deleted once
+    its archive is synced to disk, so a crash can repeat rows in the archives but never
+    lose one. Deletes are range-chunked on the primary key, so each transaction stays
+    small and the hot table (and its indexes) stops growing once the window is full.
+
+    On PostgreSQL, when `formulas` is declaratively partitioned by month on timestamp
+    (partitions named formulas_yYYYYmMM), upcoming partitions are created and expired
+    ones are archived and dropped whole instead. Converting an existing table is a
+    one-off migration left to the DBA: partitioning rewrites the table and needs a
+    primary key that includes timestamp. MySQL does not allow partitioning a table
+    with foreign keys, so it, like SQLite, always uses the chunked deletes.
+
+    A row's private compound (the copy its PubChem fields were edited on) is deleted
+    with the row, and its fields are archived with it under "compound". Rows linked to
+    a shared compound are archived with just its compound_id; shared compounds stay.
+    The usage rollups are not touched: they count requests made, not rows kept.
+    """
+
+    ENABLED = os.getenv("HISTORY_RETENTION_ENABLED", "false").lower() == "true"
+    RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", 365))
+    INTERVAL = float(os.getenv("HISTORY_RETENTION_INTERVAL", 3600))
+    CHUNK_SIZE = int(os.getenv("HISTORY_RETENTION_CHUNK_SIZE", 5000))
+    ARCHIVE_DIR = os.getenv("HISTORY_ARCHIVE_DIR", "archive")
+    # "zstd", "gzip", or "none" to delete without archiving; zstd when it is installed
+    ARCHIVE_FORMAT = os.getenv("HISTORY_ARCHIVE_FORMAT", "").lower() or ("zstd" if _zstandard() else "gzip")
+    ZSTD_LEVEL = int(os.getenv("HISTORY_ARCHIVE_ZSTD_LEVEL", 10))
+
+    _worker = None
+    _stop_event = threading.Event()
+    _run_lock = threading.Lock()
+    _stats_lock = threading.Lock()
+    _stats = {
+        "runs": 0, "failed_runs": 0, "skipped_runs": 0, "rows_archived": 0, "rows_deleted": 0,
+        "partitions_dropped": 0, "archive_bytes": 0, "last_run_seconds": 0.0, "last_run_at": None,
+    }
+
+    @classmethod
+    def start(cls) -> None:
+        if not cls.ENABLED or cls._worker is not None:
+            return
+        cls._stop_event.clear()
+        cls._worker = threading.Thread(target=cls._run_worker, name="history-retention", daemon=True)
+        cls._worker.start()
+
+    @classmethod
+    def stop(cls) -> None:
+        worker, cls._worker = cls._worker, None
+        cls._stop_event.set()  # a pass in progress stops after its current chunk
+        if worker is not None:
+            worker.join()
+
+    @classmethod
+    def run(cls, days: Optional[int] = None, chunk_size: Optional[int] = None) -> dict:
+        """
+        One retention pass: archives and deletes every row older than `days` days.
+        Returns what it did; `skipped` is set when another pass (in this process, or
+        in another process sharing the archive directory) is already running.
+        """
+        days = cls.RETENTION_DAYS if days is None else days
+        chunk_size = chunk_size or cls.CHUNK_SIZE
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+        result = {"cutoff": cutoff.isoformat(), "rows_archived": 0, "rows_deleted": 0, "partitions_dropped": 0, "archives": [], "skipped": False}
+
+        if not cls._run_lock.acquire(blocking=False):
+            return cls._skipped(result)
+        try:
+            archive = None
+            if cls.ARCHIVE_FORMAT != "none":
+                os.makedirs(cls.ARCHIVE_DIR, exist_ok=True)
+            with cls._process_lock() as acquired:
+                if not acquired:
+                    return cls._skipped(result)
+
+                start = time.perf_counter()
+                if cls.ARCHIVE_FORMAT != "none":
+                    run_stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+                    archive = ArchiveWriter(cls.ARCHIVE_DIR, cls.ARCHIVE_FORMAT, run_stamp)
+                db = SessionLocal()
+                try:
+                    if cls._partitioned(db):
+                        cls._ensure_partitions(db)
+                        cls._drop_partitions(db, cutoff, chunk_size, archive, result)
+                    cls._delete_chunks(db, cutoff, chunk_size, archive, result)
+                except Exception:
+                    db.rollback()
+                    with cls._stats_lock:
+                        cls._stats["failed_runs"] += 1
+                    raise
+                finally:
+                    db.close()
+                    if archive is not None:
+                        archive.close()
+                        result["archives"] = archive.paths
+
+                if result["rows_deleted"]:
+                    FormulaHistoryService._bump_generation()
+                with cls._stats_lock:
+                    cls._stats["runs"] += 1
+                    cls._stats["rows_archived"] += result["rows_archived"]
+                    cls._stats["rows_deleted"] += result["rows_deleted"]
+                    cls._stats["partitions_dropped"] += result["partitions_dropped"]
+                    cls._stats["archive_bytes"] += archive.bytes_written if archive else 0
+                    cls._stats["last_run_seconds"] = round(time.perf_counter() - start, 3)
+                    cls._stats["last_run_at"] = datetime.now(timezone.utc).isoformat()
+                return result
+        finally:
+            cls._run_lock.release()
+
+    @classmethod
+    def count_expired(cls, db: Session, days: Optional[int] = None) -> int:
+        days = cls.RETENTION_DAYS if days is None else days
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+        return db.query(func.count(FormulaHistory.id)).filter(
+            FormulaHistory.timestamp < FormulaHistoryService._timestamp_param(db, cutoff)
+        ).scalar()
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._stats_lock:
+            stats = dict(cls._stats)
+        stats["enabled"] = cls.ENABLED
+        stats["days"] = cls.RETENTION_DAYS
+        stats["archive_format"] = cls.ARCHIVE_FORMAT
+        return stats
+
+
+    @classmethod
+    def _run_worker(cls) -> None:
+        # First pass right after startup, then one every INTERVAL seconds
+        while not cls._stop_event.is_set():
+            try:
+                result = cls.run()
+                if result["rows_deleted"] or result["partitions_dropped"]:
+                    logger.info(
+                        f"History retention: {result['rows_deleted']} rows deleted, "
+                        f"{result['partitions_dropped']} partitions dropped, archived to {result['archives']}"
+                    )
+            except Exception as e:
+                logger.error(f"History retention pass failed: {str(e)}")
+            cls._stop_event.wait(cls.INTERVAL)
+
+    @classmethod
+    def _delete_chunks(cls, db: Session, cutoff: datetime, chunk_size: int, archive: Optional[ArchiveWriter], result: dict) -> None:
+        """
+        Expired rows in id order, a chunk at a time. The chunk is every expired row in
+        [first id, last id], so the DELETE is that id range plus the cutoff: one
+        primary-key range per transaction, with the ids kept out of the statement.
+        """
+        expired = FormulaHistory.timestamp < FormulaHistoryService._timestamp_param(db, cutoff)
+        last_id = 0
+        while not cls._stop_event.is_set():
+            rows = db.execute(
+                select(*HISTORY_COLUMNS).where(FormulaHistory.id > last_id, expired).order_by(FormulaHistory.id).limit(chunk_size)
+            ).mappings().all()
+            if not rows:
+                break
+            first_id, last_id = rows[0]["id"], rows[-1]["id"]
+            ids = [row["id"] for row in rows]
+
+            if archive is not None:
+                private = CompoundService.private_payloads(db, ids)
+                archive.write([cls._archive_row(row, private.get(row["id"])) for row in rows])
+                archive.sync()
+                result["rows_archived"] += len(rows)
+
+            deleted = (
+                db.query(FormulaHistory)
+                .filter(FormulaHistory.id >= first_id, FormulaHistory.id <= last_id, expired)
+                .delete(synchronize_session=False)
+            )
+            CompoundService.delete_private(db, ids)
+            db.commit()
+            result["rows_deleted"] += deleted
+
+    @staticmethod
+    def _partitioned(db: Session) -> bool:
+        if db.get_bind().dialect.name != "postgresql":
+            return False
+        return db.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('formulas')")).scalar() == "p"
+
+    @staticmethod
+    def _ensure_partitions(db: Session) -> None:
+        # This month's and next month's, so inserts never land in the default partition
+        month = _month_start(datetime.now(timezone.utc).date())
+        for _ in range(2):
+            end = _next_month(month)
+            name = f"formulas_y{month.year}m{month.month:02d}"
+            try:
+                db.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF formulas "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+                ))
+                db.commit()
+            except Exception as e:
+                # e.g. the default partition already holds rows for that month
+                db.rollback()
+                logger.warning(f"Could not create history partition {name}: {str(e)}")
+            month = end
+
+    @classmethod
+    def _drop_partitions(cls, db: Session, cutoff: datetime, chunk_size: int, archive: Optional[ArchiveWriter], result: dict) -> None:
+        partitions = db.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'formulas'::regclass ORDER BY c.relname"
+        )).scalars().all()
+
+        for name in partitions:
+            match = PARTITION_NAME.match(name)
+            if not match or cls._stop_event.is_set():
+                continue
+            end = _next_month(date(int(match.group(1)), int(match.group(2)), 1))
+            if datetime(end.year, end.month, end.day) > cutoff:
+                continue
+
+            # The whole month is expired: archive it, then drop it in one statement
+            last_id = 0
+            while archive is not None:
+                rows = db.execute(
+                    text(f"SELECT * FROM {name} WHERE id > :last_id ORDER BY id LIMIT :chunk_size"),
+                    {"last_id": last_id, "chunk_size": chunk_size},
+                ).mappings().all()
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+                private = CompoundService.private_payloads(db, [row["id"] for row in rows])
+                archive.write([cls._archive_row(row, private.get(row["id"])) for row in rows])
+                result["rows_archived"] += len(rows)
+            if archive is not None:
+                archive.sync()
+
+            count = db.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+            db.execute(text(f"ALTER TABLE formulas DETACH PARTITION {name}"))
+            db.execute(text(f"DROP TABLE {name}"))
+            # The private copies of the dropped rows, in the same transaction as the drop
+            db.execute(text(
+                "DELETE FROM compounds WHERE formula_key LIKE :private AND NOT EXISTS "
+                "(SELECT 1 FROM formulas WHERE formulas.id = CAST(substr(compounds.formula_key, :offset) AS integer))"
+            ), {"private": PRIVATE_KEY_PREFIX + "%", "offset": len(PRIVATE_KEY_PREFIX) + 1})
+            db.commit()
+            result["rows_deleted"] += count
+            result["partitions_dropped"] += 1
+
+    @staticmethod
+    def _archive_row(row, compound: Optional[dict] = None) -> dict:
+        archived = {column.name: row[column.name] for column in HISTORY_COLUMNS}
+        if isinstance(archived["timestamp"], datetime):
+            archived["timestamp"] = archived["timestamp"].isoformat(sep=" ")
+        if compound is not None:
+            archived["compound"] = compound
+        return archived
+
+    @classmethod
+    def _skipped(cls, result: dict) -> dict:
+        with cls._stats_lock:
+            cls._stats["skipped_runs"] += 1
+        result["skipped"] = True
+        return result
+
+    @classmethod
+    def _process_lock(cls):
+        # An flock on the archive directory: with several workers, one pass runs at a time
+        return _FileLock(os.path.join(cls.ARCHIVE_DIR, ".retention.lock") if cls.ARCHIVE_FORMAT != "none" and fcntl else None)
+
+
+class _FileLock:
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.file = None
+
+    def __enter__(self) -> bool:
+        if self.path is None:
+            return True
+        self.file = open(self.path, "a")
+        try:
+            fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.file.close()
+            self.file = None
+            return False
+        return True
+
+    def __exit__(self, *exc) -> None:
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
@@ -0,0 +1,161 @@
+import logging
+import re
+from typing import List, Optional
+
+from sqlalchemy import and_, func, inspect, or_, text
+from sqlalchemy.orm import Session
+
+from app.config.database_config import get_engine, get_search_backend
+from app.models.CompoundModel import Compound
+from app.models.FormulaHistoryModel import FormulaHistory
+from app.services.compound_service import CompoundService
+
+
+logger = logging.getLogger(__name__)
+
+SEARCH_COLUMNS = ("formula_key", "common_name", "iupac_name", "synonyms")
+
+# The document Postgres indexes; queries must repeat this expression exactly to use the index
+TSVECTOR_DOCUMENT = "to_tsvector('simple', " + " || ' ' || ".join(
+    f"coalesce({column}, '')" for column in SEARCH_COLUMNS
+) + ")"
+
+SQLITE_FTS_SCHEMA = [
+    # External-content FTS5 table: the index only, the text stays in `compounds`
+    f"CREATE VIRTUAL TABLE compounds_fts USING fts5({', '.join(SEARCH_COLUMNS)}, content='compounds', content_rowid='id')",
+    f"""CREATE TRIGGER IF NOT EXISTS compounds_fts_insert AFTER INSERT ON compounds BEGIN
+        INSERT INTO compounds_fts (rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + column for column in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS compounds_fts_delete AFTER DELETE ON compounds BEGIN
+        INSERT INTO compounds_fts (compounds_fts, rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + column for column in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS compounds_fts_update AFTER UPDATE OF {', '.join(SEARCH_COLUMNS)} ON compounds BEGIN
+        INSERT INTO compounds_fts (compounds_fts, rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + column for column in SEARCH_COLUMNS)});
+        INSERT INTO compounds_fts (rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + column for column in SEARCH_COLUMNS)});
+    END""",
+    # Index the compounds that existed before the table did
+    "INSERT INTO compounds_fts (compounds_fts) VALUES ('rebuild')",
+]
+
+MAX_TERMS = 8
+
+
+class CompoundSearch:
+    """
+    Full-text search over compound formulas, names and synonyms, answered from the
+    database's own text index: an FTS5 table kept in sync by triggers on SQLite, a
+    FULLTEXT index on MySQL, a GIN tsvector expression index on PostgreSQL. Every
+    word of the query is matched as a prefix. Results are the newest history entry
+    of each matching compound, best match first.
+    """
+
+    _backend: Optional[str] = None
+
+    @classmethod
+    def create_index(cls, engine) -> None:
+        # Called from the schema check; creates the index the dialect supports, once
+        backend = get_search_backend(engine)
+        inspector = inspect(engine)
+        try:
+            if backend == "fts5" and "compounds_fts" not in inspector.get_table_names():
+                with engine.begin() as conn:
+                    for statement in SQLITE_FTS_SCHEMA:
+                        conn.execute(text(statement))
+                print("Created full-text index compounds_fts")
+            elif backend == "fulltext" and "ft_compounds_search" not in {i["name"] for i in inspector.get_indexes("compounds")}:
+                with engine.begin() as conn:
+                    conn.execute(text(f"CREATE FULLTEXT INDEX ft_compounds_search ON compounds ({', '.join(SEARCH_COLUMNS)})"))
+                print("Created full-text index ft_compounds_search")
+            elif backend == "tsvector":
+                with engine.begin() as conn:
+                    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_compounds_search ON compounds USING GIN ({TSVECTOR_DOCUMENT})"))
+        except Exception as e:
+            # e.g. SQLite built without FTS5: search still works, by scanning
+            print(f"Could not create the full-text index, search falls back to LIKE: {str(e)}")
+            backend = "like"
+        cls._backend = backend
+
+    @classmethod
+    def backend(cls) -> str:
+        if cls._backend is None:
+            # Schema check skipped: use the index if a deploy step created it
+            backend = get_search_backend(get_engine())
+            if backend == "fts5" and "compounds_fts" not in inspect(get_engine()).get_table_names():
+                backend = "like"
+            cls._backend = backend
+        return cls._backend
+
+    @classmethod
+    def search(cls, db: Session, query: str, limit: int = 10) -> List[FormulaHistory]:
+        terms = re.findall(r"\w+", query)[:MAX_TERMS]
+        if not terms:
+            return []
+
+        compound_ids = cls._exact_formula_match(db, query) + cls._match_compounds(db, terms, limit)
+        compound_ids = list(dict.fromkeys(compound_ids))[:limit]
+
+        # Newest entry per compound, through the compound_id index
+        latest = dict(
+            db.query(FormulaHistory.compound_id, func.max(FormulaHistory.id))
+            .filter(FormulaHistory.compound_id.in_(compound_ids))
+            .group_by(FormulaHistory.compound_id)
+            .all()
+        ) if compound_ids else {}
+        entry_ids = [latest[compound_id] for compound_id in compound_ids if compound_id in latest]
+
+        # Formulas without PubChem data have no compound; an exact spelling still finds them
+        if len(entry_ids) < limit:
+            plain = db.query(func.max(FormulaHistory.id)).filter(
+                FormulaHistory.formula == query.strip(), FormulaHistory.compound_id.is_(None)
+            ).scalar()
+            if plain is not None:
+                entry_ids.append(plain)
+
+        if not entry_ids:
+            return []
+        entries = {entry.id: entry for entry in db.query(FormulaHistory).filter(FormulaHistory.id.in_(entry_ids)).all()}
+        return [entries[entry_id] for entry_id in entry_ids if entry_id in entries]
+
+
+    @staticmethod
+    def _exact_formula_match(db: Session, query: str) -> List[int]:
+        # The spelling itself first, then every compound with its Hill formula ("NaCl" finds
+        # one stored as "ClNa", "C2H6O" both ethanol and dimethyl ether), which no text index would match
+        key = CompoundService.compound_key(query)
+        hill = CompoundService.hill_key(query)
+        condition = Compound.formula_key == key
+        if hill is not None:
+            condition = or_(condition, Compound.hill_formula == hill)
+        rows = db.query(Compound.id).filter(condition).order_by(Compound.formula_key != key, Compound.id).all()
+        return [compound_id for (compound_id,) in rows]
+
+    @classmethod
+    def _match_compounds(cls, db: Session, terms: List[str], limit: int) -> List[int]:
+        backend = cls.backend()
+        if backend == "fts5":
+            match = " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+            statement = text("SELECT rowid FROM compounds_fts WHERE compounds_fts MATCH :query ORDER BY rank LIMIT :limit")
+        elif backend == "fulltext":
+            match = " ".join(f"+{term}*" for term in terms)
+            columns = ", ".join(SEARCH_COLUMNS)
+            statement = text(
+                f"SELECT id FROM compounds WHERE MATCH ({columns}) AGAINST (:query IN BOOLEAN MODE) "
+                f"ORDER BY MATCH ({columns}) AGAINST (:query IN BOOLEAN MODE) DESC LIMIT :limit"
+            )
+        elif backend == "tsvector":
+            match = " & ".join(f"{term}:*" for term in terms)
+            statement = text(
+                f"SELECT id FROM compounds WHERE {TSVECTOR_DOCUMENT} @@ to_tsquery('simple', :query) "
+                f"ORDER BY ts_rank({TSVECTOR_DOCUMENT}, to_tsquery('simple', :query)) DESC LIMIT :limit"
+            )
+        else:
+            # No text index: every word must appear in some column, found by a table scan
+            columns = [getattr(Compound, column) for column in SEARCH_COLUMNS]
+            condition = and_(*(or_(*(column.icontains(term, autoescape=True) for column in columns)) for term in terms))
+            return [compound_id for (compound_id,) in db.query(Compound.id).filter(condition).order_by(Compound.id).limit(limit).all()]
+
+        return [compound_id for (compound_id,) in db.execute(statement, {"query": match, "limit": limit}).all()]
@@ -0,0 +1,181 @@
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.FormulaHistoryModel import FormulaHistory
+from app.models.UsageStatsModel import DailyClient, FormulaUsage, UsageBucket
+from app.services.compound_service import CompoundService
+
+
+# (formula, user_ip, timestamp) for one history row; a None timestamp means now
+UsageEntry = Tuple[str, Optional[str], Optional[datetime]]
+
+
+class UsageStatsService:
+    """
+    Usage analytics kept as rollups: requests per formula, requests per hour and
+    per day, and the client IPs seen each day. The history writers call record()
+    inside the transaction that inserts the rows, so a rollup never counts a row
+    that was rolled back. A batch of rows is aggregated first and costs one upsert
+    per distinct formula, bucket and client, not one per row.
+
+    Buckets are UTC. rebuild() reads the stored history timestamps, which are UTC on
+    SQLite; elsewhere the database server should run in UTC for the two to agree.
+    Deleting a history entry does not uncount it: the rollups count requests made.
+    """
+
+    ENABLED = os.getenv("USAGE_STATS_ENABLED", "true").lower() == "true"
+    REBUILD_CHUNK_SIZE = int(os.getenv("USAGE_STATS_REBUILD_CHUNK_SIZE", 5000))
+    GRANULARITIES = ("hour", "day")
+
+    @classmethod
+    def record(cls, db: Session, entries: Iterable[UsageEntry]) -> None:
+        # Adds to the rollups without committing; the caller's commit covers both
+        if not cls.ENABLED:
+            return
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        formulas: Dict[str, list] = {}  # key -> [spelling, requests, last seen]
+        buckets: Dict[Tuple[str, datetime], int] = {}
+        clients = set()
+
+        for formula, user_ip, timestamp in entries:
+            timestamp = timestamp or now
+            usage = formulas.setdefault(cls._formula_key(formula), [formula, 0, timestamp])
+            usage[1] += 1
+            usage[2] = max(usage[2], timestamp)
+
+            hour = timestamp.replace(minute=0, second=0, microsecond=0)
+            for bucket in (("hour", hour), ("day", hour.replace(hour=0))):
+                buckets[bucket] = buckets.get(bucket, 0) + 1
+            if user_ip:
+                clients.add((timestamp.date(), user_ip))
+
+        if not formulas:
+            return
+
+        # Sorted, so concurrent writers take the row locks in the same order
+        cls._upsert(db, FormulaUsage, ["formula_key"], [
+            {"formula_key": key, "formula": spelling, "requests": requests, "last_seen": last_seen}
+            for key, (spelling, requests, last_seen) in sorted(formulas.items())
+        ], replace=("last_seen",))
+        cls._upsert(db, UsageBucket, ["granularity", "bucket_start"], [
+            {"granularity": granularity, "bucket_start": start, "requests": requests}
+            for (granularity, start), requests in sorted(buckets.items())
+        ])
+        if clients:
+            db.execute(cls._insert_ignore(db, DailyClient, ["day", "user_ip"]), [
+                {"day": day, "user_ip": user_ip} for day, user_ip in sorted(clients)
+            ])
+
+    @classmethod
+    def rebuild(cls, db: Session, chunk_size: Optional[int] = None) -> dict:
+        """
+        Recomputes the rollups from the history, in keyset-paginated chunks. The
+        rollups are emptied first and only rows up to the highest id at that moment
+        are read, so rows written meanwhile (counted by record()) aren't counted twice.
+        """
+        chunk_size = chunk_size or cls.REBUILD_CHUNK_SIZE
+        for model in (FormulaUsage, UsageBucket, DailyClient):
+            db.query(model).delete(synchronize_session=False)
+        db.commit()
+
+        max_id = db.query(func.max(FormulaHistory.id)).scalar() or 0
+        last_id, rows_read = 0, 0
+        while last_id < max_id:
+            rows = (
+                db.query(FormulaHistory.id, FormulaHistory.formula, FormulaHistory.user_ip, FormulaHistory.timestamp)
+                .filter(FormulaHistory.id > last_id, FormulaHistory.id <= max_id)
+                .order_by(FormulaHistory.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+            cls.record(db, [(row.formula, row.user_ip, row.timestamp) for row in rows if row.formula])
+            db.commit()
+            rows_read += len(rows)
+
+        return {
+            "history_rows": rows_read,
+            "formulas": db.query(func.count()).select_from(FormulaUsage).scalar(),
+            "buckets": db.query(func.count()).select_from(UsageBucket).scalar(),
+            "daily_clients": db.query(func.count()).select_from(DailyClient).scalar(),
+        }
+
+    @staticmethod
+    def top_formulas(db: Session, limit: int = 10) -> List[FormulaUsage]:
+        return db.query(FormulaUsage).order_by(FormulaUsage.requests.desc(), FormulaUsage.formula_key).limit(limit).all()
+
+    @staticmethod
+    def request_counts(db: Session, granularity: str, start: datetime, end: datetime) -> List[UsageBucket]:
+        # A range of the (granularity, bucket_start) primary key
+        return (
+            db.query(UsageBucket)
+            .filter(UsageBucket.granularity == granularity, UsageBucket.bucket_start >= start, UsageBucket.bucket_start <= end)
+            .order_by(UsageBucket.bucket_start)
+            .all()
+        )
+
+    @staticmethod
+    def client_counts(db: Session, start: date, end: date) -> Tuple[List[Tuple[date, int]], int]:
+        # Unique clients per day, plus unique clients over the whole range
+        in_range = (DailyClient.day >= start, DailyClient.day <= end)
+        per_day = (
+            db.query(DailyClient.day, func.count())
+            .filter(*in_range)
+            .group_by(DailyClient.day)
+            .order_by(DailyClient.day)
+            .all()
+        )
+        total = db.query(func.count(func.distinct(DailyClient.user_ip))).filter(*in_range).scalar()
+        return [(day, count) for day, count in per_day], total or 0
+
+    @staticmethod
+    def default_range(granularity: str) -> Tuple[datetime, datetime]:
+        # The last 48 hours or the last 30 days, ending now
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return now - (timedelta(hours=48) if granularity == "hour" else timedelta(days=30)), now
+
+
+    @staticmethod
+    def _formula_key(formula: str) -> str:
+        # Same key as the compound rows: the spelling, so isomers ("CH3CH2OH", "CH3OCH3") count apart
+        return CompoundService.compound_key(formula)[:100]
+
+    @staticmethod
+    def _upsert(db: Session, model, index_elements: List[str], rows: List[dict], replace: Tuple[str, ...] = ()) -> None:
+        # INSERT, or add `requests` onto the existing row; one executemany per table
+        dialect = db.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            statement = (sqlite if dialect == "sqlite" else postgresql).insert(model)
+            values = {"requests": model.requests + statement.excluded.requests}
+            values.update({column: statement.excluded[column] for column in replace})
+            db.execute(statement.on_conflict_do_update(index_elements=index_elements, set_=values), rows)
+        elif dialect in ("mysql", "mariadb"):
+            statement = mysql.insert(model)
+            values = {"requests": model.requests + statement.inserted.requests}
+            values.update({column: statement.inserted[column] for column in replace})
+            db.execute(statement.on_duplicate_key_update(values), rows)
+        else:
+            for row in rows:
+                key = [getattr(model, column) == row[column] for column in index_elements]
+                values = {"requests": model.requests + row["requests"], **{column: row[column] for column in replace}}
+                if not db.execute(update(model).where(*key).values(values)).rowcount:
+                    db.execute(insert(model).values(row))
+
+    @staticmethod
+    def _insert_ignore(db: Session, model, index_elements: List[str]):
+        dialect = db.get_bind().dialect.name
+        if dialect == "sqlite":
+            return sqlite.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+        if dialect == "postgresql":
+            return postgresql.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+        if dialect in ("mysql", "mariadb"):
+            return insert(model).prefix_with("IGNORE")
+        return insert(model)
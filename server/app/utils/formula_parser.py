@@ -0,0 +1,151 @@
+import os
+import re
+from functools import lru_cache
+from typing import Dict, NamedTuple, Tuple
+
+
+PARSE_CACHE_SIZE = int(os.getenv("FORMULA_PARSE_CACHE_SIZE", 4096))
+
+# One precompiled pattern tokenizes the whole formula in a single pass. Each token
+# carries its own count, so there is no second regex match per token.
+_TOKEN_PATTERN = re.compile(r"""
+    ([A-Z][a-z]?)(\d*)                  # 1-2: element and its count
+  | ([(\[])                             # 3:   group open
+  | ([)\]])(\d*)                        # 4-5: group close and multiplier
+  | [·•.*](\d*)                         # 6:   hydrate separator and coefficient
+  | \^(\d*)([+-]+)(\d*)$                # 7-9: charge with caret, e.g. ^2- or ^+
+  | ([+-]+)(\d*)$                       # 10-11: trailing charge, e.g. + or -2 or --
+  | (\d+)                               # 12:  number in an unexpected place
+  | (.)                                 # 13:  anything else
+""", re.VERBOSE)
+
+# Most formulas are plain element/count runs ("C6H12O6"); those skip the full tokenizer
+_SIMPLE_FORMULA = re.compile(r"(?:[A-Z][a-z]?\d*)+")
+_ELEMENT_COUNT = re.compile(r"([A-Z][a-z]?)(\d*)")
+
+_CLOSERS = {"(": ")", "[": "]"}
+
+
+class ParsedFormula(NamedTuple):
+    # Merged element counts in order of first appearance
+    composition: Tuple[Tuple[str, int], ...]
+    charge: int
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self.composition)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_formula(formula: str) -> ParsedFormula:
+    """
+    Parses formulas such as "H2O", "Ca(OH)2", "K4[Fe(CN)6]", "CuSO4·5H2O" and
+    "SO4^2-" into merged element counts plus the net charge. Whitespace is
+    ignored ("H 2 O" is H2O). Raises ValueError for malformed input. Results
+    are memoized on the raw string.
+    """
+    formula = "".join(formula.split())
+    if _SIMPLE_FORMULA.fullmatch(formula):
+        total: Dict[str, int] = {}
+        for element, count in _ELEMENT_COUNT.findall(formula):
+            total[element] = total.get(element, 0) + (int(count) if count else 1)
+        return ParsedFormula(tuple(total.items()), 0)
+
+    tokens = _TOKEN_PATTERN.findall(formula)
+    if not tokens:
+        raise ValueError(f"Invalid formula format: {formula}")
+
+    total = {}
+    part: Dict[str, int] = {}
+    part_multiplier = 1
+    stack = [part]
+    openers = []
+    charge = None
+
+    for (element, count, group_open, group_close, group_count, coefficient,
+         caret_digits, caret_signs, caret_trailing, signs, sign_digits, number, invalid) in tokens:
+        if charge is not None:
+            raise ValueError(f"Charge must come at the end of the formula: {formula}")
+
+        if element:
+            current = stack[-1]
+            current[element] = current.get(element, 0) + (int(count) if count else 1)
+        elif group_open:
+            stack.append({})
+            openers.append(group_open)
+        elif group_close:
+            if not openers or _CLOSERS[openers.pop()] != group_close:
+                raise ValueError(f"Unbalanced parentheses in formula: {formula}")
+            group = stack.pop()
+            multiplier = int(group_count) if group_count else 1
+            current = stack[-1]
+            for elem, elem_count in group.items():
+                current[elem] = current.get(elem, 0) + elem_count * multiplier
+        elif caret_signs or signs:
+            charge = _parse_charge(formula, caret_digits, caret_signs or signs, caret_trailing or sign_digits)
+        elif number:
+            raise ValueError(f"Unexpected number in formula: {formula}")
+        elif invalid:
+            raise ValueError(f"Invalid token in formula: {invalid}")
+        else:
+            # Hydrate separator: fold the finished part in and start the next one
+            if openers:
+                raise ValueError(f"Unbalanced parentheses in formula: {formula}")
+            if not part:
+                raise ValueError(f"Hydrate separator without a formula before it: {formula}")
+            _merge_into(total, part, part_multiplier)
+            part = {}
+            stack = [part]
+            part_multiplier = int(coefficient) if coefficient else 1
+
+    if openers:
+        raise ValueError(f"Unbalanced parentheses in formula: {formula}")
+    if not part:
+        raise ValueError(f"Invalid formula format: {formula}")
+    _merge_into(total, part, part_multiplier)
+
+    return ParsedFormula(tuple(total.items()), charge or 0)
+
+
+def _merge_into(total: Dict[str, int], part: Dict[str, int], multiplier: int) -> None:
+    for element, count in part.items():
+        total[element] = total.get(element, 0) + count * multiplier
+
+
+def _parse_charge(formula: str, leading_digits: str, signs: str, trailing_digits: str) -> int:
+    if len(set(signs)) > 1 or (len(signs) > 1 and (leading_digits or trailing_digits)) or (leading_digits and trailing_digits):
+        raise ValueError(f"Invalid charge in formula: {formula}")
+
+    magnitude = int(leading_digits or trailing_digits or len(signs))
+    return magnitude if signs[0] == "+" else -magnitude
+
+
+def hill_formula(parsed: ParsedFormula) -> str:
+    """
+    Writes merged counts in Hill order: carbon, then hydrogen, then the rest
+    alphabetically; without carbon everything is alphabetical. A charge is
+    appended PubChem-style, e.g. "O4S-2".
+    """
+    counts = {element: count for element, count in parsed.composition if count}
+    if "C" in counts:
+        order = ["C"] + (["H"] if "H" in counts else []) + sorted(e for e in counts if e not in ("C", "H"))
+    else:
+        order = sorted(counts)
+
+    formula = "".join(element + (str(counts[element]) if counts[element] != 1 else "") for element in order)
+    if parsed.charge:
+        magnitude = abs(parsed.charge)
+        formula += ("+" if parsed.charge > 0 else "-") + (str(magnitude) if magnitude != 1 else "")
+    return formula
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def canonical_formula(formula: str) -> str:
+    """
+    Canonical key for a formula: "HOH", "H2O" and "H2 O" all map to "H2O", and
+    "CH3COOH" to "C2H4O2". Input that does not parse keeps its own spelling,
+    minus whitespace, so it can still be cached as a negative result.
+    """
+    try:
+        return hill_formula(parse_formula(formula))
+    except ValueError:
+        return "".join(formula.split())
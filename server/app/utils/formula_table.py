@@ -0,0 +1,228 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from app.utils.formula_parser import PARSE_CACHE_SIZE, hill_formula, parse_formula
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.getenv(
+    "FORMULA_TABLE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "formula_table.bin"),
+)
+
+# File layout, little-endian:
+#   header  magic, format version, entry count, alias count, digest of the atomic masses used
+#   entries sorted by canonical key: key (NUL padded), molar mass, PubChem CID (-1 if unknown)
+#   aliases sorted by lowercase spelling: alias (NUL padded), index of its entry
+# Fixed-width records let lookups binary-search the mapped file without parsing it.
+_MAGIC = b"FMLT"
+_FORMAT_VERSION = 1
+KEY_SIZE = 32
+_HEADER = struct.Struct("<4sHxxII16s")
+_ENTRY = struct.Struct(f"<{KEY_SIZE}sdq")
+_ALIAS = struct.Struct(f"<{KEY_SIZE}sI")
+
+
+class FormulaTableEntry(NamedTuple):
+    formula: str  # canonical (Hill order) formula
+    molar_mass: float
+    cid: Optional[int]
+
+
+def masses_digest(atomic_masses: Dict[str, float]) -> bytes:
+    # Ties a table to the atomic masses it was computed with
+    return hashlib.blake2b(json.dumps(atomic_masses, sort_keys=True).encode(), digest_size=16).digest()
+
+
+class FormulaTable:
+    """
+    Read-only canonical formula -> (molar mass, CID) table, memory-mapped from a
+    file built by build_formula_table.py. Pages are loaded by the OS on first
+    touch, so opening it costs nothing and workers share one copy.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.entry_count, self.alias_count, self.masses_digest = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            self._map.close()
+            raise ValueError(f"Not a formula table (or an old format): {path}")
+        expected = _HEADER.size + self.entry_count * _ENTRY.size + self.alias_count * _ALIAS.size
+        if len(self._map) != expected:
+            self._map.close()
+            raise ValueError(f"Truncated formula table: {path}")
+
+        self._aliases_offset = _HEADER.size + self.entry_count * _ENTRY.size
+
+    def __len__(self) -> int:
+        return self.entry_count
+
+    def get(self, formula: str) -> Optional[FormulaTableEntry]:
+        # Exact lookup of a canonical formula
+        index = self._search(_key_bytes(formula), _HEADER.size, _ENTRY, self.entry_count)
+        return self._entry(index) if index is not None else None
+
+    def get_alias(self, formula: str) -> Optional[FormulaTableEntry]:
+        # Case-insensitive spellings ("h2o", "nacl") that don't parse as written
+        index = self._search(_key_bytes(formula.lower()), self._aliases_offset, _ALIAS, self.alias_count)
+        if index is None:
+            return None
+        _, entry_index = _ALIAS.unpack_from(self._map, self._aliases_offset + index * _ALIAS.size)
+        return self._entry(entry_index)
+
+    def close(self) -> None:
+        self._map.close()
+
+    def _entry(self, index: int) -> FormulaTableEntry:
+        key, molar_mass, cid = _ENTRY.unpack_from(self._map, _HEADER.size + index * _ENTRY.size)
+        return FormulaTableEntry(key.rstrip(b"\0").decode(), molar_mass, cid if cid >= 0 else None)
+
+    def _search(self, key: Optional[bytes], offset: int, record: struct.Struct, count: int) -> Optional[int]:
+        if key is None:
+            return None
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            # Every record starts with its NUL-padded key, so raw bytes compare correctly
+            start = offset + middle * record.size
+            candidate = self._map[start:start + KEY_SIZE]
+            if candidate < key:
+                low = middle + 1
+            elif candidate > key:
+                high = middle
+            else:
+                return middle
+        return None
+
+
+def _key_bytes(formula: str) -> Optional[bytes]:
+    key = formula.strip().encode()
+    if not key or len(key) > KEY_SIZE:
+        return None
+    return key.ljust(KEY_SIZE, b"\0")
+
+
+def write_formula_table(path: str, entries: Iterable[Tuple[str, float, Optional[int]]],
+                        aliases: Dict[str, str], atomic_masses: Dict[str, float]) -> int:
+    """
+    Writes (canonical formula, molar mass, CID) entries and lowercase alias ->
+    canonical formula mappings to `path`. Formulas longer than KEY_SIZE bytes are
+    skipped. Returns the number of entries written.
+    """
+    records = {}
+    for formula, molar_mass, cid in entries:
+        key = _key_bytes(formula)
+        if key is not None:
+            records[key] = (molar_mass, cid)
+    keys = sorted(records)
+    index_of = {key: index for index, key in enumerate(keys)}
+
+    alias_records = []
+    for alias, formula in aliases.items():
+        alias_key, target = _key_bytes(alias.lower()), _key_bytes(formula)
+        if alias_key is not None and target in index_of:
+            alias_records.append((alias_key, index_of[target]))
+    alias_records.sort()
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, len(keys), len(alias_records), masses_digest(atomic_masses)))
+        for key in keys:
+            molar_mass, cid = records[key]
+            file.write(_ENTRY.pack(key, molar_mass, cid if cid is not None else -1))
+        for alias_key, index in alias_records:
+            file.write(_ALIAS.pack(alias_key, index))
+    # Swapped in atomically; processes that mapped the old file keep reading it
+    os.replace(temporary, path)
+    return len(keys)
+
+
+_table: Optional[FormulaTable] = None
+_loaded = False
+_load_lock = threading.Lock()
+
+
+def load_formula_table(atomic_masses: Dict[str, float], path: Optional[str] = None) -> Optional[FormulaTable]:
+    """
+    Maps the table once per process. A missing file, or one built from different
+    atomic masses, leaves the table disabled and every lookup falls back to parsing.
+    """
+    global _table, _loaded
+    with _load_lock:
+        if _loaded:
+            return _table
+        _loaded = True
+
+        path = path or DEFAULT_PATH
+        if not os.path.exists(path):
+            logger.info("No formula table at %s; molar masses are computed on demand", path)
+            return None
+        try:
+            table = FormulaTable(path)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load formula table: %s", e)
+            return None
+        if table.masses_digest != masses_digest(atomic_masses):
+            logger.warning("Formula table %s was built from different atomic masses; rebuild it", path)
+            table.close()
+            return None
+
+        _table = table
+        _lookup.cache_clear()
+        _lookup_cid.cache_clear()
+        logger.info("Loaded formula table with %d formulas from %s", len(table), path)
+        return _table
+
+
+def lookup_formula(formula: str) -> Optional[FormulaTableEntry]:
+    """
+    Looks a formula up as written, then by its canonical key. Only input that
+    does not parse is tried as a lowercase alias, so "Co" never turns into "CO".
+    Returns None when there is no table or no entry.
+    """
+    if _table is None:
+        return None
+    return _lookup(formula)
+
+
+# Memoized like parse_formula: repeated formulas skip the binary search and the parse
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _lookup(formula: str) -> Optional[FormulaTableEntry]:
+    table = _table
+    entry = table.get(formula)
+    if entry is None:
+        try:
+            parsed = parse_formula(formula)
+        except ValueError:
+            return table.get_alias(formula)
+        entry = table.get(hill_formula(parsed))
+    return entry
+
+
+def lookup_cid(formula: str) -> Optional[int]:
+    """
+    The CID the table lists for this spelling. Isomers share a canonical formula,
+    so only the spellings the table was built from (and the canonical formula
+    itself) get one: "C2H5OH" gets ethanol's CID, "CH3OCH3" gets None.
+    """
+    if _table is None:
+        return None
+    return _lookup_cid(formula)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _lookup_cid(formula: str) -> Optional[int]:
+    spelling = "".join(formula.split())
+    entry = _table.get(spelling) or _table.get_alias(spelling)
+    return entry.cid if entry is not None else None
@@ -0,0 +1,33 @@
+import hashlib
+import os
+from fastapi import Request, Response
+
+
+# 0 means clients may keep a copy but must revalidate it (cheaply, via If-None-Match) every time
+MAX_AGE = int(os.getenv("HISTORY_CACHE_MAX_AGE", 0))
+CACHE_CONTROL = f"private, max-age={MAX_AGE}" if MAX_AGE > 0 else "no-cache"
+
+
+def make_etag(*parts) -> str:
+    # Strong ETag over whatever identifies the representation: route, query parameters and row versions
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    candidates = {candidate.strip().removeprefix("W/") for candidate in header.split(",")}
+    return etag in candidates
+
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
@@ -0,0 +1,278 @@
+"""
+Request timing and Prometheus metrics.
+
+`span()` times a stage of a request (parsing, a PubChem call, a DB write) into a
+histogram and into the current request's Server-Timing header. MetricsMiddleware
+opens the per-request timing scope and records request latency per route; /metrics
+renders everything in the Prometheus text format. Recording is a perf_counter()
+pair plus a locked dict update, cheap enough to leave on in production.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+
+# Upper bounds in seconds, from sub-millisecond parses to slow PubChem calls
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DESCRIPTIONS = {
+    "chemistry_http_request_duration_seconds": ("histogram", "HTTP request latency by route and status"),
+    "chemistry_stage_duration_seconds": ("histogram", "Time spent in each stage of a calculation"),
+    "chemistry_stage_errors_total": ("counter", "Stages that raised an exception"),
+    "chemistry_upstream_request_duration_seconds": ("histogram", "Upstream request latency by service and endpoint"),
+    "chemistry_upstream_requests_total": ("counter", "Upstream requests by service, endpoint and HTTP status"),
+    "chemistry_upstream_rejected_total": ("counter", "Upstream calls not made: circuit open or time budget spent"),
+    "chemistry_upstream_throttle_seconds": ("histogram", "Time spent waiting on the client-side rate limiter"),
+    "chemistry_db_query_duration_seconds": ("histogram", "SQL statement execution time by operation"),
+}
+
+# Stage name -> [total seconds, count] for the request being served
+_request_timings: ContextVar[Optional[Dict[str, list]]] = ContextVar("request_timings", default=None)
+
+
+class Metrics:
+    """
+    Process-wide histograms and counters, keyed by metric name and label values.
+    """
+
+    _lock = threading.Lock()
+    _histograms: Dict[Tuple[str, tuple], list] = {}  # -> bucket counts + [sum, count]
+    _counters: Dict[Tuple[str, tuple], float] = {}
+
+    @classmethod
+    def observe(cls, name: str, seconds: float, **labels) -> None:
+        key = (name, tuple(labels.items()))
+        index = bisect_left(BUCKETS, seconds)
+        with cls._lock:
+            values = cls._histograms.get(key)
+            if values is None:
+                values = cls._histograms[key] = [0] * (len(BUCKETS) + 2)
+            if index < len(BUCKETS):
+                values[index] += 1
+            values[-2] += seconds
+            values[-1] += 1
+
+    @classmethod
+    def increment(cls, name: str, amount: float = 1, **labels) -> None:
+        key = (name, tuple(labels.items()))
+        with cls._lock:
+            cls._counters[key] = cls._counters.get(key, 0) + amount
+
+    @classmethod
+    def total(cls, name: str) -> float:
+        # A counter summed over all its label values
+        with cls._lock:
+            return sum(value for (counter, _), value in cls._counters.items() if counter == name)
+
+    @classmethod
+    def render(cls, snapshots: Iterable[str] = ()) -> str:
+        # Prometheus text exposition format, version 0.0.4
+        with cls._lock:
+            histograms = {key: list(values) for key, values in cls._histograms.items()}
+            counters = dict(cls._counters)
+
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described and name in DESCRIPTIONS:
+                kind, text = DESCRIPTIONS[name]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+
+        for (name, labels), values in sorted(histograms.items()):
+            describe(name)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {values[-1]}")
+            lines.append(f"{name}_sum{_labels(labels)} {values[-2]}")
+            lines.append(f"{name}_count{_labels(labels)} {values[-1]}")
+
+        for (name, labels), value in sorted(counters.items()):
+            describe(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+
+        lines.extend(snapshots)
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._histograms.clear()
+            cls._counters.clear()
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def snapshot_lines(prefix: str, stats: dict, counters: Iterable[str] = ()) -> list:
+    """
+    The numeric fields of a stats dict (PoolMetrics, PubChemCache) as metric lines:
+    the names in `counters` are cumulative and get a `_total` suffix, the rest are gauges.
+    """
+    counters = set(counters)
+    lines = []
+    for name, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        kind = "counter" if name in counters else "gauge"
+        metric = f"{prefix}_{name}"
+        if kind == "counter" and not name.endswith("_total"):
+            metric += "_total"
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {value}")
+    return lines
+
+
+# ---------------------------------------------------------------------------
+# Timing
+
+def record_timing(name: str, seconds: float) -> None:
+    # Adds to the current request's Server-Timing entry; a no-op outside a request
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.get(name)
+        if entry is None:
+            timings[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+
+@contextmanager
+def span(stage: str):
+    if not METRICS_ENABLED:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        Metrics.increment("chemistry_stage_errors_total", stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        Metrics.observe("chemistry_stage_duration_seconds", elapsed, stage=stage)
+        record_timing(stage, elapsed)
+
+
+def record_upstream(service: str, endpoint: str, seconds: float, status) -> None:
+    if not METRICS_ENABLED:
+        return
+    Metrics.observe("chemistry_upstream_request_duration_seconds", seconds, service=service, endpoint=endpoint)
+    Metrics.increment("chemistry_upstream_requests_total", service=service, endpoint=endpoint, status=str(status))
+    record_timing(f"{service}-{endpoint}", seconds)
+
+
+def record_upstream_rejected(service: str, reason: str) -> None:
+    if METRICS_ENABLED:
+        Metrics.increment("chemistry_upstream_rejected_total", service=service, reason=reason)
+
+
+def record_throttle(service: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        Metrics.observe("chemistry_upstream_throttle_seconds", seconds, service=service)
+        record_timing(f"{service}-throttle", seconds)
+
+
+def server_timing_header(timings: Dict[str, list], total: float) -> str:
+    entries = []
+    for name, (seconds, count) in timings.items():
+        entry = f"{name};dur={seconds * 1000:.3f}"
+        if count > 1:
+            entry += f';desc="{count} calls"'
+        entries.append(entry)
+    entries.append(f"app;dur={total * 1000:.3f}")
+    return ", ".join(entries)
+
+
+# ---------------------------------------------------------------------------
+# SQLAlchemy
+
+def instrument_engine(engine) -> None:
+    # Times every statement; inside a request the total shows up as Server-Timing "db"
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    if operation not in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+        operation = "OTHER"
+    Metrics.observe("chemistry_db_query_duration_seconds", elapsed, operation=operation)
+    record_timing("db", elapsed)
+
+
+# ---------------------------------------------------------------------------
+# ASGI
+
+class MetricsMiddleware:
+    """
+    Opens the per-request timing scope, adds the Server-Timing header and records
+    request latency labelled by route template (not the raw path, which would give
+    one series per formula id).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING_ENABLED:
+                    header = server_timing_header(timings, time.perf_counter() - start)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", header.encode("latin-1")),
+                        (b"timing-allow-origin", b"*"),  # matches the open CORS policy
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            route = scope.get("route")
+            Metrics.observe(
+                "chemistry_http_request_duration_seconds",
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            )
@@ -0,0 +1,91 @@
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, List, Tuple
+
+
+class _Node:
+    __slots__ = ("children", "entries")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.entries: List[Tuple[str, Any]] = []  # sorted (key, value)
+
+
+class PrefixTrie:
+    """
+    Prefix index for autocomplete. The first `depth` characters of a key are trie
+    levels; keys that share them sit in one sorted list below that level, searched
+    with bisect. That keeps the node count to one per distinct short prefix rather
+    than one per character of every key, while a lookup stays depth dict steps plus
+    a binary search and an insert is a bisect plus a list insert.
+
+    Keys are matched case-insensitively and results come back in key order. Values
+    must be comparable (they break ties between equal keys) and an identical
+    (key, value) pair is stored once.
+    """
+
+    def __init__(self, depth: int = 3):
+        self.depth = depth
+        self._root = _Node()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, key: str, value: Any) -> bool:
+        key = key.strip().lower()
+        if not key:
+            return False
+
+        entry = (key, value)
+        with self._lock:
+            node = self._root
+            for char in key[:self.depth]:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _Node()
+                node = child
+
+            index = bisect_left(node.entries, entry)
+            if index < len(node.entries) and node.entries[index] == entry:
+                return False
+            node.entries.insert(index, entry)
+            self._size += 1
+            return True
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Any]:
+        prefix = prefix.strip().lower()
+        if not prefix or limit <= 0:
+            return []
+
+        with self._lock:
+            node = self._root
+            for char in prefix[:self.depth]:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+
+            if len(prefix) > self.depth:
+                # Below the trie levels: the matches are one contiguous run of the sorted list
+                entries = node.entries
+                index = bisect_left(entries, (prefix,))
+                results = []
+                while index < len(entries) and len(results) < limit and entries[index][0].startswith(prefix):
+                    results.append(entries[index][1])
+                    index += 1
+                return results
+
+            # The whole subtree matches; a node's own keys sort before its children's
+            results = []
+            stack = [node]
+            while stack and len(results) < limit:
+                current = stack.pop()
+                results.extend(value for _, value in current.entries[:limit - len(results)])
+                stack.extend(current.children[char] for char in sorted(current.children, reverse=True))
+            return results
+
+    def clear(self) -> None:
+        with self._lock:
+            self._root = _Node()
+            self._size = 0
@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's time budget runs out before the next upstream call."""
+
+
+class TokenBucket:
+    """
+    Client-side rate limiter: `rate` tokens per second, bursts of up to `capacity`.
+    A caller reserves a token and is told how long to wait for it, so the same
+    bucket serves threads (time.sleep) and event loops (asyncio.sleep). A rate of
+    0 disables limiting.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Returns the seconds to wait before the reserved token is usable, or None
+    # (and reserves nothing) when that would be longer than max_wait
+    def reserve(self, max_wait: Optional[float] = None) -> Optional[float]:
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1  # may go negative: later callers queue behind this one
+            return wait
+
+    def acquire(self, max_wait: Optional[float] = None) -> bool:
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of upstream calls over a sliding time window. When at least
+    `min_calls` calls in the window failed at `failure_rate` or more, the circuit
+    opens and calls are refused for `open_seconds`. After that one probe call is let
+    through: success closes the circuit, failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_rate: float, min_calls: int, window_seconds: float, open_seconds: float):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+
+        self._lock = threading.Lock()
+        self._calls: deque = deque()  # (timestamp, failed)
+        self._failures = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+                self._state = self.HALF_OPEN
+                self._probe_started = None
+            # A probe that never reported back (cut off by its caller's deadline) is replaced
+            if self._state == self.HALF_OPEN and (self._probe_started is None or now - self._probe_started >= self.open_seconds):
+                self._probe_started = now
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._close()
+            self._record(False)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._open()
+                return
+            self._record(True)
+            calls = len(self._calls)
+            if self._state == self.CLOSED and calls >= self.min_calls and self._failures / calls >= self.failure_rate:
+                self._open()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return self.HALF_OPEN
+            return self._state
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(time.monotonic())
+            stats = dict(self._stats)
+            stats["window_calls"] = len(self._calls)
+            stats["window_failures"] = self._failures
+        stats["state"] = self.state
+        return stats
+
+    def _record(self, failed: bool) -> None:
+        now = time.monotonic()
+        self._calls.append((now, failed))
+        self._failures += failed
+        self._expire(now)
+
+    def _expire(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            _, failed = self._calls.popleft()
+            self._failures -= failed
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._stats["opened"] += 1
+
+    def _close(self) -> None:
+        self._state = self.CLOSED
+        self._calls.clear()
+        self._failures = 0
+
+
+class Deadline:
+    """
+    Time budget for one operation that makes several upstream calls. Each call
+    gets min(its own timeout, what is left), so the calls together never run past
+    the budget. `skipped` names the calls that were cut short or failed, so callers
+    can tell a partial result from a complete one.
+    """
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+        self.skipped: List[str] = []
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def timeout(self, cap: float) -> float:
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("Request time budget exhausted")
+        return min(cap, remaining)
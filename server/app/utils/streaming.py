@@ -0,0 +1,20 @@
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for handlers that keep reading the request body while the
+    response is streaming. On ASGI servers older than spec 2.4 the base class watches
+    for disconnects by calling receive(), which would swallow request body chunks;
+    here a disconnect surfaces from request.stream() or from the failed send instead.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+
+        if self.background is not None:
+            await self.background()
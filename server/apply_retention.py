@@ -0,0 +1,49 @@
+"""
+Archives and deletes formula history older than the retention window, once.
+
+    python apply_retention.py                          # HISTORY_RETENTION_DAYS, archives in HISTORY_ARCHIVE_DIR
+    python apply_retention.py --days 90 --chunk-size 20000
+    python apply_retention.py --days 90 --dry-run      # only count the rows that would go
+
+The app does the same every HISTORY_RETENTION_INTERVAL seconds when
+HISTORY_RETENTION_ENABLED=true; this is for cron, or for the first pass over a
+large backlog. It is safe to run against a live database, and it skips the pass
+if another one (the app's, or another run of this) holds the archive lock.
+
+Archived rows keep their compound_id; shared compounds are never deleted. A
+row whose PubChem fields were edited has its own compound, which is deleted
+with the row and archived with it under "compound".
+"""
+import argparse
+import json
+import sys
+import time
+
+from app.config.database_config import SessionLocal
+from app.services.retention_service import RetentionService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive and delete formula history older than the retention window")
+    parser.add_argument("--days", type=int, help="rows older than this many days go (default: HISTORY_RETENTION_DAYS)")
+    parser.add_argument("--chunk-size", type=int, help="rows per archive chunk and DELETE (default: HISTORY_RETENTION_CHUNK_SIZE)")
+    parser.add_argument("--dry-run", action="store_true", help="count the expired rows without archiving or deleting them")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.dry_run:
+        db = SessionLocal()
+        try:
+            totals = {"expired_rows": RetentionService.count_expired(db, args.days)}
+        finally:
+            db.close()
+    else:
+        totals = RetentionService.run(args.days, args.chunk_size)
+    totals["seconds"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(totals), file=sys.stderr)
+    if totals.get("skipped"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Sync vs async database routes under concurrent load, with the PubChem stub standing
+in for the real service.
+
+    python -m benchmarks.bench_async_db --requests 2000 --concurrency 200 --latency-ms 50
+
+Starts the API twice under uvicorn, once per ASYNC_DATABASE_ENABLED setting, and
+fires POST /api/formula/ (one PubChem lookup and one history insert each) followed
+by GET /api/formula/recent. The PubChem cache is switched off so every calculation
+waits on the stub; sync handlers hold a threadpool thread for that whole wait.
+Needs `sqlalchemy[asyncio]` and the asyncio driver (aiosqlite by default).
+
+SQLite takes one writer at a time, so at high concurrency the inserts queue on its
+lock (the busy timeout is raised here to let them); pass --database-url to measure
+against MySQL or Postgres instead.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.pubchem_stub import COMPOUNDS, start_stub_server
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_api(env, port):
+    server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=server_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("API did not start")
+
+
+async def load(base_url, method, path, bodies, concurrency):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def one(body):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body)
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    return
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(body) for body in bodies))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": len(bodies) / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "errors": errors,
+    }
+
+
+def run(requests, concurrency, latency_ms, database_url):
+    _, stub_url, _ = start_stub_server(latency_ms=latency_ms)
+    formulas = list(COMPOUNDS)
+    results = {}
+
+    for mode in ("sync", "async"):
+        if database_url.startswith("sqlite:///") and os.path.exists(database_url[len("sqlite:///"):]):
+            os.remove(database_url[len("sqlite:///"):])  # both modes start from an empty history
+        port = free_port()
+        env = dict(
+            os.environ,
+            DATABASE_URL=database_url,
+            SQLITE_BUSY_TIMEOUT_MS="60000",
+            ASYNC_DATABASE_ENABLED="true" if mode == "async" else "false",
+            PUBCHEM_BASE_URL=stub_url,
+            PUBCHEM_CACHE_TTL="0",
+            PUBCHEM_CACHE_NEGATIVE_TTL="0",
+            PUBCHEM_CACHE_DB_ENABLED="false",
+            PUBCHEM_RATE_LIMIT="0",  # the stub is not PubChem; measure the app, not the limiter
+            PUBCHEM_MAX_CONNECTIONS=str(concurrency),
+            PUBCHEM_MAX_CONCURRENCY=str(concurrency),
+            DB_POOL_SIZE=str(concurrency),
+        )
+        process = start_api(env, port)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            bodies = [{"formula": formulas[i % len(formulas)]} for i in range(requests)]
+            results[mode] = {
+                "calculate": asyncio.run(load(base_url, "POST", "/api/formula/", bodies, concurrency)),
+                "recent": asyncio.run(load(base_url, "GET", "/api/formula/recent", [None] * requests, concurrency)),
+            }
+        finally:
+            process.terminate()
+            process.wait()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync vs async database routes")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="simulated PubChem latency per request")
+    parser.add_argument("--database-url", default="sqlite:////tmp/async_db_bench.db")
+    args = parser.parse_args()
+
+    results = run(args.requests, args.concurrency, args.latency_ms, args.database_url)
+    print(f"{args.requests} requests, concurrency {args.concurrency}, PubChem latency {args.latency_ms} ms")
+    print(f"{'mode':>6} {'route':>10} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'errors':>8}")
+    for mode, routes in results.items():
+        for route, timing in routes.items():
+            print(f"{mode:>6} {route:>10} {timing['rps']:>10.1f} {timing['p50_ms']:>10.1f} {timing['p95_ms']:>10.1f} {timing['errors']:>8}")
@@ -0,0 +1,97 @@
+"""
+Throughput of the formula parser against the previous regex-driven implementation.
+
+    python -m benchmarks.bench_formula_parser --repeat 200
+"""
+import argparse
+import re
+import time
+
+from app.utils.formula_parser import parse_formula
+
+
+# Formulas the calculator actually sees: small molecules, salts, hydrates, nested groups
+CORPUS = [
+    "H2O", "CO2", "NaCl", "CH4", "NH3", "O2", "N2", "HCl", "H2SO4", "HNO3",
+    "NaOH", "KOH", "CaCO3", "NaHCO3", "C6H12O6", "C2H5OH", "C2H6O", "CH3COOH",
+    "C6H6", "C8H10N4O2", "C9H8O4", "C12H22O11", "C10H8", "C7H8", "C3H8O3",
+    "Ca(OH)2", "Mg(OH)2", "Al(OH)3", "Fe2(SO4)3", "Al2(SO4)3", "Ca3(PO4)2",
+    "Mg3(PO4)2", "(NH4)2SO4", "(NH4)3PO4", "Pb(NO3)2", "Cu(NO3)2", "Ba(OH)2",
+    "K4[Fe(CN)6]", "K3[Fe(CN)6]", "[Cu(NH3)4]SO4", "[Co(NH3)6]Cl3",
+    "CuSO4·5H2O", "MgSO4·7H2O", "CaSO4·2H2O", "Na2CO3·10H2O", "CoCl2·6H2O",
+    "CH3(CH2)16COOH", "C6H5COOH", "C6H5NO2", "CH3CH2CH2CH3", "C20H25N3O",
+    "C27H46O", "C55H72MgN4O5", "C16H18N2O4S", "C21H30O2", "KMnO4", "K2Cr2O7",
+]
+
+
+def legacy_parse_formula(formula):
+    # The regex-driven parser this module replaced, kept here as the baseline
+    tokens = re.findall(r'[A-Z][a-z]?|\d+|\(|\)', formula)
+    if not tokens:
+        raise ValueError(f"Invalid formula format: {formula}")
+    stack = [[]]
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        i += 1
+        if token == '(':
+            stack.append([])
+        elif token == ')':
+            group = stack.pop()
+            if i < len(tokens) and tokens[i].isdigit():
+                multiplier = int(tokens[i])
+                i += 1
+            else:
+                multiplier = 1
+            for elem, count in group:
+                stack[-1].append((elem, count * multiplier))
+        elif re.match(r'[A-Z][a-z]?', token):
+            if i < len(tokens) and tokens[i].isdigit():
+                count = int(tokens[i])
+                i += 1
+            else:
+                count = 1
+            stack[-1].append((token, count))
+        else:
+            raise ValueError(f"Unexpected number in formula: {formula}")
+    return stack[0]
+
+
+# The legacy parser has no [] or hydrate support, so compare on what it can parse
+LEGACY_CORPUS = [formula for formula in CORPUS if "[" not in formula and "·" not in formula]
+
+
+def _time_per_call(fn, corpus, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for formula in corpus:
+            fn(formula)
+    return (time.perf_counter() - start) / (repeat * len(corpus))
+
+
+def run(repeat=200):
+    legacy = _time_per_call(legacy_parse_formula, LEGACY_CORPUS, repeat)
+
+    uncached = _time_per_call(parse_formula.__wrapped__, LEGACY_CORPUS, repeat)
+
+    parse_formula.cache_clear()
+    memoized = _time_per_call(parse_formula, LEGACY_CORPUS, repeat)
+
+    return {
+        "legacy_us": legacy * 1e6,
+        "uncached_us": uncached * 1e6,
+        "memoized_us": memoized * 1e6,
+        "uncached_speedup": legacy / uncached,
+        "memoized_speedup": legacy / memoized,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Formula parser throughput")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    print(f"legacy regex parser : {results['legacy_us']:8.2f} us/formula")
+    print(f"single-pass, no memo: {results['uncached_us']:8.2f} us/formula ({results['uncached_speedup']:.1f}x)")
+    print(f"single-pass, memo   : {results['memoized_us']:8.2f} us/formula ({results['memoized_speedup']:.1f}x)")
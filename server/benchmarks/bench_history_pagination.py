@@ -0,0 +1,85 @@
+"""
+Offset vs keyset (cursor) pagination of the formula history at increasing depth.
+
+    python -m benchmarks.bench_history_pagination --rows 10000000 --db /tmp/history_bench.db
+
+The SQLite file is populated on the first run (a few minutes at 10M rows) and
+reused afterwards. Offset latency grows with the page depth; cursor latency stays flat.
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from app.models.FormulaHistoryModel import FormulaHistory
+from app.services.formula_history_service import FormulaHistoryService
+from app.utils.pagination import encode_cursor
+
+
+FORMULAS = ["H2O", "CO2", "NaCl", "CH4", "NH3", "C6H12O6", "CaCO3", "H2SO4", "C2H5OH", "CuSO4·5H2O"]
+INSERT_CHUNK = 50000
+
+
+def populate(engine, rows):
+    FormulaHistory.__table__.create(bind=engine, checkfirst=True)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        existing = conn.exec_driver_sql("SELECT COUNT(*) FROM formulas").scalar()
+        for offset in range(existing, rows, INSERT_CHUNK):
+            batch = []
+            for i in range(offset, min(offset + INSERT_CHUNK, rows)):
+                # Two rows per second, stored like CURRENT_TIMESTAMP, so the id tie-break is exercised
+                timestamp = (start + timedelta(seconds=i // 2)).strftime("%Y-%m-%d %H:%M:%S")
+                batch.append((FORMULAS[i % len(FORMULAS)], 18.015, timestamp))
+            conn.exec_driver_sql("INSERT INTO formulas (formula, molar_mass, timestamp) VALUES (?, ?, ?)", batch)
+
+
+def _time_ms(fn, repeat):
+    fn()  # warm the page cache
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(rows=10_000_000, db_path="/tmp/history_bench.db", limit=50, repeat=20):
+    engine = create_engine(f"sqlite:///{db_path}")
+    populate(engine, rows)
+    db = sessionmaker(bind=engine)()
+
+    total = db.query(func.count(FormulaHistory.id)).scalar()
+    depths = sorted({depth for depth in (0, 1000, 100_000, total // 10, total // 2, total - limit - 1) if 0 <= depth < total})
+
+    results = []
+    for depth in depths:
+        # The cursor a client would hold after paging down to `depth`
+        cursor = None
+        if depth:
+            anchor = FormulaHistoryService.get_formula_history(db, depth - 1, 1)[0]
+            cursor = encode_cursor(anchor.timestamp, anchor.id)
+
+        offset_ms = _time_ms(lambda: FormulaHistoryService.get_formula_history(db, depth, limit), repeat)
+        cursor_ms = _time_ms(lambda: FormulaHistoryService.get_formula_history_page(db, cursor, limit), repeat)
+        results.append({"depth": depth, "offset_ms": offset_ms, "cursor_ms": cursor_ms})
+
+    db.close()
+    engine.dispose()
+    return {"rows": total, "limit": limit, "pages": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Formula history pagination latency")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--db", default=os.path.join("/tmp", "history_bench.db"))
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = run(args.rows, args.db, args.limit, args.repeat)
+    print(f"{results['rows']} rows, {results['limit']} per page")
+    print(f"{'depth':>12} {'offset ms':>12} {'cursor ms':>12}")
+    for page in results["pages"]:
+        print(f"{page['depth']:>12} {page['offset_ms']:>12.2f} {page['cursor_ms']:>12.2f}")
@@ -0,0 +1,70 @@
+"""
+Cold-start time of the API: each run is a fresh interpreter, like a new worker.
+
+    python -m benchmarks.bench_startup --runs 10
+    python -m benchmarks.bench_startup --schema-check skip --db /tmp/startup_bench.db
+
+Reports the time to import `main`, to finish the lifespan startup (ready) and to
+answer the first request, as the median and max over all runs.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+# Runs inside each child process; prints one JSON line with its timings
+CHILD = r"""
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    ready = time.perf_counter()
+    # Batch without enrichment: a calculation and a route, but no PubChem call
+    client.post("/api/formula/batch", json={"formulas": ["H2O"]}).raise_for_status()
+    first_request = time.perf_counter()
+print("STARTUP " + json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "ready_ms": (ready - start) * 1000,
+    "first_request_ms": (first_request - start) * 1000,
+}))
+"""
+
+
+def run_once(env):
+    server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=server_dir, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    line = next(line for line in output.splitlines() if line.startswith("STARTUP "))
+    return json.loads(line[len("STARTUP "):])
+
+
+def run(runs, db_path, schema_check):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", DB_SCHEMA_CHECK=schema_check)
+    # One untimed run creates the database, so every timed run starts from the same schema
+    run_once(dict(env, DB_SCHEMA_CHECK="sync"))
+    samples = [run_once(env) for _ in range(runs)]
+    return {
+        key: {"median": statistics.median(s[key] for s in samples), "max": max(s[key] for s in samples)}
+        for key in ("import_ms", "ready_ms", "first_request_ms")
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API cold-start time")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--db", default=os.path.join("/tmp", "startup_bench.db"))
+    parser.add_argument("--schema-check", choices=["sync", "background", "skip"], default="sync")
+    args = parser.parse_args()
+
+    results = run(args.runs, args.db, args.schema_check)
+    print(f"{args.runs} runs, DB_SCHEMA_CHECK={args.schema_check}")
+    print(f"{'phase':>18} {'median ms':>12} {'max ms':>12}")
+    for phase, timing in results.items():
+        print(f"{phase:>18} {timing['median']:>12.1f} {timing['max']:>12.1f}")
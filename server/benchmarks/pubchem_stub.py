@@ -0,0 +1,137 @@
+"""
+Local stand-in for the PubChem PUG REST API, used to exercise and benchmark the
+PubChem clients without network access.
+
+    python -m benchmarks.pubchem_stub --port 8765 --latency-ms 50
+    PUBCHEM_BASE_URL=http://127.0.0.1:8765/rest/pug python -m uvicorn main:app
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.utils.formula_parser import canonical_formula
+
+
+# Formulas the stub knows about; anything else returns 404 like PubChem does
+COMPOUNDS = {
+    "H2O": (962, "water", "oxidane"),
+    "CO2": (280, "carbon dioxide", "carbon dioxide"),
+    "NaCl": (5234, "sodium chloride", "sodium chloride"),
+    "CH4": (297, "methane", "methane"),
+    "NH3": (222, "ammonia", "azane"),
+    "C6H12O6": (5793, "D-glucose", "(3R,4S,5S,6R)-6-(hydroxymethyl)oxane-2,3,4,5-tetrol"),
+    "C2H6O": (702, "ethanol", "ethanol"),
+    "H2SO4": (1118, "sulfuric acid", "sulfuric acid"),
+    "C8H10N4O2": (2519, "caffeine", "1,3,7-trimethylpurine-2,6-dione"),
+    "C9H8O4": (2244, "aspirin", "2-acetyloxybenzoic acid"),
+}
+COMPOUNDS_BY_CID = {cid: (formula, name, iupac) for formula, (cid, name, iupac) in COMPOUNDS.items()}
+COMPOUNDS_BY_HILL = {canonical_formula(formula): entry for formula, entry in COMPOUNDS.items()}
+
+
+def build_response(path):
+    match = re.match(r"^/rest/pug/compound/name/([^/]+)/cids/JSON$", path)
+    if match:
+        entry = COMPOUNDS.get(match.group(1))
+        if entry is None:
+            return 404, {"Fault": {"Code": "PUGREST.NotFound"}}
+        return 200, {"IdentifierList": {"CID": [entry[0]]}}
+
+    match = re.match(r"^/rest/pug/compound/fastformula/([^/]+)/cids/JSON$", path)
+    if match:
+        entry = COMPOUNDS_BY_HILL.get(canonical_formula(match.group(1)))
+        if entry is None:
+            return 404, {"Fault": {"Code": "PUGREST.NotFound"}}
+        return 200, {"IdentifierList": {"CID": [entry[0]]}}
+
+    # property, synonyms and description accept a comma-separated CID list, like PubChem
+    match = re.match(r"^/rest/pug/compound/cid/(\d+(?:,\d+)*)/(property|synonyms|description)(?:/[^/]+)?/JSON$", path)
+    if match:
+        cids = [int(cid) for cid in match.group(1).split(",") if int(cid) in COMPOUNDS_BY_CID]
+        if not cids:
+            return 404, {"Fault": {"Code": "PUGREST.NotFound"}}
+        kind = match.group(2)
+        if kind == "property":
+            return 200, {"PropertyTable": {"Properties": [{
+                "CID": cid, "MolecularFormula": COMPOUNDS_BY_CID[cid][0], "MolecularWeight": "0",
+                "IUPACName": COMPOUNDS_BY_CID[cid][2], "CanonicalSMILES": "C",
+            } for cid in cids]}}
+        if kind == "synonyms":
+            return 200, {"InformationList": {"Information": [
+                {"CID": cid, "Synonym": [COMPOUNDS_BY_CID[cid][1], COMPOUNDS_BY_CID[cid][0]]} for cid in cids
+            ]}}
+        return 200, {"InformationList": {"Information": [
+            entry for cid in cids for entry in (
+                {"CID": cid, "Title": COMPOUNDS_BY_CID[cid][1]},
+                {"CID": cid, "Description": f"{COMPOUNDS_BY_CID[cid][1]} is a stub compound."},
+            )
+        ]}}
+
+    match = re.match(r"^/rest/pug/compound/cid/(\d+)/([a-z]+)(?:/[^/]+)?/JSON$", path)
+    if not match or int(match.group(1)) not in COMPOUNDS_BY_CID:
+        return 404, {"Fault": {"Code": "PUGREST.NotFound"}}
+
+    kind = match.group(2)
+    if kind == "classification":
+        return 200, {"Classification": {"Hierarchies": [
+            {"SourceName": "Physical State", "Nodes": [{"Information": {"Name": "Liquid"}}]},
+        ]}}
+    if kind == "sections":
+        return 200, {"Sections": [{"TOCHeading": "Experimental Properties", "Section": "exp"}]}
+    if kind == "section":
+        return 200, {"Section": {"Information": [
+            {"Name": "Boiling Point", "Value": {"StringWithMarkup": [{"String": "100 °C"}]}},
+            {"Name": "Melting Point", "Value": {"StringWithMarkup": [{"String": "0 °C"}]}},
+        ]}}
+    return 404, {"Fault": {"Code": "PUGREST.NotFound"}}
+
+
+def make_handler(latency_seconds, stats):
+    class PubChemStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real service
+
+        def do_GET(self):
+            if latency_seconds:
+                time.sleep(latency_seconds)
+            status, payload = build_response(self.path.split("?")[0])
+            body = json.dumps(payload).encode()
+            with stats["lock"]:
+                stats["requests"] += 1
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PubChemStubHandler
+
+
+def start_stub_server(port=0, latency_ms=0.0):
+    """Starts the stub on a daemon thread; returns (server, base_url, stats)."""
+    stats = {"requests": 0, "lock": threading.Lock()}
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency_ms / 1000.0, stats))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/rest/pug"
+    return server, base_url, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local PubChem PUG REST stub")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, base_url, _ = start_stub_server(args.port, args.latency_ms)
+    print(f"PubChem stub listening on {base_url} (latency {args.latency_ms} ms)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
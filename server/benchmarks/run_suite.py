@@ -0,0 +1,257 @@
+"""
+Benchmark suite for the formula API: parser and molar-mass throughput, end-to-end
+POST /api/formula/ against the PubChem stub, /history latency as the table grows,
+and FormulaHistoryModel serialization. Results are JSON with p50/p95/p99 per case.
+
+    python -m benchmarks.run_suite                                  # run, compare with benchmarks/baseline.json
+    python -m benchmarks.run_suite --output results.json --fail-on-regression
+    python -m benchmarks.run_suite --save-baseline                  # accept the current numbers
+
+A case regresses when its p50 or p95 is more than --tolerance slower than the
+baseline. Baselines only compare on the same machine, so CI should record its own.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(samples, unit):
+    # samples are per-operation times in `unit`
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    mean = statistics.fmean(ordered)
+    scale = {"us": 1e6, "ms": 1e3}[unit]
+    return {
+        "unit": unit,
+        "samples": len(ordered),
+        "p50": percentile(50),
+        "p95": percentile(95),
+        "p99": percentile(99),
+        "mean": mean,
+        "ops_per_sec": scale / mean if mean else None,
+    }
+
+
+def time_calls(fn, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+# ---------------------------------------------------------------------------
+# Cases
+
+def bench_formulas(passes):
+    from app.services.formula_service import FormulaService
+    from app.utils import formula_table
+    from app.utils.formula_parser import canonical_formula, parse_formula
+    from benchmarks.bench_formula_parser import CORPUS
+
+    service = FormulaService()
+    per_formula = lambda seconds: seconds / len(CORPUS) * 1e6
+
+    def parse_pass():
+        for formula in CORPUS:
+            parse_formula.__wrapped__(formula)
+
+    def calculate_pass():
+        for formula in CORPUS:
+            service.calculate_molar_mass(formula)
+
+    def cold_calculate_pass():
+        parse_formula.cache_clear()
+        canonical_formula.cache_clear()
+        formula_table._lookup.cache_clear()
+        calculate_pass()
+
+    calculate_pass()  # warm the memo caches for the warm case
+    return {
+        "parse_formula_uncached": summarize([per_formula(s) for s in time_calls(parse_pass, passes)], "us"),
+        "calculate_molar_mass_warm": summarize([per_formula(s) for s in time_calls(calculate_pass, passes)], "us"),
+        "calculate_molar_mass_cold": summarize([per_formula(s) for s in time_calls(cold_calculate_pass, passes)], "us"),
+    }
+
+
+def bench_post_formula(client, requests):
+    from app.services.pubchem_cache_service import PubChemCache
+    from benchmarks.pubchem_stub import COMPOUNDS
+
+    formulas = list(COMPOUNDS)
+    counter = iter(range(10 ** 9))
+
+    def post():
+        formula = formulas[next(counter) % len(formulas)]
+        client.post("/api/formula/", json={"formula": formula}).raise_for_status()
+
+    def post_uncached():
+        PubChemCache.clear()  # the DB tier is off, so every request goes to the stub
+        post()
+
+    for _ in formulas:
+        post()  # warm the PubChem cache and the compound ids
+    return {
+        "post_formula_cached": summarize([s * 1e3 for s in time_calls(post, requests)], "ms"),
+        "post_formula_uncached": summarize([s * 1e3 for s in time_calls(post_uncached, requests)], "ms"),
+    }
+
+
+def bench_history(client, sizes, requests):
+    from app.config.database_config import get_engine
+    from benchmarks.bench_history_pagination import populate
+
+    results = {}
+    for rows in sizes:
+        populate(get_engine(), rows)
+        get = lambda path: (lambda: client.get(path).raise_for_status())
+        results[f"history_{rows}_rows"] = summarize(
+            [s * 1e3 for s in time_calls(get("/api/formula/history?limit=50"), requests)], "ms")
+        results[f"history_{rows}_rows_deep_offset"] = summarize(
+            [s * 1e3 for s in time_calls(get(f"/api/formula/history?limit=50&skip={rows // 2}"), requests)], "ms")
+    return results
+
+
+def bench_serialization(rounds):
+    from pydantic import TypeAdapter
+    from typing import List
+
+    from app.config.database_config import SessionLocal
+    from app.schemas.schemas import FormulaHistoryModel
+    from app.services.formula_history_service import FormulaHistoryService
+
+    adapter = TypeAdapter(List[FormulaHistoryModel])
+    db = SessionLocal()
+    try:
+        rows = FormulaHistoryService.get_formula_history(db, 0, 100)
+        serialize = lambda: adapter.dump_json([FormulaHistoryModel.model_validate(row) for row in rows])
+        serialize()
+        return {
+            "serialize_history_100_rows": summarize([s * 1e3 for s in time_calls(serialize, rounds)], "ms"),
+        }
+    finally:
+        db.close()
+
+
+def run(args):
+    # The app reads its settings at import, so configure it before anything imports it
+    from benchmarks.pubchem_stub import start_stub_server
+    _, stub_url, _ = start_stub_server(latency_ms=args.latency_ms)
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{args.db}",
+        "PUBCHEM_BASE_URL": stub_url,
+        "PUBCHEM_CACHE_DB_ENABLED": "false",
+        "PUBCHEM_RATE_LIMIT": "0",  # the stub is not PubChem; measure the app, not the limiter
+        "HISTORY_WRITE_BUFFER_ENABLED": "false",
+        "RECENT_RESPONSE_CACHE_ENABLED": "false",
+    })
+    import logging
+    logging.disable(logging.INFO)  # per-request log lines would dominate the timings
+
+    from fastapi.testclient import TestClient
+    import main
+
+    results = bench_formulas(args.passes)
+    with TestClient(main.app) as client:
+        results.update(bench_post_formula(client, args.requests))
+        results.update(bench_serialization(args.requests))
+        results.update(bench_history(client, args.history_sizes, args.requests))
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+
+def metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "pubchem_latency_ms": args.latency_ms,
+    }
+
+
+def compare(results, baseline, tolerance):
+    # Returns (name, metric, baseline, current, ratio, verdict) for every shared case
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or previous.get("unit") != current["unit"]:
+            continue
+        for metric in ("p50", "p95"):
+            ratio = current[metric] / previous[metric] if previous[metric] else 1.0
+            verdict = "regression" if ratio > 1 + tolerance else "improvement" if ratio < 1 - tolerance else "ok"
+            rows.append((name, metric, previous[metric], current[metric], ratio, verdict))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Formula API benchmark suite")
+    parser.add_argument("--passes", type=int, default=300, help="corpus passes for the parser/mass cases")
+    parser.add_argument("--requests", type=int, default=200, help="requests per HTTP/serialization case")
+    parser.add_argument("--history-sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="PubChem stub latency per request")
+    parser.add_argument("--db", default=os.path.join("/tmp", "bench_suite.db"))
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a case counts as regressed")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on any regression")
+    args = parser.parse_args()
+
+    report = {"meta": metadata(args), "results": run(args)}
+
+    document = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(document + "\n")
+    else:
+        print(document)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            file.write(document + "\n")
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one", file=sys.stderr)
+        return
+    with open(args.baseline) as file:
+        rows = compare(report["results"], json.load(file), args.tolerance)
+
+    print(f"{'case':<36} {'metric':>6} {'baseline':>10} {'current':>10} {'ratio':>7}  verdict", file=sys.stderr)
+    for name, metric, previous, current, ratio, verdict in rows:
+        print(f"{name:<36} {metric:>6} {previous:>10.3f} {current:>10.3f} {ratio:>7.2f}  {verdict}", file=sys.stderr)
+
+    regressions = [row for row in rows if row[5] == "regression"]
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}", file=sys.stderr)
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
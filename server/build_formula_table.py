@@ -0,0 +1,73 @@
+"""
+Builds the precomputed formula table that FormulaService and the PubChem clients
+consult before parsing a formula or calling PubChem.
+
+    python build_formula_table.py                      # app/data/compounds.csv -> app/data/formula_table.bin
+    python build_formula_table.py my_compounds.csv -o /srv/formula_table.bin
+
+The input is a CSV with a `formula` column and optional `cid` and `molar_mass`
+columns. Masses are computed from app/data/atomic_masses.json unless given, and
+the table records which atomic masses it was built from, so it has to be rebuilt
+whenever they change. Point FORMULA_TABLE_PATH at a table outside the repo.
+"""
+import argparse
+import csv
+import json
+import sys
+
+from app.services.formula_service import FormulaService
+from app.utils.formula_parser import canonical_formula
+from app.utils.formula_table import DEFAULT_PATH, KEY_SIZE, write_formula_table
+
+
+def read_rows(path, formula_service):
+    entries, aliases, skipped = {}, {}, 0
+    with open(path, newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            formula = (row.get("formula") or "").strip()
+            try:
+                key = canonical_formula(formula)
+                molar_mass = float(row["molar_mass"]) if row.get("molar_mass") else formula_service.compute_molar_mass(formula)
+            except ValueError as e:
+                print(f"Skipping {formula!r}: {e}", file=sys.stderr)
+                skipped += 1
+                continue
+            if len(key) > KEY_SIZE:
+                print(f"Skipping {formula!r}: canonical form is longer than {KEY_SIZE} characters", file=sys.stderr)
+                skipped += 1
+                continue
+
+            cid = int(row["cid"]) if row.get("cid") else None
+            if key in entries and entries[key][1] is not None and cid is None:
+                cid = entries[key][1]  # a later row without a CID doesn't erase one
+            entries[key] = (molar_mass, cid)
+
+            # Lowercase spellings for input that only fails on case, e.g. "nacl"
+            for spelling in {formula, key}:
+                aliases.setdefault(spelling.lower(), set()).add(key)
+
+    # A lowercase spelling shared by two formulas ("co": CO or Co) is ambiguous
+    unique_aliases = {alias: keys.pop() for alias, keys in aliases.items() if len(keys) == 1}
+    return entries, unique_aliases, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the precomputed formula -> molar mass/CID table")
+    parser.add_argument("input", nargs="?", default="app/data/compounds.csv", help="CSV with formula[,cid][,molar_mass] columns")
+    parser.add_argument("-o", "--output", default=DEFAULT_PATH, help="table file (default: FORMULA_TABLE_PATH or app/data/formula_table.bin)")
+    args = parser.parse_args()
+
+    formula_service = FormulaService()
+    entries, aliases, skipped = read_rows(args.input, formula_service)
+
+    written = write_formula_table(
+        args.output,
+        ((key, molar_mass, cid) for key, (molar_mass, cid) in entries.items()),
+        aliases,
+        formula_service.atomic_masses,
+    )
+    print(json.dumps({"formulas": written, "aliases": len(aliases), "skipped": skipped, "output": args.output}), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
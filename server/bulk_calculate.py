@@ -0,0 +1,63 @@
+"""
+Command-line bulk calculator for large formula files.
+
+    python bulk_calculate.py formulas.csv > masses.csv
+    python bulk_calculate.py formulas.ndjson.gz --output-format csv -o masses.csv
+    cat formulas.txt | python bulk_calculate.py - --format ndjson --save
+
+Input is read and results are written one chunk at a time, so memory use does not
+grow with the file size. Throughput and peak RSS are printed to stderr at the end.
+"""
+import argparse
+import gzip
+import io
+import json
+import sys
+
+from app.services.bulk_calculation_service import BulkCalculationSession, INPUT_FORMATS
+from app.services.formula_service import FormulaService
+
+
+def open_input(path):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def guess_format(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.endswith(".csv") else "ndjson"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calculate molar masses for a large NDJSON/CSV file")
+    parser.add_argument("input", help="input file (.csv, .ndjson, optionally .gz) or - for stdin")
+    parser.add_argument("--format", choices=INPUT_FORMATS, help="input format (default: from the file extension)")
+    parser.add_argument("--output-format", choices=INPUT_FORMATS, help="output format (default: the input format)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--save", action="store_true", help="store results in the formula history")
+    args = parser.parse_args()
+
+    session = BulkCalculationSession(
+        FormulaService(),
+        input_format=args.format or guess_format(args.input),
+        output_format=args.output_format,
+        save=args.save
+    )
+
+    output = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        with open_input(args.input) as lines:
+            for chunk in session.iter_chunks(lines):
+                output.writelines(session.process_lines(chunk))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(json.dumps(session.summary()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Enriches a backlog of history rows with PubChem data, many compounds per request.
+
+    python enrich_history.py                             # rows left pending or failed
+    python enrich_history.py --status failed --batch-size 200
+    python enrich_history.py --skip-physical             # ~100x fewer requests, see below
+
+Properties, synonyms and descriptions are fetched for up to PUBCHEM_BATCH_SIZE CIDs
+per request; classification and experimental sections are still one request per
+compound. --skip-physical leaves those out (no hazard, state or boiling/melting
+point data), and since a compound's first stored payload is kept, they won't be
+filled in later for the compounds created by that run.
+"""
+import argparse
+import json
+import sys
+import time
+
+from app.services.enrichment_service import EnrichmentQueue
+from app.utils.metrics import Metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrich pending/failed history rows with PubChem data")
+    parser.add_argument("--status", nargs="+", default=["pending", "failed"], help="enrichment statuses to pick up")
+    parser.add_argument("--batch-size", type=int, help="distinct formulas per round (default: ENRICHMENT_BACKFILL_BATCH_SIZE)")
+    parser.add_argument("--skip-physical", action="store_true", help="skip the per-compound classification and section requests")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    totals = EnrichmentQueue.backfill(
+        statuses=tuple(args.status),
+        batch_size=args.batch_size,
+        physical_properties=not args.skip_physical
+    )
+    totals["pubchem_requests"] = int(Metrics.total("chemistry_upstream_requests_total"))
+    totals["seconds"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(totals), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Builds the offline compound store that the PubChem clients consult before calling
+PubChem, from the bulk extracts at https://ftp.ncbi.nlm.nih.gov/pubchem/Compound/Extras/.
+
+    python import_compounds.py --mass CID-Mass.gz --title CID-Title.gz --iupac CID-IUPAC.gz \\
+        --smiles CID-SMILES.gz --synonyms CID-Synonym-filtered.gz
+    python import_compounds.py --mass CID-Mass.gz --title CID-Title.gz -o /srv/compound_store.sqlite
+
+Every file is optional and may be gzipped or plain; they are streamed, so memory
+stays at one --chunk-size batch however large the extract. Molar masses are computed
+from app/data/atomic_masses.json. Run it against a fresh output file and point
+LOCAL_COMPOUND_STORE_PATH at a store outside the repo.
+"""
+import argparse
+import gzip
+import json
+import sys
+import time
+
+from app.services.formula_service import FormulaService
+from app.services.local_compound_store import DEFAULT_PATH, MAX_SYNONYMS, CompoundStoreWriter
+
+
+def open_extract(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import PubChem bulk extracts into the local compound store")
+    parser.add_argument("--mass", help="CID-Mass extract (cid, formula, masses)")
+    parser.add_argument("--title", help="CID-Title extract")
+    parser.add_argument("--iupac", help="CID-IUPAC extract")
+    parser.add_argument("--smiles", help="CID-SMILES extract")
+    parser.add_argument("--synonyms", help="CID-Synonym-filtered extract")
+    parser.add_argument("-o", "--output", default=DEFAULT_PATH, help="store file (default: LOCAL_COMPOUND_STORE_PATH or app/data/compound_store.sqlite)")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="rows per transaction")
+    parser.add_argument("--max-synonyms", type=int, default=MAX_SYNONYMS, help="synonyms kept per compound")
+    args = parser.parse_args()
+
+    if not any((args.mass, args.title, args.iupac, args.smiles, args.synonyms)):
+        parser.error("give at least one extract")
+
+    start = time.perf_counter()
+    writer = CompoundStoreWriter(args.output, args.chunk_size)
+    summary = {}
+
+    imports = [
+        ("mass", args.mass, lambda lines: writer.import_masses(lines, FormulaService().atomic_masses)),
+        ("title", args.title, lambda lines: writer.import_column(lines, "title")),
+        ("iupac", args.iupac, lambda lines: writer.import_column(lines, "iupac_name")),
+        ("smiles", args.smiles, lambda lines: writer.import_column(lines, "smiles")),
+        ("synonyms", args.synonyms, lambda lines: writer.import_synonyms(lines, args.max_synonyms)),
+    ]
+    for name, path, load in imports:
+        if not path:
+            continue
+        with open_extract(path) as lines:
+            summary[name] = load(lines)
+        print(f"{name}: {summary[name]['rows']} rows in {summary[name]['seconds']}s "
+              f"({summary[name]['rows_per_sec']} rows/s)", file=sys.stderr)
+
+    summary["names"] = writer.finish()
+    summary["seconds"] = round(time.perf_counter() - start, 2)
+    summary["output"] = args.output
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
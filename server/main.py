@@ -2,20 +2,49 @@ import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 
-from app.config.database_init import create_tables
+from app.config.async_database_config import ASYNC_DATABASE_ENABLED, dispose_async_engine, get_async_engine
+from app.config.database_config import get_engine
+from app.config.pool_config import PoolMetrics
+
+from app.config.database_init import run_schema_check
+from app.services.formula_service import FormulaService
+from app.services.pubchem_async_service import AsyncPubChemService
+from app.services.enrichment_service import EnrichmentQueue
+from app.services.history_write_buffer import HistoryWriteBuffer
+from app.services.pubchem_cache_service import PubChemCache
+from app.services.pubchem_service import PubChemService
+from app.services.local_compound_store import LocalCompoundStore
+from app.services.autocomplete_service import AutocompleteIndex
+from app.services.retention_service import RetentionService
+from app.utils.metrics import METRICS_ENABLED, Metrics, MetricsMiddleware, snapshot_lines
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup logic
     print("Starting up the Chemistry API...")
-    create_tables()
+    run_schema_check()
+    FormulaService()  # loads the atomic masses and formula table, once per process
+    if ASYNC_DATABASE_ENABLED:
+        get_async_engine()  # fails here, not on the first request, if the asyncio driver is missing
+    EnrichmentQueue.start()
+    HistoryWriteBuffer.start()
+    AutocompleteIndex.start()  # loads in the background; suggestions fill in as it goes
+    RetentionService.start()  # archives and deletes expired history, if enabled
     
     yield  # This is where FastAPI serves requests
     
     # Shutdown logic
     print("Shutting down the Chemistry API...")
+    RetentionService.stop()
+    EnrichmentQueue.stop()
+    HistoryWriteBuffer.stop()  # writes out anything still buffered
+    await AsyncPubChemService.aclose()
+    await dispose_async_engine()
 
 
 app = FastAPI(
@@ -33,16 +62,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if METRICS_ENABLED:
+    # Added last so it wraps everything, including CORS
+    app.add_middleware(MetricsMiddleware)
+
 
 @app.get("/", tags=["Health Check"])
 async def read_root():
     return {
         "status": "success", 
         "message":"Welcome to the chemistry API. Visit /docs for API documentation."}
+
+
+@app.get("/health/db", tags=["Health Check"])
+def database_health():
+    # Connectivity plus pool metrics: checkout wait, connections in use, overflow events
+    engine = get_engine()
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        status, detail = "success", None
+    except SQLAlchemyError as e:
+        status, detail = "error", str(e)
+    return {"status": status, "detail": detail, "pool": PoolMetrics.stats(engine)}
+
+
+@app.get("/metrics", tags=["Health Check"], response_class=PlainTextResponse)
+def metrics():
+    # Prometheus scrape endpoint: request, stage, upstream and query histograms,
+    # plus the pool, PubChem cache and circuit breaker counters
+    breaker = PubChemService._breaker.stats()
+    snapshots = snapshot_lines(
+        "chemistry_db_pool", PoolMetrics.stats(get_engine()),
+        counters=("checkouts", "overflow_events", "timeouts", "stale_connections", "checkout_wait_ms_total")
+    ) + snapshot_lines(
+        "chemistry_pubchem_cache", PubChemCache.stats(),
+        counters=("memory_hits", "db_hits", "negative_hits", "misses", "evictions", "stores")
+    ) + snapshot_lines(
+        "chemistry_pubchem_breaker", {**breaker, "open": int(breaker["state"] != "closed")},
+        counters=("opened", "rejected")
+    ) + snapshot_lines(
+        "chemistry_local_store", LocalCompoundStore.stats(), counters=("hits", "misses")
+    ) + snapshot_lines(
+        "chemistry_history_retention", RetentionService.stats(),
+        counters=("runs", "failed_runs", "skipped_runs", "rows_archived", "rows_deleted", "partitions_dropped", "archive_bytes")
+    )
+    return PlainTextResponse(Metrics.render(snapshots), media_type="text/plain; version=0.0.4")
     
 
 # Import and include routers  
 from app.routes.formula_routes import router as formula_router
+if ASYNC_DATABASE_ENABLED:
+    # Registered first, so its async handlers serve the database-bound paths
+    from app.routes.formula_async_routes import router as formula_async_router
+    app.include_router(formula_async_router)
 app.include_router(formula_router)
 
 
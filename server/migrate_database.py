@@ -0,0 +1,61 @@
+"""
+One-off data migrations that are too slow or too destructive for the startup schema check.
+
+    python migrate_database.py --dry-run                 # report what would be done, change nothing
+    python migrate_database.py --drop-legacy-columns     # drop the old PubChem columns of `formulas`
+    python migrate_database.py --canonicalize-compounds  # fill in Hill formulas, merge compounds by CID
+
+--drop-legacy-columns first finishes moving the PubChem data of old history rows
+into `compounds` (the schema check does the same at startup), then checks every
+row against its compound, and only drops the columns if nothing would be lost.
+Dropping columns cannot be undone: back up the database first.
+
+--canonicalize-compounds fills in the Hill formula of compounds stored before
+it had a column, and merges shared compounds that PubChem resolved to the same
+CID under different spellings ("NaCl", "ClNa"). Compounds with different CIDs
+are never merged, even when they share a Hill formula (isomers do).
+"""
+import argparse
+import json
+import sys
+import time
+
+from app.config.database_init import (
+    canonicalize_compound_keys,
+    drop_legacy_columns,
+    legacy_property_columns,
+    migrate_legacy_properties,
+    verify_legacy_properties,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one-off data migrations")
+    parser.add_argument("--drop-legacy-columns", action="store_true", help="drop the PubChem columns of formulas once their data is verified in compounds")
+    parser.add_argument("--canonicalize-compounds", action="store_true", help="fill in Hill formulas and merge compounds with the same CID")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be done")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows per transaction (default: 5000)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    totals = {"legacy_columns": legacy_property_columns()}
+    if args.dry_run:
+        totals["unverified_rows"] = verify_legacy_properties(args.chunk_size)
+        if args.canonicalize_compounds:
+            totals.update(canonicalize_compound_keys(args.chunk_size, dry_run=True))
+    else:
+        totals["rows_migrated"] = migrate_legacy_properties(args.chunk_size)
+        if args.drop_legacy_columns:
+            try:
+                totals["dropped_columns"] = drop_legacy_columns(args.chunk_size)
+            except RuntimeError as e:
+                print(str(e), file=sys.stderr)
+                sys.exit(1)
+        if args.canonicalize_compounds:
+            totals.update(canonicalize_compound_keys(args.chunk_size))
+    totals["seconds"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(totals), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Rebuilds the usage rollups behind /api/formula/stats from the history table.
+
+    python rebuild_usage_stats.py                        # after upgrading, or if the rollups drifted
+    python rebuild_usage_stats.py --chunk-size 20000
+
+The rollups are emptied and recomputed in chunks of history rows. Rows written
+while it runs are counted by the app as usual and are not read again, so it can
+run against a live database; the stats read low until it finishes.
+"""
+import argparse
+import json
+import sys
+import time
+
+from app.config.database_config import Base, SessionLocal, get_engine
+from app.models.UsageStatsModel import DailyClient, FormulaUsage, UsageBucket
+from app.services.usage_stats_service import UsageStatsService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the usage rollup tables from the formula history")
+    parser.add_argument("--chunk-size", type=int, help="history rows per transaction (default: USAGE_STATS_REBUILD_CHUNK_SIZE)")
+    args = parser.parse_args()
+
+    # The app creates these at startup; create them here too in case it hasn't run since the upgrade
+    Base.metadata.create_all(bind=get_engine(), tables=[FormulaUsage.__table__, UsageBucket.__table__, DailyClient.__table__])
+
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        totals = UsageStatsService.rebuild(db, args.chunk_size)
+    finally:
+        db.close()
+    totals["seconds"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(totals), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
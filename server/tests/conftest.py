@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads its database URL at import time, so point it at a scratch SQLite file first
+_DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="molar_mass_tests_"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DATABASE_PATH}"
+os.environ["LOCAL_COMPOUND_STORE_ENABLED"] = "false"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+from app.config.database_config import SessionLocal, get_engine  # noqa: E402
+from app.config.database_init import create_tables  # noqa: E402
+from app.services.compound_service import CompoundService  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    # Every test starts from freshly created, empty tables
+    engine = get_engine()
+    with engine.begin() as conn:
+        tables = conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+            "AND name NOT LIKE 'compounds_fts_%'"
+        )).scalars().all()
+        for table in tables:
+            conn.execute(text(f'DROP TABLE IF EXISTS "{table}"'))
+    create_tables()
+    CompoundService.clear()
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,77 @@
+import random
+import string
+
+import pytest
+from sqlalchemy import text
+
+from app.services.autocomplete_service import AutocompleteIndex
+from app.utils.prefix_trie import PrefixTrie
+
+
+def test_prefixes_above_and_below_the_trie_levels():
+    trie = PrefixTrie(depth=2)
+    for key in ["water", "watermelon", "wax", "Sodium chloride", "sodium", "W"]:
+        trie.add(key, key)
+
+    assert trie.complete("w") == ["W", "water", "watermelon", "wax"]
+    assert trie.complete("wa") == ["water", "watermelon", "wax"]
+    assert trie.complete("wat") == ["water", "watermelon"]
+    assert trie.complete("WATERM") == ["watermelon"]
+    assert trie.complete("sodium c") == ["Sodium chloride"]
+    assert trie.complete("sodium") == ["sodium", "Sodium chloride"]
+    assert trie.complete("x") == []
+    assert trie.complete("") == []
+
+
+def test_limit_and_duplicates():
+    trie = PrefixTrie()
+    assert trie.add("water", 1)
+    assert not trie.add("Water ", 1)  # same (key, value) after normalization
+    assert trie.add("water", 2)
+    for index in range(20):
+        trie.add(f"water{index:02d}", index)
+
+    assert len(trie) == 22
+    assert trie.complete("water", limit=3) == [1, 2, 0]
+    assert trie.complete("wat", limit=0) == []
+
+
+@pytest.mark.parametrize("depth", [1, 3, 5])
+def test_matches_a_linear_scan(depth):
+    generator = random.Random(depth)
+    keys = {"".join(generator.choice("abc") for _ in range(generator.randint(1, 7))) for _ in range(500)}
+    trie = PrefixTrie(depth=depth)
+    for key in keys:
+        trie.add(key, key)
+
+    for prefix in ["a", "ab", "abc", "abca", "cbacb", "ccccccc"]:
+        expected = sorted(key for key in keys if key.startswith(prefix))[:10]
+        assert trie.complete(prefix) == expected
+
+
+def test_index_loads_compounds_and_history_but_not_private_copies(db):
+    db.execute(text(
+        "INSERT INTO compounds (formula_key, common_name, synonyms) VALUES "
+        "('H2O', 'water', 'dihydrogen oxide; oxidane'), ('row:1', 'watery steam', NULL)"
+    ))
+    db.execute(text("INSERT INTO formulas (formula, molar_mass) VALUES ('H2O2', 34.01)"))
+    db.commit()
+    AutocompleteIndex.clear()
+    try:
+        AutocompleteIndex._load()
+
+        assert AutocompleteIndex.complete("wat") == [{"text": "water", "formula": "H2O"}]
+        assert AutocompleteIndex.complete("oxi") == [{"text": "oxidane", "formula": "H2O"}]
+        assert [match["formula"] for match in AutocompleteIndex.complete("H2O")] == ["H2O", "H2O2"]
+    finally:
+        AutocompleteIndex.clear()
+
+
+def test_new_compounds_are_completable_at_once():
+    AutocompleteIndex.clear()
+    try:
+        AutocompleteIndex.add_compound("NaCl", {"common_name": "sodium chloride", "synonyms": "salt; halite"})
+        assert AutocompleteIndex.complete("hal") == [{"text": "halite", "formula": "NaCl"}]
+        assert AutocompleteIndex.complete("sodium") == [{"text": "sodium chloride", "formula": "NaCl"}]
+    finally:
+        AutocompleteIndex.clear()
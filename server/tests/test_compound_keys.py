@@ -0,0 +1,21 @@
+from app.models.CompoundModel import Compound
+from app.services.compound_service import CompoundService
+
+
+def test_isomers_get_their_own_compounds(db):
+    ids = CompoundService.get_compound_ids(db, {
+        "CH3CH2OH": {"formula": "C2H6O", "cid": 702, "common_name": "ethanol"},
+        "CH3OCH3": {"formula": "C2H6O", "cid": 8254, "common_name": "dimethyl ether"},
+    })
+    db.commit()
+
+    assert ids["CH3CH2OH"] != ids["CH3OCH3"]
+    assert {compound.hill_formula for compound in db.query(Compound)} == {"C2H6O"}
+
+
+def test_spellings_with_the_same_cid_share_a_compound(db):
+    first = CompoundService.get_compound_id(db, "NaCl", {"formula": "ClNa", "cid": 5234, "common_name": "sodium chloride"})
+    db.commit()
+
+    assert CompoundService.get_compound_id(db, "ClNa", {"formula": "ClNa", "cid": 5234, "common_name": "sodium chloride"}) == first
+    assert db.query(Compound).count() == 1
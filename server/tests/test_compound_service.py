@@ -0,0 +1,67 @@
+from app.models.CompoundModel import Compound
+from app.models.FormulaHistoryModel import FormulaHistory
+from app.services.compound_service import CompoundService
+from app.services.formula_history_service import FormulaHistoryService
+
+
+WATER = {"formula": "H2O", "cid": 962, "common_name": "water", "boiling_point": "100 °C"}
+
+
+def test_editing_one_row_leaves_rows_sharing_its_compound_alone(db):
+    FormulaHistoryService.create_formula_entries(db, [
+        {"formula": "H2O", "molar_mass": 18.015, "properties": WATER},
+        {"formula": "H2O", "molar_mass": 18.015, "properties": WATER},
+    ])
+    first, second = db.query(FormulaHistory).order_by(FormulaHistory.id).all()
+    shared_id = first.compound_id
+    assert second.compound_id == shared_id
+
+    FormulaHistoryService.update_formula_entry(db, first.id, {"common_name": "steam"})
+    db.expire_all()
+
+    first, second = db.query(FormulaHistory).order_by(FormulaHistory.id).all()
+    assert first.common_name == "steam"
+    assert first.compound_id != shared_id
+    assert second.common_name == "water"
+    assert second.compound_id == shared_id
+    assert db.get(Compound, first.compound_id).formula_key == CompoundService.private_key(first.id)
+
+    # New rows of the formula still share the original compound
+    FormulaHistoryService.create_formula_entries(db, [{"formula": "H2O", "molar_mass": 18.015, "properties": WATER}])
+    assert db.query(FormulaHistory).order_by(FormulaHistory.id.desc()).first().compound_id == shared_id
+
+
+def test_later_edits_update_the_rows_private_copy(db):
+    FormulaHistoryService.create_formula_entries(db, [{"formula": "H2O", "molar_mass": 18.015, "properties": WATER}])
+    row_id = db.query(FormulaHistory.id).scalar()
+
+    FormulaHistoryService.update_formula_entry(db, row_id, {"common_name": "steam"})
+    private_id = db.query(FormulaHistory.compound_id).scalar()
+    FormulaHistoryService.update_formula_entry(db, row_id, {"common_name": "ice"})
+
+    assert db.query(FormulaHistory.compound_id).scalar() == private_id
+    assert db.get(Compound, private_id).common_name == "ice"
+    assert db.query(Compound).count() == 2
+
+
+def test_compound_insert_rolls_back_with_the_callers_transaction(db):
+    compound_id = CompoundService.get_compound_id(db, "H2O", WATER)
+    assert compound_id is not None
+    db.rollback()
+
+    assert db.query(Compound).count() == 0
+    assert CompoundService.get_compound_id(db, "H2O", WATER) is not None
+    db.commit()
+    assert db.query(Compound).count() == 1
+
+
+
+def test_incomplete_payloads_are_not_stored(db):
+    # What a lookup returns when the properties request failed: just the CID and URLs
+    failed = {"cid": 962, "structure_image_url": "https://pubchem.ncbi.nlm.nih.gov/image/imgsrv.fcgi?cid=962"}
+    assert CompoundService.get_compound_id(db, "H2O", failed) is None
+    db.commit()
+    assert db.query(Compound).count() == 0
+
+    # A later complete lookup still creates the shared compound
+    assert CompoundService.get_compound_id(db, "H2O", WATER) is not None
@@ -0,0 +1,39 @@
+from app.models.FormulaHistoryModel import FormulaHistory
+from app.services.enrichment_service import EnrichmentQueue
+from app.services.formula_history_service import FormulaHistoryService
+from app.services.pubchem_cache_service import PubChemCache
+from app.services.pubchem_service import PubChemService
+
+
+def _pending_row(db, formula):
+    formula_id = FormulaHistoryService.insert_formula_entry(db, formula, 46.07, enrichment_status="pending")
+    key = PubChemCache.normalize_formula(formula)
+    EnrichmentQueue._in_flight[key] = [formula_id]
+    return key, formula_id
+
+
+def test_incomplete_payload_fails_the_row_instead_of_completing_it(db, monkeypatch):
+    # What a lookup that lost its properties request used to return
+    monkeypatch.setattr(PubChemService, "get_chemical_properties", lambda formula, raise_errors=False: {
+        "cid": 702, "structure_image_url": "https://pubchem.ncbi.nlm.nih.gov/image/imgsrv.fcgi?cid=702",
+    })
+    key, formula_id = _pending_row(db, "C2H6O")
+
+    EnrichmentQueue._process(key, "C2H6O", EnrichmentQueue.MAX_RETRIES)
+
+    db.expire_all()
+    row = db.get(FormulaHistory, formula_id)
+    assert row.enrichment_status == "failed"
+    assert row.compound_id is None
+
+
+def test_unknown_formula_completes_without_a_compound(db, monkeypatch):
+    monkeypatch.setattr(PubChemService, "get_chemical_properties", lambda formula, raise_errors=False: {})
+    key, formula_id = _pending_row(db, "Xx2")
+
+    EnrichmentQueue._process(key, "Xx2", EnrichmentQueue.MAX_RETRIES)
+
+    db.expire_all()
+    row = db.get(FormulaHistory, formula_id)
+    assert row.enrichment_status == "complete"
+    assert row.compound_id is None
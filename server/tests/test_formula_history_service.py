@@ -0,0 +1,23 @@
+from app.models.FormulaHistoryModel import FormulaHistory
+from app.services.formula_history_service import FormulaHistoryService
+
+
+WATER = {"formula": "H2O", "cid": 962, "common_name": "water"}
+
+
+def test_put_cannot_set_server_owned_columns(db):
+    FormulaHistoryService.create_formula_entries(db, [{"formula": "H2O", "molar_mass": 99.0, "properties": WATER}])
+    row = db.query(FormulaHistory).one()
+    row_id, compound_id, version = row.id, row.compound_id, row.version
+
+    FormulaHistoryService.update_formula_entry(db, row_id, {
+        "molar_mass": 18.015, "id": 500, "version": version, "compound_id": None, "enrichment_status": "failed",
+    })
+    db.expire_all()
+
+    row = db.get(FormulaHistory, row_id)
+    assert row.molar_mass == 18.015
+    assert row.version == version + 1
+    assert row.compound_id == compound_id
+    assert row.enrichment_status is None
+    assert db.get(FormulaHistory, 500) is None
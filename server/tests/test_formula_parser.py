@@ -0,0 +1,57 @@
+import pytest
+
+from app.services.formula_service import FormulaService
+from app.utils.formula_parser import canonical_formula, hill_formula, parse_formula
+
+
+@pytest.mark.parametrize("formula, composition", [
+    ("H2O", {"H": 2, "O": 1}),
+    ("CH3COOH", {"C": 2, "H": 4, "O": 2}),
+    ("Ca(OH)2", {"Ca": 1, "O": 2, "H": 2}),
+    ("K4[Fe(CN)6]", {"K": 4, "Fe": 1, "C": 6, "N": 6}),
+    ("[Co(NH3)6]Cl3", {"Co": 1, "N": 6, "H": 18, "Cl": 3}),
+    ("Mg3(PO4)2", {"Mg": 3, "P": 2, "O": 8}),
+])
+def test_groups_and_nested_brackets(formula, composition):
+    assert parse_formula(formula).as_dict() == composition
+
+
+@pytest.mark.parametrize("formula", ["CuSO4·5H2O", "CuSO4•5H2O", "CuSO4.5H2O", "CuSO4*5H2O", "CuSO4 · 5 H2O"])
+def test_hydrate_separators(formula):
+    assert parse_formula(formula).as_dict() == {"Cu": 1, "S": 1, "O": 9, "H": 10}
+
+
+@pytest.mark.parametrize("formula, charge", [
+    ("SO4^2-", -2), ("NH4+", 1), ("Fe+3", 3), ("O--", -2), ("PO4^3-", -3), ("H2O", 0),
+])
+def test_charges(formula, charge):
+    assert parse_formula(formula).charge == charge
+
+
+@pytest.mark.parametrize("formula", ["H 2 O", "H2 O", " H2O ", "Na Cl"])
+def test_whitespace_is_ignored(formula):
+    assert parse_formula(formula) == parse_formula("".join(formula.split()))
+
+
+@pytest.mark.parametrize("formula", [
+    "", "h2o", "2H2O", "H2O)", "(H2O", "[Fe(CN)6)", "·H2O", "CuSO4·", "CuSO4··H2O", "SO4^2-+", "H2O-Na", "H$O",
+])
+def test_invalid_input(formula):
+    with pytest.raises(ValueError):
+        parse_formula(formula)
+
+
+def test_hill_order():
+    assert hill_formula(parse_formula("CH3CH2OH")) == "C2H6O"
+    assert hill_formula(parse_formula("NaCl")) == "ClNa"
+    assert hill_formula(parse_formula("SO4^2-")) == "O4S-2"
+    assert canonical_formula("H O H") == "H2O"
+
+
+def test_formula_table_aliases():
+    # Spellings that only fail on case are looked up in the formula table
+    service = FormulaService()
+    if service.formula_table is None:
+        pytest.skip("no formula table")
+    assert service.calculate_molar_mass("nacl") == pytest.approx(58.44, abs=0.01)
+    assert service.calculate_molar_mass("H 2 O") == pytest.approx(18.015, abs=0.001)
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+from starlette.requests import Request
+
+from app.controllers.formula_controller import FormulaController
+from app.models.FormulaHistoryModel import FormulaHistory
+from app.services.formula_history_service import FormulaHistoryService
+from app.services.recent_response_cache import RecentResponseCache
+from app.utils.http_cache import CACHE_CONTROL, etag_matches, make_etag, not_modified
+
+
+WATER = {"formula": "H2O", "cid": 962, "common_name": "water"}
+
+
+def _request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match is not None else []
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": headers})
+
+
+@pytest.fixture
+def controller():
+    RecentResponseCache.clear()
+    yield FormulaController()
+    RecentResponseCache.clear()
+
+
+def _add(db, formula="H2O"):
+    FormulaHistoryService.create_formula_entries(db, [{"formula": formula, "molar_mass": 18.015, "properties": WATER}])
+
+
+def test_make_etag_is_a_stable_strong_validator():
+    etag = make_etag("formula", (1, "2026-01-01 00:00:00", 1, None))
+    assert etag == make_etag("formula", (1, "2026-01-01 00:00:00", 1, None))
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag != make_etag("formula", (1, "2026-01-01 00:00:00", 2, None))
+    assert make_etag("history", 0, 10) != make_etag("history", 0, 11)
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ("", False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", "abc"', True),
+    ('"xyz",W/"abc"', True),
+    ("*", True),
+    ('"xyz"', False),
+    ("abc", False),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(_request(header), '"abc"') is matches
+
+
+def test_not_modified_has_no_body_and_keeps_the_validators():
+    response = not_modified('"abc"')
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == '"abc"'
+    assert response.headers["cache-control"] == CACHE_CONTROL
+
+
+def test_formula_by_id_revalidates_until_the_row_changes(db, controller):
+    _add(db)
+    row_id = db.query(FormulaHistory.id).scalar()
+
+    response = controller.get_formula_by_id(row_id, db, _request())
+    assert response.status_code == 200
+    assert json.loads(response.body)["formula"] == "H2O"
+    etag = response.headers["etag"]
+
+    assert controller.get_formula_by_id(row_id, db, _request(etag)).status_code == 304
+
+    FormulaHistoryService.update_formula_entry(db, row_id, {"molar_mass": 18.0})
+    response = controller.get_formula_by_id(row_id, db, _request(etag))
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.parametrize("fetch", [
+    lambda controller, db, request: controller.get_recent_formulas(db, request),
+    lambda controller, db, request: controller.get_formula_history(db, request, 0, 10),
+    lambda controller, db, request: controller.get_formula_history_page(db, request, None, 10),
+])
+def test_history_listings_revalidate_until_a_row_is_added(db, controller, fetch):
+    _add(db)
+    etag = fetch(controller, db, _request()).headers["etag"]
+    assert fetch(controller, db, _request(etag)).status_code == 304
+
+    _add(db, "H2O2")
+    response = fetch(controller, db, _request(etag))
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_views_have_their_own_etags(db, controller):
+    _add(db)
+    full = controller.get_formula_history(db, _request(), 0, 10, view="full").headers["etag"]
+    summary = controller.get_formula_history(db, _request(), 0, 10, view="summary").headers["etag"]
+    assert full != summary
+    assert controller.get_formula_history(db, _request(full), 0, 10, view="summary").status_code == 200
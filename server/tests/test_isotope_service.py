@@ -0,0 +1,67 @@
+import pytest
+
+from app.services.isotope_service import (
+    ELECTRON_MASS,
+    IsotopeService,
+    convolve,
+    element_distribution,
+    formula_distribution,
+    single_atom,
+)
+
+
+def test_water_masses():
+    pattern = IsotopeService.isotope_pattern("H2O")
+    assert pattern.monoisotopic_mass == pytest.approx(18.01056, abs=1e-5)
+    assert pattern.average_mass == pytest.approx(18.015, abs=1e-3)
+    assert pattern.nominal_mass == 18
+    assert pattern.peaks[0][1] == pytest.approx(100.0)
+
+
+def test_chlorine_pattern():
+    peaks = IsotopeService.isotope_pattern("Cl2").peaks
+    assert [round(mass) for mass, _, _ in peaks] == [70, 72, 74]
+    assert peaks[1][1] == pytest.approx(64.0, abs=0.5)  # 35Cl37Cl relative to 35Cl2
+    assert sum(probability for _, _, probability in peaks) == pytest.approx(1.0, abs=1e-6)
+
+
+def test_charged_formula_reports_mz():
+    sulfate = IsotopeService.isotope_pattern("SO4^2-")
+    neutral = IsotopeService.isotope_pattern("SO4")
+    assert sulfate.charge == -2
+    assert sulfate.monoisotopic_mass == pytest.approx((neutral.monoisotopic_mass + 2 * ELECTRON_MASS) / 2)
+
+
+def test_same_composition_in_any_order():
+    assert IsotopeService.isotope_pattern("OH2").peaks == IsotopeService.isotope_pattern("H2O").peaks
+
+
+def test_repeated_squaring_matches_sequential_convolution():
+    sequential = single_atom("C")
+    for _ in range(6):
+        sequential = convolve(sequential, single_atom("C"))
+    squared = element_distribution("C", 7)
+    assert [nominal for nominal, _, _ in squared] == [nominal for nominal, _, _ in sequential]
+    for (_, probability, mass), (_, expected_probability, expected_mass) in zip(squared, sequential):
+        assert probability == pytest.approx(expected_probability)
+        assert mass == pytest.approx(expected_mass)
+
+
+def test_pruning_keeps_large_formulas_bounded():
+    small = formula_distribution((("C", 2000), ("H", 4002)))
+    large = formula_distribution((("C", 20000), ("H", 40002)))
+    # Unpruned, C20000H40002 has tens of thousands of nominal masses; pruned, the peak
+    # count grows like the square root of the atom count
+    assert len(large) < 4 * len(small)
+    assert len(large) < 300
+    assert sum(probability for _, probability, _ in large) == pytest.approx(1.0, abs=1e-9)
+
+
+def test_elements_without_natural_isotopes_are_estimated():
+    assert IsotopeService.isotope_pattern("Tc2").estimated_elements == ["Tc"]
+
+
+@pytest.mark.parametrize("formula", ["Xx2", "H2O)"])
+def test_invalid_formulas(formula):
+    with pytest.raises(ValueError):
+        IsotopeService.isotope_pattern(formula)
@@ -0,0 +1,119 @@
+import pytest
+from sqlalchemy import text
+
+from app.config.database_init import (
+    canonicalize_compound_keys,
+    drop_legacy_columns,
+    legacy_property_columns,
+    migrate_legacy_properties,
+    verify_legacy_properties,
+)
+from app.models.CompoundModel import Compound
+from app.models.FormulaHistoryModel import FormulaHistory
+from app.services.compound_service import CompoundService
+
+
+LEGACY_ROWS = [
+    # formula, common_name, boiling_point
+    ("H2O", "water", "100 °C"),
+    ("H2O", "water", "100 °C"),
+    ("H2O", "steam", "100 °C"),  # edited on the old schema
+    ("NaCl", "sodium chloride", "1413 °C"),
+    ("CO2", None, None),  # never had PubChem data
+    ("NaCl", "sodium chloride", "1413 °C"),
+]
+
+
+@pytest.fixture
+def legacy_db(db):
+    # `formulas` as it was before compounds had their own table
+    db.execute(text("ALTER TABLE formulas ADD COLUMN common_name VARCHAR(255)"))
+    db.execute(text("ALTER TABLE formulas ADD COLUMN boiling_point VARCHAR(100)"))
+    db.execute(
+        text("INSERT INTO formulas (formula, molar_mass, common_name, boiling_point) VALUES (:formula, 1.0, :name, :boiling)"),
+        [{"formula": formula, "name": name, "boiling": boiling} for formula, name, boiling in LEGACY_ROWS],
+    )
+    db.commit()
+    return db
+
+
+def _linked_names(db):
+    rows = db.query(FormulaHistory).order_by(FormulaHistory.id).all()
+    return [(row.compound_id is not None, row.common_name) for row in rows]
+
+
+def test_migrate_legacy_properties_keeps_every_payload(legacy_db):
+    assert legacy_property_columns() == ["boiling_point", "common_name"]
+    assert migrate_legacy_properties(chunk_size=2) == 5
+
+    legacy_db.expire_all()
+    assert _linked_names(legacy_db) == [
+        (True, "water"), (True, "water"), (True, "steam"), (True, "sodium chloride"), (False, None), (True, "sodium chloride"),
+    ]
+    rows = legacy_db.query(FormulaHistory).order_by(FormulaHistory.id).all()
+    assert rows[0].compound_id == rows[1].compound_id
+    assert rows[3].compound_id == rows[5].compound_id
+    assert legacy_db.get(Compound, rows[2].compound_id).formula_key == CompoundService.private_key(rows[2].id)
+    assert verify_legacy_properties() == 0
+
+    # The columns are only dropped on request, and stay otherwise
+    assert legacy_property_columns() == ["boiling_point", "common_name"]
+    assert drop_legacy_columns() == ["boiling_point", "common_name"]
+    assert legacy_property_columns() == []
+
+
+def test_interrupted_migration_resumes_without_duplicates(legacy_db, monkeypatch):
+    get_compound_ids = CompoundService.get_compound_ids
+    calls = []
+
+    def fail_on_second_chunk(db, properties_by_formula):
+        calls.append(properties_by_formula)
+        if len(calls) == 2:
+            raise RuntimeError("interrupted")
+        return get_compound_ids(db, properties_by_formula)
+
+    monkeypatch.setattr(CompoundService, "get_compound_ids", fail_on_second_chunk)
+    with pytest.raises(RuntimeError):
+        migrate_legacy_properties(chunk_size=2)
+    legacy_db.expire_all()
+    assert [linked for linked, _ in _linked_names(legacy_db)] == [True, True, False, False, False, False]
+
+    monkeypatch.setattr(CompoundService, "get_compound_ids", get_compound_ids)
+    assert migrate_legacy_properties(chunk_size=2) == 3
+    legacy_db.expire_all()
+    assert [linked for linked, _ in _linked_names(legacy_db)] == [True, True, True, True, False, True]
+    # One compound each for H2O and NaCl, plus the private copy for "steam"
+    assert legacy_db.query(Compound).count() == 3
+    assert verify_legacy_properties() == 0
+
+
+def test_drop_legacy_columns_refuses_while_payloads_are_unverified(legacy_db):
+    with pytest.raises(RuntimeError):
+        drop_legacy_columns()
+    assert legacy_property_columns() == ["boiling_point", "common_name"]
+
+
+def test_canonicalize_compound_keys_merges_by_cid_only(db):
+    db.execute(text(
+        "INSERT INTO compounds (id, formula_key, cid, common_name) VALUES "
+        "(1, 'NaCl', 5234, 'sodium chloride'), (2, 'ClNa', 5234, 'sodium chloride'), "
+        "(3, 'CH3CH2OH', 702, 'ethanol'), (4, 'CH3OCH3', 8254, 'dimethyl ether'), "
+        "(5, 'row:9', 5234, 'table salt')"
+    ))
+    db.execute(text("INSERT INTO formulas (id, formula, molar_mass, compound_id) VALUES (8, 'ClNa', 58.44, 2), (9, 'NaCl', 58.44, 5)"))
+    db.commit()
+
+    assert canonicalize_compound_keys(dry_run=True) == {"hill_formulas": 4, "compounds_merged": 1}
+    assert db.query(Compound).count() == 5
+
+    assert canonicalize_compound_keys(chunk_size=2) == {"hill_formulas": 4, "compounds_merged": 1}
+    db.expire_all()
+    compounds = {compound.id: compound for compound in db.query(Compound)}
+    assert sorted(compounds) == [1, 3, 4, 5]
+    assert [compounds[i].formula_key for i in (1, 3, 4, 5)] == ["NaCl", "CH3CH2OH", "CH3OCH3", "row:9"]
+    # Isomers share a Hill formula but keep their compounds
+    assert compounds[3].hill_formula == compounds[4].hill_formula == "C2H6O"
+    assert dict(db.query(FormulaHistory.id, FormulaHistory.compound_id).all()) == {8: 1, 9: 5}
+
+    # Nothing left to do on a second run
+    assert canonicalize_compound_keys() == {"hill_formulas": 0, "compounds_merged": 0}
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from app.services.formula_history_service import FormulaHistoryService
+from app.utils.pagination import decode_cursor, encode_cursor
+
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def _insert(db, seconds):
+    # One row per offset; equal offsets share a timestamp, so id has to break the tie.
+    # Stored as text without fractional seconds, the way CURRENT_TIMESTAMP writes them
+    db.execute(text("INSERT INTO formulas (formula, molar_mass, timestamp) VALUES (:formula, 1.0, :timestamp)"), [
+        {"formula": f"C{index + 1}H4", "timestamp": str(START + timedelta(seconds=offset))}
+        for index, offset in enumerate(seconds)
+    ])
+    db.commit()
+
+
+def _walk(db, limit, view="full", between_pages=None):
+    ids, cursor = [], None
+    while True:
+        rows, cursor = FormulaHistoryService.get_formula_history_page(db, cursor, limit, view)
+        ids.extend(row.id for row in rows)
+        if cursor is None:
+            return ids
+        if between_pages is not None:
+            between_pages()
+
+
+def _newest_first(db):
+    return [row.id for row in FormulaHistoryService.get_formula_history(db, limit=1000)]
+
+
+def test_pages_cover_every_row_once_in_order(db):
+    _insert(db, [0, 1, 1, 1, 2, 3, 3, 4, 5, 5, 5, 5, 6, 7, 8, 9, 9, 10, 11, 12, 13])
+    expected = _newest_first(db)
+
+    for limit in (1, 3, 4, 7, 21, 50):
+        assert _walk(db, limit) == expected
+    assert _walk(db, 4, view="summary") == expected
+
+
+def test_cursors_are_stable_across_inserts(db):
+    _insert(db, range(20))
+    expected = _newest_first(db)
+    offsets = iter(range(100, 200))
+
+    # Newer rows arriving while a client pages through don't shift or repeat what it sees
+    ids = _walk(db, 6, between_pages=lambda: _insert(db, [next(offsets)] * 3))
+    assert ids == expected
+
+
+def test_last_page_has_no_cursor(db):
+    _insert(db, range(5))
+    rows, cursor = FormulaHistoryService.get_formula_history_page(db, None, 5)
+    assert len(rows) == 5
+    assert cursor is None
+
+
+def test_cursor_round_trip():
+    timestamp = datetime(2026, 3, 4, 5, 6, 7, 890000)
+    assert decode_cursor(encode_cursor(timestamp, 42)) == (timestamp, 42)
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "W10", encode_cursor(START, 1)[:-3] + "!!!"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.services.pubchem_async_service import AsyncPubChemService
+from app.services.pubchem_cache_service import PubChemCache
+from app.services.pubchem_service import PubChemService
+from app.utils.resilience import CircuitOpenError
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, data=None):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+CID_ANSWER = {"IdentifierList": {"CID": [962]}}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(db):
+    PubChemCache.clear()
+    yield
+    PubChemCache.clear()
+
+
+def test_open_breaker_during_the_properties_request_is_not_a_finished_lookup(monkeypatch):
+    def get(url, endpoint, deadline):
+        if endpoint == "cid":
+            return FakeResponse(200, CID_ANSWER)
+        raise CircuitOpenError("PubChem circuit breaker is open")
+
+    monkeypatch.setattr(PubChemService, "_get", get)
+    with pytest.raises(CircuitOpenError):
+        PubChemService.get_chemical_properties("H2O", raise_errors=True)
+
+    # Without raise_errors the caller gets no data rather than just the CID and URLs, and nothing is cached
+    assert PubChemService.get_chemical_properties("H2O") == {}
+    assert PubChemCache.get("H2O") is None
+
+
+def test_failed_properties_request_propagates_from_the_async_client(monkeypatch):
+    async def get_json(url, endpoint, deadline):
+        if endpoint == "cid":
+            return 200, CID_ANSWER
+        if endpoint == "properties":
+            return 503, None
+        return 404, None
+
+    monkeypatch.setattr(AsyncPubChemService, "_get_json", get_json)
+    assert asyncio.run(AsyncPubChemService.get_chemical_properties("H2O")) == {}
+    assert PubChemCache.get("H2O") is None
+
+
+def test_failed_batch_properties_request_leaves_its_formulas_out(monkeypatch):
+    cids = {"H2O": 962, "NaCl": 5234, "Xx2": None}
+
+    def get(url, endpoint, deadline):
+        raise RuntimeError("PubChem is unreachable")
+
+    monkeypatch.setattr(PubChemService, "_resolve_cid", cids.get)
+    monkeypatch.setattr(PubChemService, "_get", get)
+    results = PubChemService.get_chemical_properties_many(list(cids), physical_properties=False)
+
+    # Only the formula PubChem has no compound for is answered; the others are retried later
+    assert results == {"Xx2": {}}
+    assert PubChemCache.get("H2O") is None
@@ -0,0 +1,126 @@
+import pytest
+
+from app.utils import resilience
+from app.utils.resilience import CircuitBreaker, Deadline, DeadlineExceeded, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience, "time", clock)
+    return clock
+
+
+def test_token_bucket_allows_a_burst_then_paces(clock):
+    bucket = TokenBucket(rate=5, capacity=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.2)
+    # The reserved token is owed: the next caller queues behind it
+    assert bucket.reserve() == pytest.approx(0.4)
+
+    clock.now += 10
+    assert bucket.reserve() == 0.0
+
+
+def test_token_bucket_refuses_waits_past_max_wait(clock):
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve(max_wait=0.5) is None
+    assert bucket.reserve(max_wait=1.0) == pytest.approx(1.0)  # the refused call reserved nothing
+    assert not bucket.acquire(max_wait=0.5)
+
+
+def test_token_bucket_rate_zero_disables_limiting(clock):
+    bucket = TokenBucket(rate=0, capacity=1)
+    assert all(bucket.reserve() == 0.0 for _ in range(100))
+
+
+def _breaker():
+    return CircuitBreaker(failure_rate=0.5, min_calls=4, window_seconds=30, open_seconds=10)
+
+
+def test_breaker_opens_on_failure_rate_once_enough_calls(clock):
+    breaker = _breaker()
+    breaker.record_success()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED  # under min_calls
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN  # 2 of 4 failed
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_breaker_half_open_probe_success_closes(clock):
+    breaker = _breaker()
+    for _ in range(4):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()  # the probe
+    assert not breaker.allow()  # only one at a time
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    assert breaker.stats()["window_failures"] == 0
+
+
+def test_breaker_half_open_probe_failure_reopens(clock):
+    breaker = _breaker()
+    for _ in range(4):
+        breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["opened"] == 2
+
+
+def test_breaker_replaces_a_probe_that_never_reported(clock):
+    breaker = _breaker()
+    for _ in range(4):
+        breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    clock.now += 10
+    assert breaker.allow()
+
+
+def test_breaker_forgets_failures_outside_the_window(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 31
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["window_calls"] == 1
+
+
+def test_deadline_caps_timeouts_and_expires(clock):
+    deadline = Deadline(5)
+    assert deadline.timeout(10) == 5
+    assert deadline.timeout(2) == 2
+
+    clock.now += 4
+    assert deadline.timeout(10) == pytest.approx(1)
+    clock.now += 1
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout(10)
@@ -0,0 +1,50 @@
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+
+from app.models.CompoundModel import Compound
+from app.models.FormulaHistoryModel import FormulaHistory
+from app.services.compound_service import CompoundService
+from app.services.formula_history_service import FormulaHistoryService
+from app.services.retention_service import RetentionService
+
+
+WATER = {"formula": "H2O", "cid": 962, "common_name": "water"}
+
+
+def _rows(db, count):
+    FormulaHistoryService.create_formula_entries(db, [
+        {"formula": "H2O", "molar_mass": 18.015, "properties": WATER} for _ in range(count)
+    ])
+    return [row_id for (row_id,) in db.query(FormulaHistory.id).order_by(FormulaHistory.id)]
+
+
+def test_retention_deletes_private_compounds_and_archives_them(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(RetentionService, "ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(RetentionService, "ARCHIVE_FORMAT", "gzip")
+    ids = _rows(db, 3)
+    FormulaHistoryService.update_formula_entry(db, ids[0], {"common_name": "steam"})
+    old = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=400)
+    db.execute(update(FormulaHistory).where(FormulaHistory.id.in_(ids[:2])).values(timestamp=old))
+    db.commit()
+
+    result = RetentionService.run(days=30, chunk_size=1)
+
+    assert result["rows_deleted"] == 2
+    db.expire_all()
+    assert [compound.formula_key for compound in db.query(Compound)] == ["H2O"]
+    archived = [json.loads(line) for path in result["archives"] for line in gzip.open(path)]
+    assert {row["id"]: row.get("compound", {}).get("common_name") for row in archived} == {ids[0]: "steam", ids[1]: None}
+    assert archived[0]["compound"]["cid"] == 962
+
+
+def test_deleting_a_row_deletes_its_private_compound(db):
+    ids = _rows(db, 2)
+    FormulaHistoryService.update_formula_entry(db, ids[0], {"common_name": "steam"})
+    assert db.query(Compound).count() == 2
+
+    assert FormulaHistoryService.delete_formula_entry(db, ids[0])
+    assert db.query(Compound).filter(Compound.formula_key == CompoundService.private_key(ids[0])).count() == 0
+    assert db.query(Compound).count() == 1